@@ -0,0 +1,331 @@
+"""
+Офлайн-бенчмарк парсерів і шляху send_combo на записаних HTML-знімках (benchmarks/fixtures).
+
+    python benchmarks/bench.py                      # усе з параметрами за замовчуванням
+    python benchmarks/bench.py --iterations 200 --backends lxml html.parser
+    python benchmarks/bench.py --skip-handler --json bench.json
+
+Спершу — перевірка потокового режиму: кожен знімок подається в StreamScanner шматками по 1..--stream-chunks
+байтів (і цілим); місце обрізання має бути однаковим за будь-якого поділу, а результат на префіксі —
+тим самим, що й на повній сторінці (той самий відбиток), інакше бенчмарк завершується з помилкою.
+
+Секції:
+- parse_* по кожному бекенду BeautifulSoup: латентність (p50/p90/p99) і пікова пам'ять;
+- _find_combo_image_url на вже побудованому дереві;
+- extract_combo зі скрапера (крок вилучення scrape_for_combo);
+- send_combo наскрізно через Dispatcher із заглушками Bot API та локальним HTTP-сервером
+  (парсинг — у process-пулі, як у проді; --executor thread — для порівняння):
+  пропускна здатність (апдейтів/с) для теплого кешу та латентність холодного шляху (fetch + parse)
+  з повним і потоковим читанням сторінки (скільки КіБ прочитано з джерел), а також кнопка
+  «Усі ігри» — одне натискання замість п'яти, джерела завантажуються одночасно;
+- inline-запити (`@бот <гра>`) з теплого кешу: пропускна здатність без жодного звернення до джерел.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# bot.py вимагає ці змінні при імпорті; дані пишемо в тимчасову теку
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("WEBHOOK_HOST", "https://bench.invalid")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="combo-bench-"))
+
+import combo_parsers  # noqa: E402
+from prometheus_client import REGISTRY  # noqa: E402
+import hamster_scraper  # noqa: E402
+from parse_executor import parse_executor  # noqa: E402
+from stubs import FixtureServer, StubSession, callback_update, inline_update, load_fixtures, percentiles  # noqa: E402
+
+
+def available_backends() -> list[str]:
+    backends = ["html.parser"]
+    if importlib.util.find_spec("lxml") is not None:
+        backends.append("lxml")
+    return backends
+
+
+def time_calls(func, iterations: int) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def peak_memory_kib(func) -> float:
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def bench_parsers(fixtures: dict[str, bytes], backends: list[str], iterations: int) -> list[dict]:
+    rows = []
+    original_backend = combo_parsers.BACKEND
+    try:
+        for backend in backends:
+            combo_parsers.BACKEND = backend
+            for game, body in fixtures.items():
+                html = body.decode("utf-8")
+                parser = combo_parsers.PARSERS.get(game)
+                if parser is not None:
+                    rows.append({
+                        "stage": f"parse_{game}",
+                        "backend": backend,
+                        **percentiles(time_calls(lambda: parser(html), iterations)),
+                        "peak_kib": peak_memory_kib(lambda: parser(html)),
+                    })
+
+                rules = combo_parsers.RULES.get(game)
+                if rules is not None:
+                    soup = combo_parsers.make_soup(html)
+                    rows.append({
+                        "stage": f"_find_combo_image_url[{game}]",
+                        "backend": backend,
+                        **percentiles(time_calls(lambda: combo_parsers._find_combo_image_url(soup, rules), iterations)),
+                        "peak_kib": peak_memory_kib(lambda: combo_parsers._find_combo_image_url(soup, rules)),
+                    })
+
+                rows.append({
+                    "stage": f"extract_combo[{game}]",
+                    "backend": backend,
+                    **percentiles(time_calls(lambda: hamster_scraper.extract_combo(game, body), iterations)),
+                    "peak_kib": peak_memory_kib(lambda: hamster_scraper.extract_combo(game, body)),
+                })
+    finally:
+        combo_parsers.BACKEND = original_backend
+    return rows
+
+
+def stream_cut(rules, body: bytes, chunk_size: int) -> int | None:
+    """Місце обрізання, яке StreamScanner знаходить, коли сторінка приходить шматками по chunk_size байтів."""
+    scanner = combo_parsers.StreamScanner(rules)
+    for start in range(0, len(body), chunk_size):
+        cut = scanner.feed(body[start:start + chunk_size])
+        if cut is not None:
+            return cut
+    return None
+
+
+def check_stream(fixtures: dict[str, bytes], max_chunk: int) -> list[str]:
+    """
+    Потоковий режим не повинен змінювати того, що бачать користувачі: для кожного знімка місце
+    обрізання однакове за будь-якого розміру шматка, а результат на префіксі має той самий відбиток,
+    що й розбір повної сторінки (і проходить is_complete — інакше бот дочитав би сторінку повністю).
+    Повертає описи розбіжностей.
+    """
+    problems = []
+    for game, body in fixtures.items():
+        rules = combo_parsers.RULES.get(game)
+        if rules is None:
+            continue
+        full = combo_parsers.extract(rules, body.decode("utf-8", errors="replace")).fingerprint()
+        outcomes: dict[tuple[int | None, str], list[int]] = {}
+        for chunk_size in [*range(1, max_chunk + 1), len(body)]:
+            cut = stream_cut(rules, body, chunk_size)
+            if cut is None:
+                fingerprint = full
+            else:
+                result = combo_parsers.extract(rules, body[:cut].decode("utf-8", errors="replace"))
+                fingerprint = result.fingerprint() if combo_parsers.is_complete(rules, result) else "incomplete"
+            outcomes.setdefault((cut, fingerprint), []).append(chunk_size)
+        if len(outcomes) > 1 or next(iter(outcomes))[1] != full:
+            problems.append(f"{game}: full={full[:8]}; " + "; ".join(
+                f"cut={cut} fingerprint={fingerprint[:8]} chunks={sizes[:5]}" for (cut, fingerprint), sizes in outcomes.items()
+            ))
+    return problems
+
+
+def upstream_kib(game: str) -> float:
+    """Скільки КіБ бот прочитав з джерела гри (за метрикою combo_upstream_bytes_total)."""
+    return (REGISTRY.get_sample_value("combo_upstream_bytes_total", {"source": game}) or 0) / 1024
+
+
+async def bench_handler(
+    fixtures: dict[str, bytes],
+    updates: int,
+    concurrency: int,
+    api_latency: float,
+    upstream_latency: float,
+    chunk_size: int,
+    chunk_delay: float,
+) -> list[dict]:
+    import bot as bot_module
+    from aiogram.types import Update
+
+    server = FixtureServer(fixtures, latency=upstream_latency, chunk_size=chunk_size, chunk_delay=chunk_delay)
+    await server.start()
+    session = StubSession(latency=api_latency)
+    bot_module.bot.session = session
+    for game in bot_module.SOURCES:
+        if game in fixtures:
+            bot_module.SOURCES[game] = server.url(game)
+    games = [game for game in bot_module.SOURCES if game in fixtures]
+    # Одна репліка, яка тримає оренду: холодні завантаження йдуть у джерело, а не в спільний стан
+    bot_module.refresh_lease.is_leader = True
+    # on_startup не виконується — апдейти не повинні чекати на прогрів зі сховища
+    bot_module.readiness.mark("cache")
+
+    async def feed(update_id: int, game: str) -> float:
+        update = Update.model_validate(callback_update(update_id, 10_000 + update_id, game), context={"bot": bot_module.bot})
+        started = time.perf_counter()
+        await bot_module.dp.feed_update(bot_module.bot, update)
+        return time.perf_counter() - started
+
+    rows = []
+    try:
+        # Пул стартує заздалегідь, як в on_startup: заміри нижче — парсинг у пулі, а не старт воркерів.
+        # Час старту пулу в проді (головний модуль — main.py) показує benchmarks/cold_start.py
+        await bot_module.parse_executor.warm(combo_parsers.preload)
+
+        # Холодний шлях: порожні кеші, кожен апдейт іде через повне завантаження + parse;
+        # окремо — з потоковим читанням, яке зупиняється, щойно комбо знайдено
+        for stream in (False, True):
+            bot_module.STREAM_FETCH = stream
+            cold = []
+            kib_before = sum(upstream_kib(game) for game in games)
+            for i, game in enumerate(games * 5):
+                bot_module.combo_cache.clear()
+                combo_parsers.parse_cache.clear()
+                bot_module.http_client.clear_validators()
+                cold.append(await feed((1_000 if stream else 0) + i, game))
+            rows.append({
+                "stage": f"send_combo (cold, {'stream' if stream else 'full'})",
+                "backend": combo_parsers.BACKEND,
+                **percentiles(cold),
+                "upstream_kib": round(sum(upstream_kib(game) for game in games) - kib_before, 1),
+            })
+
+        # «Усі ігри» з холодним кешем: один апдейт, усі джерела паралельно
+        cold = []
+        for i in range(5):
+            bot_module.combo_cache.clear()
+            combo_parsers.parse_cache.clear()
+            bot_module.http_client.clear_validators()
+            cold.append(await feed(2_000 + i, bot_module.ALL_GAMES))
+        rows.append({
+            "stage": "send_all (cold)",
+            "backend": combo_parsers.BACKEND,
+            **percentiles(cold),
+        })
+
+        # Теплий шлях: кеш прогрітий, вимірюємо пропускну здатність при `concurrency` одночасних апдейтах
+        await bot_module.refresh_all_combos()
+        upstream_before = sum(server.requests.values())
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded(i: int) -> float:
+            async with semaphore:
+                return await feed(100_000 + i, games[i % len(games)])
+
+        started = time.perf_counter()
+        warm = await asyncio.gather(*(bounded(i) for i in range(updates)))
+        elapsed = time.perf_counter() - started
+        rows.append({
+            "stage": "send_combo (warm cache)",
+            "backend": combo_parsers.BACKEND,
+            **percentiles(list(warm)),
+            "updates_per_sec": round(updates / elapsed, 1),
+            "upstream_requests": sum(server.requests.values()) - upstream_before,
+            "telegram_calls": dict(session.calls),
+        })
+
+        # Inline-режим: відповіді лише з кешу, джерела не чіпаються
+        upstream_before = sum(server.requests.values())
+        queries = ["", *games]
+
+        async def inline(i: int) -> float:
+            update = Update.model_validate(inline_update(200_000 + i, 30_000 + i, queries[i % len(queries)]), context={"bot": bot_module.bot})
+            started = time.perf_counter()
+            await bot_module.dp.feed_update(bot_module.bot, update)
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        samples = [await inline(i) for i in range(updates)]
+        elapsed = time.perf_counter() - started
+        rows.append({
+            "stage": "inline_query (warm cache)",
+            "backend": combo_parsers.BACKEND,
+            **percentiles(samples),
+            "updates_per_sec": round(updates / elapsed, 1),
+            "upstream_requests": sum(server.requests.values()) - upstream_before,
+            "telegram_calls": {"AnswerInlineQuery": session.calls["AnswerInlineQuery"]},
+        })
+    finally:
+        await bot_module.http_client.close()
+        bot_module.parse_executor.shutdown()
+        await server.stop()
+    return rows
+
+
+def print_table(rows: list[dict]) -> None:
+    header = f"{'stage':<38} {'backend':<12} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'mean ms':>9} {'peak KiB':>9} {'upd/s':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['stage']:<38} {row['backend']:<12} {row['p50']:>9.3f} {row['p90']:>9.3f} {row['p99']:>9.3f} "
+            f"{row['mean']:>9.3f} {row.get('peak_kib', ''):>9} {row.get('updates_per_sec', ''):>8}"
+        )
+    for row in rows:
+        if "upstream_kib" in row:
+            print(f"\n{row['stage']}: read from upstream {row['upstream_kib']} KiB")
+        if "telegram_calls" in row:
+            print(f"\n{row['stage']}: upstream requests={row['upstream_requests']}, Telegram calls={row['telegram_calls']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50, help="викликів кожного парсера на бекенд")
+    parser.add_argument("--backends", nargs="+", default=available_backends())
+    parser.add_argument("--updates", type=int, default=2000, help="апдейтів у тесті пропускної здатності")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--api-latency", type=float, default=0.0, help="імітована затримка Bot API, с")
+    parser.add_argument("--upstream-latency", type=float, default=0.0, help="імітована затримка джерел, с")
+    parser.add_argument("--chunk-size", type=int, default=4096, help="джерела віддають сторінку шматками цього розміру (0 — одразу)")
+    parser.add_argument("--chunk-delay", type=float, default=0.002, help="пауза між шматками, с")
+    parser.add_argument("--executor", choices=("process", "thread"), default=parse_executor.kind, help="пул парсингу для send_combo")
+    parser.add_argument("--stream-chunks", type=int, default=64, help="найбільший розмір шматка в перевірці потокового режиму (0 — не перевіряти)")
+    parser.add_argument("--skip-handler", action="store_true", help="лише парсери, без send_combo")
+    parser.add_argument("--json", help="зберегти результати у JSON-файл")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    if not fixtures:
+        sys.exit("Немає знімків у benchmarks/fixtures — запустіть benchmarks/record_fixtures.py")
+
+    if args.stream_chunks:
+        problems = check_stream(fixtures, args.stream_chunks)
+        if problems:
+            sys.exit("Потоковий режим дає інший результат:\n" + "\n".join(problems))
+        print(f"stream check: {len(fixtures)} fixtures, chunks 1..{args.stream_chunks} — same cut, same fingerprint as full parse\n")
+
+    parse_executor.kind = args.executor
+    rows = bench_parsers(fixtures, args.backends, args.iterations)
+    if not args.skip_handler:
+        rows += asyncio.run(bench_handler(
+            fixtures, args.updates, args.concurrency, args.api_latency, args.upstream_latency,
+            args.chunk_size, args.chunk_delay,
+        ))
+
+    print_table(rows)
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
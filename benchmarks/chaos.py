@@ -0,0 +1,222 @@
+"""
+Перевірка стійкості шару завантаження на локальному сервері зі збоями (FixtureServer.set_fault).
+
+    python benchmarks/chaos.py
+    python benchmarks/chaos.py --json chaos.json
+
+Сценарії:
+- breaker: джерело відповідає 503 — кілька запитів із повторами, далі запобіжник відповідає одразу;
+  після відновлення джерела пробний запит замикає запобіжник;
+- hedge: основна адреса зависає, дзеркало здорове — відповідь приходить через HEDGE_DELAY, а не таймаут;
+- flaky: половина запитів падає — частка успіхів без повторів і з повторами;
+- bot: наскрізно через Dispatcher, джерела зависли — з останнім відомим комбо користувач отримує
+  відповідь без помилки, без нього — швидку помилку замість очікування таймауту.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# Короткі таймаути й паузи, щоб сценарії тривали секунди, а не хвилини
+os.environ.setdefault("BOT_TOKEN", "123456:chaos")
+os.environ.setdefault("WEBHOOK_HOST", "https://chaos.invalid")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="combo-chaos-"))
+os.environ.setdefault("PARSE_EXECUTOR", "thread")
+os.environ.setdefault("HTTP_TIMEOUT", "1")
+os.environ.setdefault("HTTP_RETRIES", "1")
+os.environ.setdefault("CIRCUIT_FAILURE_THRESHOLD", "3")
+
+from http_client import HttpClient  # noqa: E402
+from metrics import COMBO_REQUESTS  # noqa: E402
+from stubs import FixtureServer, StubSession, callback_update, load_fixtures, percentiles  # noqa: E402
+
+GAME = "blum"
+
+
+async def timed_calls(call, count: int, pause: float = 0.0) -> tuple[list[float], list[str]]:
+    """Послідовні виклики: латентність і результат кожного (ok або назва винятку)."""
+    samples, outcomes = [], []
+    for _ in range(count):
+        started = time.perf_counter()
+        try:
+            await call()
+            outcomes.append("ok")
+        except Exception as e:
+            outcomes.append(type(e).__name__)
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(pause)
+    return samples, outcomes
+
+
+def row(scenario: str, samples: list[float], outcomes: list[str], **extra) -> dict:
+    return {
+        "scenario": scenario,
+        "calls": len(outcomes),
+        "ok": outcomes.count("ok"),
+        **percentiles(samples),
+        "outcomes": outcomes,
+        **extra,
+    }
+
+
+async def scenario_breaker(server: FixtureServer) -> list[dict]:
+    client = HttpClient(timeout=1, retries=2, backoff_base=0.05, failure_threshold=5, reset_timeout=0.5)
+    url = server.url(GAME)
+    try:
+        server.set_fault(GAME, "error")
+        before = server.requests[GAME]
+        samples, outcomes = await timed_calls(lambda: client.get(url, GAME), 10)
+        down = row("breaker: upstream 503", samples, outcomes, upstream_requests=server.requests[GAME] - before)
+
+        server.set_fault(GAME, None)
+        await asyncio.sleep(0.6)
+        samples, outcomes = await timed_calls(lambda: client.get(url, GAME), 3)
+        recovered = row("breaker: recovered", samples, outcomes, circuits=client.circuit_states())
+    finally:
+        await client.close()
+    return [down, recovered]
+
+
+async def scenario_hedge(server: FixtureServer, mirror: FixtureServer) -> list[dict]:
+    client = HttpClient(timeout=1, retries=0)
+    urls = (server.url(GAME), mirror.url(GAME))
+    try:
+        server.set_fault(GAME, "hang")
+        samples, outcomes = await timed_calls(lambda: client.get(urls[0], GAME), 3)
+        single = row("hedge: primary only, hung", samples, outcomes)
+        samples, outcomes = await timed_calls(
+            lambda: client.get_hedged(urls, GAME, conditional=False, hedge_delay=0.2), 10,
+        )
+        hedged = row("hedge: primary hung + mirror", samples, outcomes, circuits=client.circuit_states())
+    finally:
+        server.set_fault(GAME, None)
+        await client.close()
+    return [single, hedged]
+
+
+async def scenario_flaky(server: FixtureServer) -> list[dict]:
+    rows = []
+    server.set_fault(GAME, "error", rate=0.5)
+    try:
+        for retries in (0, 2):
+            client = HttpClient(timeout=1, retries=retries, backoff_base=0.01, failure_threshold=1000)
+            try:
+                samples, outcomes = await timed_calls(lambda: client.get(server.url(GAME), GAME, conditional=False), 50)
+            finally:
+                await client.close()
+            rows.append(row(f"flaky 50%: retries={retries}", samples, outcomes))
+    finally:
+        server.set_fault(GAME, None)
+    return rows
+
+
+async def scenario_bot(server: FixtureServer) -> list[dict]:
+    import bot as bot_module
+    from aiogram.types import Update
+
+    bot_module.bot.session = StubSession()
+    for game in bot_module.SOURCES:
+        bot_module.SOURCES[game] = server.url(game)
+    bot_module.refresh_lease.is_leader = True
+    bot_module.readiness.mark("cache")
+    games = [game for game in bot_module.SOURCES if game in server.fixtures]
+    update_id = 0
+
+    def errors() -> float:
+        return sum(
+            sample.value
+            for metric in COMBO_REQUESTS.collect()
+            for sample in metric.samples
+            if sample.name == "combo_requests_total" and sample.labels["outcome"] == "error"
+        )
+
+    async def tap(game: str) -> None:
+        """Одне натискання кнопки; виняток, якщо користувач побачив «Критична помилка»."""
+        nonlocal update_id
+        update_id += 1
+        update = Update.model_validate(callback_update(update_id, 20_000 + update_id, game), context={"bot": bot_module.bot})
+        before = errors()
+        await bot_module.dp.feed_update(bot_module.bot, update)
+        if errors() > before:
+            raise RuntimeError("user saw an error")
+
+    def tap_each(rounds: int):
+        order = itertools.cycle(games)
+        return timed_calls(lambda: tap(next(order)), rounds * len(games))
+
+    rows = []
+    try:
+        # Останнє відоме комбо є, але давно прострочене; джерела зависли
+        await bot_module.refresh_all_combos()
+        last_good = {game: bot_module.combo_cache.peek(game) for game in games}
+        bot_module.combo_cache.clear()
+        for game, value in last_good.items():
+            bot_module.combo_cache.prime(game, value, age=24 * 3600)
+        server.set_fault("*", "hang")
+        samples, outcomes = await tap_each(5)
+        rows.append(row("bot: upstream hung, last good known", samples, outcomes, cache=bot_module.combo_cache.stats()))
+
+        # Нічого не відомо: помилка неминуча, але після розмикання запобіжника — миттєва
+        bot_module.combo_cache.clear()
+        samples, outcomes = await tap_each(5)
+        rows.append(row("bot: upstream hung, nothing cached", samples, outcomes, circuits=bot_module.http_client.circuit_states()))
+    finally:
+        server.set_fault("*", None)
+        await bot_module.http_client.close()
+        bot_module.parse_executor.shutdown()
+    return rows
+
+
+async def run() -> list[dict]:
+    fixtures = load_fixtures()
+    server, mirror = FixtureServer(fixtures), FixtureServer(fixtures)
+    await server.start()
+    await mirror.start()
+    try:
+        rows = await scenario_breaker(server)
+        rows += await scenario_hedge(server, mirror)
+        rows += await scenario_flaky(server)
+        rows += await scenario_bot(server)
+    finally:
+        await server.stop()
+        await mirror.stop()
+    return rows
+
+
+def print_table(rows: list[dict]) -> None:
+    header = f"{'scenario':<40} {'calls':>5} {'ok':>4} {'p50 ms':>9} {'p90 ms':>9} {'max ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(f"{r['scenario']:<40} {r['calls']:>5} {r['ok']:>4} {r['p50']:>9.1f} {r['p90']:>9.1f} {r['max']:>9.1f}")
+    for r in rows:
+        details = {k: v for k, v in r.items() if k in ("upstream_requests", "circuits", "cache")}
+        failures = sorted({o for o in r["outcomes"] if o != "ok"})
+        if details or failures:
+            print(f"\n{r['scenario']}: {details}" + (f" failures={failures}" if failures else ""))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", help="зберегти результати у JSON-файл")
+    args = parser.parse_args()
+
+    if not load_fixtures():
+        sys.exit("Немає знімків у benchmarks/fixtures — запустіть benchmarks/record_fixtures.py")
+    rows = asyncio.run(run())
+    print_table(rows)
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
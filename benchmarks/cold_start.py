@@ -0,0 +1,144 @@
+"""
+Холодний старт: бот запускається окремим процесом (`python main.py`), як після редеплою на Railway.
+
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --runs 3 --json cold_start.json
+
+Bot API замінено HTTP-заглушкою (TELEGRAM_API_URL), джерела — FixtureServer (COMBO_RULES_PATH
+з адресами заглушки). Щойно порт відповідає, у /webhook надходить натискання кнопки — так Telegram
+доставляє апдейти, що накопичилися під час редеплою. Для кожного запуску вимірюється, через скільки
+секунд після старту процесу:
+- listen: /healthz відповідає (порт слухає);
+- ready: /readyz повертає 200 (кеш прогріто, вебхук зареєстровано);
+- first response: користувач отримав комбо у відповідь на те натискання.
+Окремо — пам'ять головного процесу і дочірніх (forkserver і воркери пулу парсингу) після відповіді.
+
+Перший запуск — з порожнім томом (комбо доводиться завантажувати з джерел), наступні — з тим самим
+DATA_DIR, як редеплой. Також перевіряється, що черга апдейтів у Telegram не скидається.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from stubs import BotProcess, FixtureServer, TelegramStubServer, callback_update, load_fixtures, wait_http  # noqa: E402
+
+GAME = "blum"
+
+
+async def wait_first_response(session: aiohttp.ClientSession, url: str, timeout: float = 30.0) -> dict:
+    deadline = time.perf_counter() + timeout
+    while True:
+        async with session.get(url) as response:
+            health = await response.json()
+        if health["first_response_seconds"] is not None or time.perf_counter() > deadline:
+            return health
+        await asyncio.sleep(0.01)
+
+
+async def run_once(run: int, bot: BotProcess, telegram: TelegramStubServer) -> dict:
+    chat_id = 50_000 + run
+    log_start = len(telegram.log)
+
+    await bot.start()
+    started = bot.started
+    try:
+        async with aiohttp.ClientSession() as session:
+            listen = await wait_http(session, f"{bot.base_url}/healthz")
+            # Натискання, що чекало в черзі Telegram, доставляється одразу після старту
+            async with session.post(f"{bot.base_url}/webhook", json=callback_update(run, chat_id, GAME)) as response:
+                webhook_status = response.status
+
+            def answered(method: str, params: dict) -> bool:
+                return method in ("sendPhoto", "sendMessage") and params.get("chat_id") == str(chat_id)
+
+            ready, (first_response, _, _) = await asyncio.gather(
+                wait_http(session, f"{bot.base_url}/readyz"), telegram.wait_for(answered),
+            )
+            # Бот сам фіксує першу успішну відповідь, коли отримає результат sendPhoto/sendMessage
+            health = await wait_first_response(session, f"{bot.base_url}/healthz")
+            rss_kib = bot.memory_kib()["VmRSS"]
+            children_rss_kib = bot.children_rss_kib()
+    finally:
+        await bot.stop()
+
+    calls = [(method, params) for _, method, params in telegram.log[log_start:]]
+    set_webhook = next((params for method, params in calls if method == "setWebhook"), {})
+    return {
+        "run": run,
+        "listen_s": round(listen - started, 3),
+        "ready_s": round(ready - started, 3),
+        "first_response_s": round(first_response - started, 3),
+        "webhook_status": webhook_status,
+        "rss_mib": round(rss_kib / 1024, 1),
+        "children_rss_mib": round(children_rss_kib / 1024, 1),
+        "bot_steps": health["steps"],
+        "bot_first_response_s": health["first_response_seconds"],
+        "pending_updates_kept": (
+            not any(method == "deleteWebhook" for method, _ in calls)
+            and set_webhook.get("drop_pending_updates") in (None, "false")
+        ),
+    }
+
+
+async def main_async(runs: int, api_latency: float, upstream_latency: float) -> list[dict]:
+    fixtures = load_fixtures()
+    server = FixtureServer(fixtures, latency=upstream_latency)
+    telegram = TelegramStubServer(latency=api_latency)
+    await server.start()
+    await telegram.start()
+    # Один том на всі запуски: другий і наступні — редеплой зі збереженими комбо
+    bot = BotProcess(server, telegram, Path(tempfile.mkdtemp(prefix="combo-cold-start-")))
+    rows = []
+    try:
+        for run in range(1, runs + 1):
+            rows.append(await run_once(run, bot, telegram))
+    finally:
+        await server.stop()
+        await telegram.stop()
+    print(f"bot logs: {bot.log_path}\n")
+    return rows
+
+
+def print_table(rows: list[dict]) -> None:
+    header = (
+        f"{'run':<22} {'listen s':>9} {'ready s':>9} {'first resp s':>13} {'kept queue':>11} "
+        f"{'RSS MiB':>8} {'workers MiB':>12}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        label = f"{r['run']} ({'empty volume' if r['run'] == 1 else 'redeploy'})"
+        print(
+            f"{label:<22} {r['listen_s']:>9} {r['ready_s']:>9} {r['first_response_s']:>13} "
+            f"{str(r['pending_updates_kept']):>11} {r['rss_mib']:>8} {r['children_rss_mib']:>12}"
+        )
+    for r in rows:
+        print(f"\nrun {r['run']}: bot-side steps since process start {r['bot_steps']}, first response {r['bot_first_response_s']} s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="запусків поспіль з тим самим томом")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="імітована затримка Bot API, с")
+    parser.add_argument("--upstream-latency", type=float, default=0.1, help="імітована затримка джерел, с")
+    parser.add_argument("--json", help="зберегти результати у JSON-файл")
+    args = parser.parse_args()
+
+    if not load_fixtures():
+        sys.exit("Немає знімків у benchmarks/fixtures — запустіть benchmarks/record_fixtures.py")
+    rows = asyncio.run(main_async(args.runs, args.api_latency, args.upstream_latency))
+    print_table(rows)
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
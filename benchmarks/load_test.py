@@ -0,0 +1,263 @@
+"""
+Навантажувальний тест вебхука: тисячі користувачів одночасно натискають кнопки ігор.
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --rates 100 200 400 800 1600 --duration 10
+    python benchmarks/load_test.py --env UPDATE_MAX_CONCURRENCY=128 --json load.json
+
+Бот запускається окремим процесом (`python main.py`) — той самий aiohttp `app` з SimpleRequestHandler, що й на Railway;
+Bot API замінено TelegramStubServer, джерела — FixtureServer із записаними сторінками. Генератор
+надсилає в /webhook апдейти callback_query з відкритим циклом: із заданою частотою, незалежно від того,
+чи встигає бот, — як Telegram у ранковий пік. Кожен апдейт — від нового користувача (debounce і черга
+чату не спрацьовують), ігри по колу. Telegram доставляє апдейти щонайбільше через max_connections
+з'єднань (40 за замовчуванням у setWebhook) — стільки ж і тут (--connections).
+
+Для кожного ступеня навантаження (--rates, апдейтів/с протягом --duration с):
+- throughput: відповіді користувачам (sendPhoto/sendMessage/editMessageText у заглушці Bot API) за секунду;
+- latency: від POST у /webhook до відповіді користувачу, p50/p99 (окремо — підтвердження вебхука);
+- errors: не 200 від вебхука, «Критична помилка» у відповіді та натискання без відповіді за --timeout
+  (з них відкинуті самим ботом — combo_updates_dropped_total з /metrics);
+- memory: RSS головного процесу бота на початку і в кінці ступеня та пік;
+- CPU: завантаження ядра процесом бота і самим генератором (разом із заглушками) — щоб відрізнити
+  упор у процесор від упору в ліміти бота (UPDATE_MAX_CONCURRENCY, черга) чи в генератор.
+Насичення — перший ступінь, де пропускна здатність нижча за 90% запропонованої, p99 вищий за --slo
+або помилок більше 1%.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import aiohttp
+from prometheus_client.parser import text_string_to_metric_families
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from stubs import BotProcess, FixtureServer, TelegramStubServer, callback_update, load_fixtures, percentiles, wait_http  # noqa: E402
+
+ERROR_TEXT = "Критична помилка"
+LOADING_PREFIX = "⏳"
+
+
+class LoadGenerator:
+    """Надсилає апдейти у вебхук і зіставляє їх з відповідями бота, що доходять до заглушки Bot API."""
+
+    def __init__(self, session: aiohttp.ClientSession, webhook_url: str, games: list[str]):
+        self.session = session
+        self.webhook_url = webhook_url
+        self.games = itertools.cycle(games)
+        self.ids = itertools.count(1)
+        # chat_id -> (час надсилання, future з часом відповіді або помилкою)
+        self.pending: dict[str, tuple[float, asyncio.Future]] = {}
+
+    def on_call(self, method: str, params: dict) -> None:
+        """
+        Хук TelegramStubServer: перша відповідь чату завершує його натискання. Фото приходить через
+        sendPhoto, а текстове комбо і «Критична помилка» — редагуванням повідомлення з кнопками
+        (editMessageText); індикатор «⏳ Отримую дані...» відповіддю не вважається.
+        """
+        if method not in ("sendPhoto", "sendMessage", "editMessageText"):
+            return
+        if method == "editMessageText" and params.get("text", "").startswith(LOADING_PREFIX):
+            return
+        entry = self.pending.get(params.get("chat_id", ""))
+        if entry is None or entry[1].done():
+            return
+        if ERROR_TEXT in params.get("text", ""):
+            entry[1].set_exception(RuntimeError("error_reply"))
+        else:
+            entry[1].set_result(time.perf_counter())
+
+    async def tap(self, acks: list[float], errors: Counter) -> None:
+        update_id = next(self.ids)
+        chat_id = 1_000_000 + update_id
+        sent = time.perf_counter()
+        self.pending[str(chat_id)] = (sent, asyncio.get_running_loop().create_future())
+        try:
+            async with self.session.post(self.webhook_url, json=callback_update(update_id, chat_id, next(self.games))) as response:
+                await response.read()
+                if response.status != 200:
+                    errors[f"webhook_{response.status}"] += 1
+                    self.pending.pop(str(chat_id))[1].cancel()
+                    return
+            acks.append(time.perf_counter() - sent)
+        except aiohttp.ClientError as e:
+            errors[type(e).__name__] += 1
+            self.pending.pop(str(chat_id))[1].cancel()
+
+    async def stage(self, rate: float, duration: float, timeout: float) -> dict:
+        """Один ступінь: rate апдейтів/с протягом duration с, далі очікування відповідей до timeout с."""
+        self.pending.clear()
+        acks: list[float] = []
+        errors: Counter = Counter()
+        total = int(rate * duration)
+        senders = []
+        started = time.perf_counter()
+        # Відкритий цикл: апдейти йдуть за розкладом, навіть якщо попередні ще не оброблені
+        while len(senders) < total:
+            due = min(total, int((time.perf_counter() - started) * rate) + 1)
+            while len(senders) < due:
+                senders.append(asyncio.create_task(self.tap(acks, errors)))
+            await asyncio.sleep(0.001)
+        send_elapsed = time.perf_counter() - started
+        await asyncio.gather(*senders)
+
+        futures = [future for _, future in self.pending.values()]
+        if futures:
+            await asyncio.wait(futures, timeout=timeout)
+        latencies, last_answer = [], started
+        for sent, future in self.pending.values():
+            if not future.done():
+                errors["timeout"] += 1
+                future.cancel()
+            elif future.cancelled():
+                continue
+            elif future.exception() is not None:
+                errors[str(future.exception())] += 1
+            else:
+                latencies.append(future.result() - sent)
+                last_answer = max(last_answer, future.result())
+
+        answered = len(latencies)
+        return {
+            "rate": rate,
+            "sent": total,
+            "send_rate": round(total / send_elapsed, 1) if send_elapsed else 0.0,
+            "answered": answered,
+            "throughput": round(answered / (last_answer - started), 1) if answered else 0.0,
+            "latency": percentiles(latencies),
+            "ack_latency": percentiles(acks),
+            "errors": dict(errors),
+            "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        }
+
+
+async def dropped_updates(session: aiohttp.ClientSession, base_url: str) -> dict[str, float]:
+    """combo_updates_dropped_total з /metrics бота за причиною."""
+    async with session.get(f"{base_url}/metrics") as response:
+        text = await response.text()
+    return {
+        sample.labels["reason"]: sample.value
+        for family in text_string_to_metric_families(text)
+        for sample in family.samples
+        if sample.name == "combo_updates_dropped_total"
+    }
+
+
+def saturated(row: dict, slo: float) -> bool:
+    return row["throughput"] < 0.9 * row["rate"] or row["latency"]["p99"] > slo * 1000 or row["error_rate"] > 0.01
+
+
+async def run(args: argparse.Namespace) -> list[dict]:
+    fixtures = load_fixtures()
+    server = FixtureServer(fixtures, latency=args.upstream_latency)
+    telegram = TelegramStubServer(latency=args.api_latency, keep_log=False)
+    await server.start()
+    await telegram.start()
+    env = dict(item.split("=", 1) for item in args.env)
+    bot = BotProcess(server, telegram, Path(tempfile.mkdtemp(prefix="combo-load-")), env=env)
+    rows = []
+    try:
+        await bot.start()
+        connector = aiohttp.TCPConnector(limit=args.connections)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=args.timeout)) as session:
+            await wait_http(session, f"{bot.base_url}/readyz")
+            generator = LoadGenerator(session, f"{bot.base_url}/webhook", [game for game in fixtures])
+            telegram.on_call = generator.on_call
+
+            # Прогрів: по одному натисканню на гру — комбо в кеші, file_id картинок відомі
+            warmup = await generator.stage(rate=len(fixtures), duration=1, timeout=args.timeout)
+            print(f"warm-up: {warmup['answered']}/{warmup['sent']} answered, memory {bot.memory_kib()} KiB\n")
+            print(HEADER)
+            print("-" * len(HEADER))
+
+            for rate in args.rates:
+                memory_before = bot.memory_kib()
+                dropped_before = await dropped_updates(session, bot.base_url)
+                cpu_before, own_cpu_before, wall_before = bot.cpu_seconds(), time.process_time(), time.perf_counter()
+                row = await generator.stage(rate, args.duration, args.timeout)
+                wall = time.perf_counter() - wall_before
+                row["bot_cpu"] = round((bot.cpu_seconds() - cpu_before) / wall, 3)
+                row["generator_cpu"] = round((time.process_time() - own_cpu_before) / wall, 3)
+                dropped_after = await dropped_updates(session, bot.base_url)
+                memory_after = bot.memory_kib()
+                row["dropped_by_bot"] = {
+                    reason: int(value - dropped_before.get(reason, 0))
+                    for reason, value in dropped_after.items() if value > dropped_before.get(reason, 0)
+                }
+                row["rss_kib"] = [memory_before["VmRSS"], memory_after["VmRSS"]]
+                row["peak_rss_kib"] = memory_after["VmHWM"]
+                row["saturated"] = saturated(row, args.slo)
+                rows.append(row)
+                print_row(row)
+                await asyncio.sleep(args.pause)
+    finally:
+        await bot.stop()
+        await server.stop()
+        await telegram.stop()
+    print(f"\nbot logs: {bot.log_path}")
+    return rows
+
+
+HEADER = (
+    f"{'rate/s':>7} {'sent/s':>7} {'answ/s':>7} {'p50 ms':>9} {'p99 ms':>9} {'ack p99':>8} "
+    f"{'errors':>7} {'RSS MiB':>13} {'peak':>6} {'bot CPU':>8} {'gen CPU':>8}"
+)
+
+
+def print_row(row: dict) -> None:
+    rss = f"{row['rss_kib'][0] / 1024:.0f}->{row['rss_kib'][1] / 1024:.0f}"
+    print(
+        f"{row['rate']:>7g} {row['send_rate']:>7} {row['throughput']:>7} {row['latency']['p50']:>9.1f} "
+        f"{row['latency']['p99']:>9.1f} {row['ack_latency']['p99']:>8.1f} {row['error_rate']:>7.2%} "
+        f"{rss:>13} {row['peak_rss_kib'] / 1024:>6.0f} {row['bot_cpu']:>8.0%} {row['generator_cpu']:>8.0%}"
+        + ("  saturated" if row["saturated"] else "")
+    )
+
+
+def print_summary(rows: list[dict], slo: float) -> None:
+    for row in rows:
+        if row["errors"] or row["dropped_by_bot"]:
+            print(f"\n{row['rate']:g}/s: errors={row['errors']} dropped_by_bot={row['dropped_by_bot']}")
+    first = next((row for row in rows if row["saturated"]), None)
+    sustained = [row for row in rows if not row["saturated"]]
+    if first is None:
+        print(f"\nNo saturation up to {rows[-1]['rate']:g} updates/s (p99 ≤ {slo:g} s, errors ≤ 1%).")
+    else:
+        best = f"{sustained[-1]['rate']:g}" if sustained else "none of the stages"
+        print(f"\nSaturation at {first['rate']:g} updates/s; sustained: {best} (p99 ≤ {slo:g} s, errors ≤ 1%).")
+    if len(rows) > 1:
+        growth = (rows[-1]["rss_kib"][1] - rows[0]["rss_kib"][0]) / 1024
+        print(f"Bot RSS growth over the run: {growth:+.1f} MiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rates", type=float, nargs="+", default=[50, 100, 200, 400, 800], help="ступені навантаження, апдейтів/с")
+    parser.add_argument("--duration", type=float, default=5, help="тривалість кожного ступеня, с")
+    parser.add_argument("--pause", type=float, default=1, help="пауза між ступенями, с")
+    parser.add_argument("--connections", type=int, default=40, help="одночасних з'єднань до вебхука (max_connections Telegram)")
+    parser.add_argument("--timeout", type=float, default=10, help="скільки чекати на відповідь користувачу, с")
+    parser.add_argument("--slo", type=float, default=2.0, help="допустимий p99 відповіді, с")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="імітована затримка Bot API, с")
+    parser.add_argument("--upstream-latency", type=float, default=0.1, help="імітована затримка джерел, с")
+    parser.add_argument("--env", nargs="*", default=[], metavar="KEY=VALUE", help="змінні оточення для bot.py")
+    parser.add_argument("--json", help="зберегти результати у JSON-файл")
+    args = parser.parse_args()
+
+    if not load_fixtures():
+        sys.exit("Немає знімків у benchmarks/fixtures — запустіть benchmarks/record_fixtures.py")
+    rows = asyncio.run(run(args))
+    if rows:
+        print_summary(rows, args.slo)
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
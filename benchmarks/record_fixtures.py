@@ -0,0 +1,41 @@
+"""
+Записує свіжі HTML-знімки всіх джерел з bot.SOURCES у benchmarks/fixtures/<гра>.html.
+
+    python benchmarks/record_fixtures.py
+
+Потрібен доступ до мережі. Знімки використовуються бенчмарком і навантажувальним тестом.
+"""
+import asyncio
+import os
+import re
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("BOT_TOKEN", "123456:record")
+os.environ.setdefault("WEBHOOK_HOST", "https://record.invalid")
+
+from bot import SOURCES  # noqa: E402
+from http_client import HttpClient  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+async def record() -> None:
+    FIXTURES_DIR.mkdir(exist_ok=True)
+    client = HttpClient()
+    try:
+        for game, url in SOURCES.items():
+            page = await client.get(url)
+            # Прибираємо nonce/токени сесій, щоб знімки не змінювалися від запису до запису
+            html = re.sub(r'(nonce|_wpnonce)(["\']?\s*[:=]\s*["\'])[0-9a-f]+', r"\1\2x", page.text)
+            (FIXTURES_DIR / f"{game}.html").write_text(html, encoding="utf-8")
+            print(f"{game}: {len(page.content)} байт з {url}")
+    finally:
+        await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(record())
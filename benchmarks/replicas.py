@@ -0,0 +1,209 @@
+"""
+Перевірка спільного стану для кількох реплік на бекендах fakeredis:// і sqlite:// (без сервера Redis).
+
+    python benchmarks/replicas.py
+    python benchmarks/replicas.py --backends fakeredis:// --json replicas.json
+
+Кожна «репліка» — окремий екземпляр create_shared_state(url) над тими самими даними (для SQLite —
+окреме з'єднання з тим самим файлом). Сценарії:
+- lease: дві репліки змагаються за оренду — лише одна її отримує, чужу не можна ні продовжити, ні
+  звільнити, після звільнення її бере інша;
+- lease expiry: власник зник без звільнення — після ttl оренду перехоплює інша репліка, а колишній
+  власник уже не може її продовжити (WATCH/MULTI у Redis, BEGIN IMMEDIATE у SQLite);
+- leader: два LeaderLease.run — рівно один лідер; ведений із повільним follower_job стає лідером
+  не пізніше ніж за ttl після зупинки лідера;
+- queue: subscribe → enqueue → due → retry/complete → unsubscribe, з різних реплік: одна
+  незавершена розсилка на чат і гру, retry відкладає задачу, відписка прибирає задачі й не дає
+  retry повернути їх у чергу.
+Будь-яка невдала перевірка — ненульовий код виходу.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from shared_state import LeaderLease, create_shared_state  # noqa: E402
+
+TTL = 0.6
+
+
+class Checks:
+    """Збирає результати перевірок одного сценарію замість того, щоб зупинятися на першій помилці."""
+
+    def __init__(self, backend: str, scenario: str):
+        self.backend = backend
+        self.scenario = scenario
+        self.failed: list[str] = []
+        self.passed = 0
+
+    def check(self, what: str, ok: bool, detail=None) -> None:
+        if ok:
+            self.passed += 1
+        else:
+            self.failed.append(what if detail is None else f"{what}: {detail!r}")
+
+    def row(self, **extra) -> dict:
+        return {"backend": self.backend, "scenario": self.scenario, "passed": self.passed, "failed": self.failed, **extra}
+
+
+async def scenario_lease(url: str) -> dict:
+    a, b = create_shared_state(url), create_shared_state(url)
+    c = Checks(url, "lease")
+    try:
+        c.check("a acquires a free lease", await a.acquire_lease("lease", "a", TTL))
+        c.check("b is refused while a holds it", not await b.acquire_lease("lease", "b", TTL))
+        c.check("a renews its own lease", await a.acquire_lease("lease", "a", TTL))
+        await b.release_lease("lease", "b")
+        c.check("b cannot release a's lease", not await b.acquire_lease("lease", "b", TTL))
+        await a.release_lease("lease", "a")
+        c.check("b acquires after a releases", await b.acquire_lease("lease", "b", TTL))
+        c.check("a is refused now", not await a.acquire_lease("lease", "a", TTL))
+    finally:
+        await a.close()
+        await b.close()
+    return c.row()
+
+
+async def scenario_expiry(url: str) -> dict:
+    a, b = create_shared_state(url), create_shared_state(url)
+    c = Checks(url, "lease expiry")
+    try:
+        c.check("a acquires", await a.acquire_lease("expiry", "a", TTL))
+        await asyncio.sleep(TTL / 2)
+        c.check("b is refused before ttl", not await b.acquire_lease("expiry", "b", TTL))
+        # a «зависла» і не продовжувала оренду
+        await asyncio.sleep(TTL)
+        c.check("b takes over after ttl", await b.acquire_lease("expiry", "b", TTL))
+        c.check("a cannot renew b's lease", not await a.acquire_lease("expiry", "a", TTL))
+        await a.release_lease("expiry", "a")
+        c.check("a's late release leaves b's lease", not await a.acquire_lease("expiry", "a", TTL))
+    finally:
+        await a.close()
+        await b.close()
+    return c.row()
+
+
+async def scenario_leader(url: str) -> dict:
+    states = [create_shared_state(url), create_shared_state(url)]
+    leases = [LeaderLease(state, "leader", owner, ttl=TTL) for state, owner in zip(states, "ab")]
+    c = Checks(url, "leader")
+
+    async def leader_job() -> None:
+        await asyncio.Event().wait()
+
+    async def slow_follower_job() -> None:
+        # Довше за ttl: якби синхронізація йшла в циклі оренди, оренда не продовжувалася б
+        await asyncio.sleep(TTL * 5)
+
+    tasks = [asyncio.create_task(lease.run(leader_job, slow_follower_job, TTL / 6)) for lease in leases]
+    takeover = None
+    try:
+        await asyncio.sleep(TTL * 2)
+        leaders = [lease.owner for lease in leases if lease.is_leader]
+        c.check("exactly one leader", len(leaders) == 1, leaders)
+        if len(leaders) == 1:
+            first = next(i for i, lease in enumerate(leases) if lease.is_leader)
+            other = leases[1 - first]
+            await asyncio.sleep(TTL * 2)
+            c.check("leader keeps the lease while the follower syncs", leases[first].is_leader and not other.is_leader)
+            tasks[first].cancel()
+            await asyncio.gather(tasks[first], return_exceptions=True)
+            started = time.monotonic()
+            while not other.is_leader and time.monotonic() - started < TTL * 3:
+                await asyncio.sleep(0.01)
+            takeover = round(time.monotonic() - started, 3)
+            c.check("follower takes over within ttl", other.is_leader and takeover <= TTL, takeover)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for state in states:
+            await state.close()
+    return c.row(takeover_s=takeover)
+
+
+async def scenario_queue(url: str) -> dict:
+    # Одна репліка приймає /subscribe і /unsubscribe, інша (лідер) розсилає
+    front, leader = create_shared_state(url), create_shared_state(url)
+    c = Checks(url, "queue")
+    try:
+        c.check("subscribe", await front.subscribe(1, "blum"))
+        c.check("second subscribe is a no-op", not await front.subscribe(1, "blum"))
+        await front.subscribe(1, "hamster")
+        await front.subscribe(2, "blum")
+        c.check("subscriptions are shared", await leader.subscriptions(1) == ["blum", "hamster"], await leader.subscriptions(1))
+
+        c.check("enqueue for every subscriber", await leader.enqueue_broadcast("blum") == 2)
+        c.check("one pending job per chat and game", await leader.enqueue_broadcast("blum") == 0)
+        due = await leader.due_broadcasts(10)
+        c.check("both jobs due", sorted((chat, game, tries) for _, chat, game, tries in due) == [(1, "blum", 0), (2, "blum", 0)], due)
+
+        jobs = {chat: job for job, chat, _, _ in due}
+        await leader.retry_broadcast(jobs[2], TTL, 1)
+        due = await leader.due_broadcasts(10)
+        c.check("retry postpones the job", [chat for _, chat, _, _ in due] == [1], due)
+        await leader.complete_broadcast(jobs[1])
+        c.check("complete removes the job", await leader.due_broadcasts(10) == [])
+        await asyncio.sleep(TTL * 1.2)
+        due = await leader.due_broadcasts(10)
+        c.check("retried job is due again with its attempts", [(chat, tries) for _, chat, _, tries in due] == [(2, 1)], due)
+
+        c.check("unsubscribe from everything", await front.unsubscribe(2) == 1)
+        c.check("unsubscribe drops pending jobs", await leader.due_broadcasts(10) == [])
+        await leader.retry_broadcast(jobs[2], 0, 2)
+        c.check("retry does not bring an unsubscribed job back", await leader.due_broadcasts(10) == [])
+        c.check("other subscriptions stay", await leader.subscriptions(1) == ["blum", "hamster"])
+        c.check("unsubscribe from one game", await front.unsubscribe(1, "hamster") == 1)
+        c.check("enqueue skips unsubscribed chats", await leader.enqueue_broadcast("hamster") == 0)
+    finally:
+        await front.close()
+        await leader.close()
+    return c.row()
+
+
+async def run(backends: list[str]) -> list[dict]:
+    rows = []
+    for url in backends:
+        for scenario in (scenario_lease, scenario_expiry, scenario_leader, scenario_queue):
+            rows.append(await scenario(url))
+    return rows
+
+
+def print_table(rows: list[dict]) -> None:
+    width = max(len("backend"), *(len(r["backend"]) for r in rows))
+    header = f"{'backend':<{width}} {'scenario':<14} {'passed':>6} {'failed':>6}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(f"{r['backend']:<{width}} {r['scenario']:<14} {r['passed']:>6} {len(r['failed']):>6}")
+    for r in rows:
+        for failure in r["failed"]:
+            print(f"FAIL {r['backend']} {r['scenario']}: {failure}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--backends", nargs="+",
+        default=["fakeredis://", f"sqlite://{Path(tempfile.mkdtemp(prefix='combo-replicas-')) / 'shared.sqlite3'}"],
+        help="SHARED_STATE_URL бекендів для перевірки",
+    )
+    parser.add_argument("--json", help="зберегти результати у JSON-файл")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args.backends))
+    print_table(rows)
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, ensure_ascii=False, indent=2))
+    if any(r["failed"] for r in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Офлайн-симуляція планувальника оновлень: фіксований інтервал проти refresh_scheduler на модельному часі.
+
+    python benchmarks/schedule_sim.py
+    python benchmarks/schedule_sim.py --days 60 --seed 7
+
+Для кожної гри задано звичний час публікації з розкидом (і рідкісні публікації в довільний час).
+Рахується, скільки запитів до джерел робить кожна стратегія на добу і через скільки хвилин
+після публікації бот бачить нове комбо. Перші --warmup днів (поки вивчається вікно) не враховуються.
+"""
+import argparse
+import random
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from refresh_scheduler import DAY, PollIntervals, learn_window, plan_poll  # noqa: E402
+
+# гра -> (звичний час публікації, год; стандартне відхилення, хв)
+PUBLISH_PATTERNS = {
+    "hamster": (19.0, 10),
+    "tapswap": (14.0, 20),
+    "blum": (9.0, 5),
+    "cattea": (12.0, 30),
+    "tonstation": (8.0, 15),
+}
+OUTLIER_RATE = 0.05  # частка днів, коли комбо виходить у довільний час
+
+
+def publish_schedule(start: float, days: int, hour: float, sigma_min: float, rng: random.Random) -> list[float]:
+    times = []
+    for day in range(days):
+        if rng.random() < OUTLIER_RATE:
+            offset = rng.uniform(0, DAY)
+        else:
+            offset = hour * 3600 + rng.gauss(0, sigma_min * 60)
+        times.append(start + day * DAY + offset)
+    return sorted(times)
+
+
+def simulate(publishes: list[float], start: float, end: float, next_delay, rng: random.Random, count_from: float) -> dict:
+    """Опитує джерело з кроком next_delay(t, history); повертає кількість запитів і затримки виявлення."""
+    t = start + rng.uniform(0, 60)
+    seen = 0
+    history: list[float] = []
+    polls = 0
+    delays = []
+    while t < end:
+        if t >= count_from:
+            polls += 1
+        available = sum(1 for p in publishes if p <= t)
+        if available > seen:
+            if publishes[available - 1] >= count_from:
+                delays.append((t - publishes[available - 1]) / 60)
+            seen = available
+            history.append(t)
+        t += next_delay(t, history)
+    return {"polls": polls, "delays": delays}
+
+
+def summarize(name: str, runs: list[dict], days: int) -> dict:
+    delays = sorted(d for run in runs for d in run["delays"])
+
+    def pick(q: float) -> float:
+        return delays[min(len(delays) - 1, int(q * len(delays)))] if delays else 0.0
+
+    return {
+        "strategy": name,
+        "requests_per_day": round(sum(run["polls"] for run in runs) / days, 1),
+        "delay_mean_min": round(sum(delays) / len(delays), 2) if delays else 0.0,
+        "delay_p50_min": round(pick(0.5), 2),
+        "delay_p90_min": round(pick(0.9), 2),
+        "delay_max_min": round(delays[-1], 2) if delays else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=42)
+    parser.add_argument("--warmup", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fixed", type=float, nargs="+", default=[5 * 60, 15 * 60], help="фіксовані інтервали для порівняння, с")
+    args = parser.parse_args()
+
+    start = datetime(2026, 1, 5).timestamp()
+    end = start + args.days * DAY
+    count_from = start + args.warmup * DAY
+    counted_days = args.days - args.warmup
+    intervals = PollIntervals()
+    schedules = {
+        game: publish_schedule(start, args.days, hour, sigma, random.Random(f"{args.seed}-{game}"))
+        for game, (hour, sigma) in PUBLISH_PATTERNS.items()
+    }
+
+    rows = []
+    for interval in args.fixed:
+        rng = random.Random(args.seed)
+        runs = [simulate(times, start, end, lambda t, h: interval, rng, count_from) for times in schedules.values()]
+        rows.append(summarize(f"fixed {interval / 60:.0f} min", runs, counted_days))
+
+    rng = random.Random(args.seed)
+
+    def adaptive(t: float, history: list[float]) -> float:
+        recent = [h for h in history if h >= t - 15 * DAY]
+        delay, mode = plan_poll(t, learn_window(recent), max(history, default=None), intervals)
+        return delay if mode == "window" else delay * rng.uniform(0.9, 1.1)
+
+    runs = [simulate(times, start, end, adaptive, rng, count_from) for times in schedules.values()]
+    rows.append(summarize("adaptive", runs, counted_days))
+
+    header = f"{'strategy':<14} {'req/day':>8} {'mean min':>9} {'p50 min':>8} {'p90 min':>8} {'max min':>8}"
+    print(f"{len(PUBLISH_PATTERNS)} games, {counted_days} days after {args.warmup}-day warmup\n")
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(
+            f"{r['strategy']:<14} {r['requests_per_day']:>8} {r['delay_mean_min']:>9} "
+            f"{r['delay_p50_min']:>8} {r['delay_p90_min']:>8} {r['delay_max_min']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
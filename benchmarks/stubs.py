@@ -0,0 +1,406 @@
+"""
+Локальні заглушки для офлайн-замірів: HTTP-сервер із записаними сторінками джерел,
+сесія aiogram, яка відповідає на виклики Bot API без мережі, HTTP-заглушка Bot API
+і запуск бота окремим процесом (main.py) поверх цих заглушок.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import socket
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+from aiogram import types
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, SendMediaGroup, SendMessage, SendPhoto
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+def load_fixtures() -> dict[str, bytes]:
+    """HTML-знімки джерел: {гра: байти сторінки}."""
+    return {path.stem: path.read_bytes() for path in sorted(FIXTURES_DIR.glob("*.html"))}
+
+
+class FixtureServer:
+    """
+    Локальна заміна miningcombo.com / hamster-combo.com: GET /<гра> віддає знімок сторінки
+    з ETag і відповідає 304 на If-None-Match. `latency` імітує час відповіді upstream.
+    Якщо задано `chunk_size`, тіло віддається шматками з паузою `chunk_delay` (повільний канал),
+    а `bytes_sent` показує, скільки встигли відправити до того, як клієнт закрив з'єднання.
+
+    Збої для перевірки стійкості вмикаються через set_fault(гра, вид, частка запитів):
+    "error" — 503, "slow" — відповідь після `fault_delay` секунд, "hang" — відповіді немає зовсім,
+    "reset" — з'єднання обривається без відповіді. Гра "*" — збій для всіх сторінок.
+    """
+
+    def __init__(self, fixtures: dict[str, bytes], latency: float = 0.0, chunk_size: int = 0, chunk_delay: float = 0.0):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.requests = Counter()
+        self.bytes_sent = Counter()
+        self.faults: dict[str, tuple[str, float]] = {}
+        self.fault_delay = 5.0
+        self._etags = {game: f'"{hashlib.md5(body).hexdigest()}"' for game, body in fixtures.items()}
+        self._runner: web.AppRunner | None = None
+        self.base_url = ""
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        game = request.match_info["game"]
+        if game not in self.fixtures:
+            raise web.HTTPNotFound()
+        self.requests[game] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        kind, rate = self.faults.get(game) or self.faults.get("*") or (None, 0.0)
+        if kind and random.random() < rate:
+            if kind == "error":
+                return web.Response(status=503, text="Service Unavailable")
+            if kind == "slow":
+                await asyncio.sleep(self.fault_delay)
+            elif kind == "hang":
+                await asyncio.Event().wait()
+            elif kind == "reset":
+                request.transport.close()
+                return web.Response(status=500)
+        etag = self._etags[game]
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        body = self.fixtures[game]
+        if not self.chunk_size:
+            self.bytes_sent[game] += len(body)
+            return web.Response(body=body, content_type="text/html", charset="utf-8", headers={"ETag": etag})
+
+        response = web.StreamResponse(headers={"ETag": etag, "Content-Type": "text/html; charset=utf-8"})
+        await response.prepare(request)
+        try:
+            for i in range(0, len(body), self.chunk_size):
+                await response.write(body[i:i + self.chunk_size])
+                self.bytes_sent[game] += len(body[i:i + self.chunk_size])
+                await asyncio.sleep(self.chunk_delay)
+            await response.write_eof()
+        except (ConnectionResetError, RuntimeError):
+            pass  # клієнт отримав достатньо і закрив з'єднання
+        return response
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/{game}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    def set_fault(self, game: str, kind: str | None, rate: float = 1.0) -> None:
+        """Вмикає збій `kind` для частки `rate` запитів до гри (None — вимикає)."""
+        if kind is None:
+            self.faults.pop(game, None)
+        else:
+            self.faults[game] = (kind, rate)
+
+    def url(self, game: str) -> str:
+        return f"{self.base_url}/{game}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rules_for(server: FixtureServer, source: Path) -> str:
+    """Текст combo_rules.toml, у якому url кожної гри зі знімком веде на `server` (для COMBO_RULES_PATH)."""
+    def replace(match: re.Match) -> str:
+        game = match.group(2)
+        return f'{match.group(1)}url = "{server.url(game)}"' if game in server.fixtures else match.group(0)
+
+    return re.sub(r'(\[sources\.(\w+)\]\n)url = "[^"]*"', replace, source.read_text(encoding="utf-8"))
+
+
+class TelegramStubServer:
+    """
+    HTTP-заміна api.telegram.org для бота в окремому процесі (TELEGRAM_API_URL=base_url):
+    POST /bot<token>/<метод> повертає правдоподібний результат після `latency` секунд.
+    `calls` рахує виклики за методом, `log` зберігає (час, метод, параметри) кожного виклику,
+    а wait_for() чекає на виклик, що задовольняє умову (наприклад, відповідь конкретному чату).
+    Для тисяч викликів журнал вимикається (keep_log=False), а `on_call(метод, параметри)`
+    викликається в момент, коли запит дійшов до заглушки.
+    """
+
+    def __init__(self, latency: float = 0.0, keep_log: bool = True, on_call=None):
+        self.latency = latency
+        self.keep_log = keep_log
+        self.on_call = on_call
+        self.calls = Counter()
+        self.log: list[tuple[float, str, dict]] = []
+        self._changed = asyncio.Condition()
+        self._message_id = 0
+        self._runner: web.AppRunner | None = None
+        self.base_url = ""
+
+    def _message(self, params: dict, photo: bool = False) -> dict:
+        self._message_id += 1
+        message = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id") or 0), "type": "private"},
+        }
+        if photo:
+            message["photo"] = [{"file_id": f"stub-file-{self._message_id}", "file_unique_id": "u", "width": 800, "height": 450}]
+        else:
+            message["text"] = params.get("text", "")
+        return message
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+        if self.on_call is not None:
+            self.on_call(method, params)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method == "sendPhoto":
+            result = self._message(params, photo=True)
+        elif method == "sendMediaGroup":
+            result = [self._message(params, photo=True) for _ in json.loads(params.get("media", "[]"))]
+        elif method in ("sendMessage", "editMessageText"):
+            result = self._message(params)
+        elif method == "getWebhookInfo":
+            result = {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        else:
+            result = True
+        if self.keep_log:
+            async with self._changed:
+                self.log.append((time.perf_counter(), method, params))
+                self._changed.notify_all()
+        return web.json_response({"ok": True, "result": result})
+
+    async def wait_for(self, predicate, timeout: float = 30.0) -> tuple[float, str, dict]:
+        """Перший запис журналу (час perf_counter, метод, параметри), для якого predicate(метод, параметри) істинний."""
+        def find():
+            return next((entry for entry in self.log if predicate(entry[1], entry[2])), None)
+
+        async with self._changed:
+            await asyncio.wait_for(self._changed.wait_for(find), timeout)
+            return find()
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def wait_http(session: aiohttp.ClientSession, url: str, status: int = 200, timeout: float = 60.0) -> float:
+    """Опитує url кожні 5 мс, доки він не відповість зі статусом `status`; повертає час perf_counter."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            async with session.get(url) as response:
+                if response.status == status:
+                    return time.perf_counter()
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.005)
+    raise TimeoutError(f"{url} не відповів {status} за {timeout:.0f} с")
+
+
+class BotProcess:
+    """
+    Бот окремим процесом (`python main.py`), як на Railway: Bot API — TelegramStubServer, джерела — FixtureServer
+    (COMBO_RULES_PATH з їхніми адресами). Том — workdir/data, вивід процесу — workdir/bot.log.
+    Додаткові змінні оточення (наприклад, UPDATE_MAX_CONCURRENCY) передаються через `env`.
+    """
+
+    def __init__(self, server: FixtureServer, telegram: TelegramStubServer, workdir: Path, env: dict | None = None):
+        self.workdir = workdir
+        (workdir / "data").mkdir(parents=True, exist_ok=True)
+        rules_path = workdir / "combo_rules.toml"
+        rules_path.write_text(rules_for(server, ROOT / "combo_rules.toml"), encoding="utf-8")
+        self.env = {
+            **os.environ,
+            "BOT_TOKEN": "123456:stub",
+            "WEBHOOK_HOST": "https://stub.invalid",
+            "TELEGRAM_API_URL": telegram.base_url,
+            "COMBO_RULES_PATH": str(rules_path),
+            "DATA_DIR": str(workdir / "data"),
+            "HTTP2_ENABLED": "0",
+            **(env or {}),
+        }
+        self.process: asyncio.subprocess.Process | None = None
+        self.base_url = ""
+        self.started = 0.0
+
+    @property
+    def log_path(self) -> Path:
+        return self.workdir / "bot.log"
+
+    async def start(self) -> None:
+        port = free_port()
+        self.base_url = f"http://127.0.0.1:{port}"
+        with open(self.log_path, "a") as log_file:
+            self.started = time.perf_counter()
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, str(ROOT / "main.py"), cwd=ROOT, env={**self.env, "PORT": str(port)},
+                stdout=log_file, stderr=log_file,
+            )
+
+    def memory_kib(self) -> dict[str, int]:
+        """VmRSS (зараз) і VmHWM (пік) головного процесу бота, КіБ; воркери пулу парсингу — окремі процеси."""
+        values = {}
+        with open(f"/proc/{self.process.pid}/status") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    values[key] = int(rest.split()[0])
+        return values
+
+    def children_rss_kib(self) -> int:
+        """Сумарний VmRSS дочірніх процесів бота (forkserver і воркери пулу парсингу), КіБ."""
+        total = 0
+        pending = [self.process.pid]
+        while pending:
+            pid = pending.pop()
+            try:
+                for task in os.listdir(f"/proc/{pid}/task"):
+                    with open(f"/proc/{pid}/task/{task}/children") as f:
+                        pending.extend(int(child) for child in f.read().split())
+                if pid != self.process.pid:
+                    with open(f"/proc/{pid}/status") as f:
+                        total += next((int(line.split()[1]) for line in f if line.startswith("VmRSS:")), 0)
+            except (FileNotFoundError, ProcessLookupError):
+                continue
+        return total
+
+    def cpu_seconds(self) -> float:
+        """Процесорний час (user + system) головного процесу бота з /proc/<pid>/stat."""
+        with open(f"/proc/{self.process.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    async def stop(self) -> None:
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+            await self.process.wait()
+
+
+class StubSession(BaseSession):
+    """
+    Сесія aiogram без мережі: кожен метод Bot API повертає правдоподібну відповідь
+    після `latency` секунд. Лічильник `calls` рахує виклики за назвою методу.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self._message_id = 0
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    def _message(self, chat_id, text: str | None = None, photo: bool = False) -> types.Message:
+        self._message_id += 1
+        return types.Message(
+            message_id=self._message_id,
+            date=datetime.now(),
+            chat=types.Chat(id=chat_id or 0, type="private"),
+            text=text,
+            photo=[types.PhotoSize(file_id=f"stub-file-{self._message_id}", file_unique_id="u", width=800, height=450)] if photo else None,
+        )
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, SendPhoto):
+            return self._message(method.chat_id, photo=True)
+        if isinstance(method, SendMediaGroup):
+            return [self._message(method.chat_id, photo=True) for _ in method.media]
+        if isinstance(method, SendMessage):
+            return self._message(method.chat_id, text=method.text)
+        if isinstance(method, EditMessageText):
+            return self._message(method.chat_id, text=method.text)
+        return True
+
+
+def callback_update(update_id: int, chat_id: int, data: str) -> dict:
+    """Сирий JSON апдейту callback_query, як його надсилає Telegram у вебхук."""
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Load"},
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": "🎮 Щоденні комбо ігор",
+            },
+        },
+    }
+
+
+def inline_update(update_id: int, user_id: int, query: str) -> dict:
+    """Сирий JSON inline-запиту (`@бот <query>`)."""
+    return {
+        "update_id": update_id,
+        "inline_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Load"},
+            "query": query,
+            "offset": "",
+        },
+    }
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    """p50/p90/p99/mean/max у мілісекундах."""
+    if not samples:
+        return {"p50": 0.0, "p90": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "p50": round(pick(0.50), 3),
+        "p90": round(pick(0.90), 3),
+        "p99": round(pick(0.99), 3),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3),
+    }
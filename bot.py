@@ -1,21 +1,117 @@
 import os
 import asyncio
+import hashlib
 import logging
-import httpx
+import re
+import time
+from dataclasses import asdict, dataclass
 from datetime import datetime
-from bs4 import BeautifulSoup
+from functools import cache, lru_cache
 from aiohttp import web
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import CommandStart
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler
 from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import (
+    BufferedInputFile,
+    InlineQueryResultArticle,
+    InlineQueryResultCachedPhoto,
+    InlineQueryResultsButton,
+    InputMediaPhoto,
+    InputTextMessageContent,
+)
+
+from broadcast import Broadcaster, RateLimiter
+from combo_cache import ComboCache
+import combo_parsers
+from combo_parsers import PARSERS, RULES, ComboResult, StreamScanner, is_complete, parse_cache
+from combo_store import ComboStore
+from http_client import FetchResult, HttpClient, http_date
+from metrics import (
+    COMBO_REQUEST_SECONDS,
+    COMBO_REQUESTS,
+    COMBO_VERSIONS,
+    DETECTION_LATENCY,
+    INLINE_QUERIES,
+    PARSE_SECONDS,
+    TelegramMetricsMiddleware,
+    cache_collector,
+    metrics_handler,
+    monitor_event_loop_lag,
+)
+from parse_executor import parse_executor
+from readiness import Readiness, ReadinessMiddleware
+from refresh_scheduler import AdaptiveScheduler, PollIntervals
+from shared_state import LeaderLease, MemoryState, create_shared_state, default_replica_id
+from update_throttle import CallbackThrottleMiddleware
 
 # ================== CONFIG & LOGGING ==================
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 WEBHOOK_HOST = os.getenv("WEBHOOK_HOST")
 PORT = int(os.getenv("PORT", 8080))
+# Власний Bot API server (локальний telegram-bot-api або заглушка для навантажувальних тестів); "" — api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+# Скільки секунд апдейт, що прийшов під час запуску, чекає на прогрів кешу, перш ніж обробитися без нього
+STARTUP_UPDATE_WAIT = float(os.getenv("STARTUP_UPDATE_WAIT", 10))
+# Том Railway (див. railway.toml) — тут лежить постійне сховище комбо
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+# Як передавати нові картинки в Telegram: "url" — Telegram сам завантажує з сайту,
+# "upload" — бот один раз завантажує байти і відправляє їх файлом. Далі завжди використовується file_id.
+IMAGE_UPLOAD_MODE = os.getenv("IMAGE_UPLOAD_MODE", "url")
+# Ліміт розміру картинки для "upload" (Telegram приймає фото файлом до 10 МБ); більша — передаємо URL
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 10 * 1024 * 1024))
+
+# Розсилка підписникам: глобальний ліміт Telegram (~30 повідомлень/с) і інтервал для одного чату
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 25))
+BROADCAST_PER_CHAT_INTERVAL = float(os.getenv("BROADCAST_PER_CHAT_INTERVAL", 1.0))
+
+# Обробка натискань: скільки хендлерів одночасно, скільки апдейтів може чекати, вікно debounce повторів
+UPDATE_MAX_CONCURRENCY = int(os.getenv("UPDATE_MAX_CONCURRENCY", 64))
+UPDATE_MAX_WAITING = int(os.getenv("UPDATE_MAX_WAITING", 1000))
+CALLBACK_DEBOUNCE_SECONDS = float(os.getenv("CALLBACK_DEBOUNCE_SECONDS", 2.0))
+# Скільки секунд Telegram може віддавати ту саму відповідь на inline-запит без звернення до бота
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", 300))
+
+# Кеш комбо: скільки секунд запис вважається свіжим і скільки ще його можна віддавати, оновлюючи у фоні
+COMBO_CACHE_TTL = int(os.getenv("COMBO_CACHE_TTL", 10 * 60))
+COMBO_CACHE_STALE_TTL = int(os.getenv("COMBO_CACHE_STALE_TTL", 60 * 60))
+# Як часто оновлювати джерело, поки його час публікації ще не вивчено (має бути меншим за COMBO_CACHE_TTL);
+# з цим же інтервалом ведені репліки підтягують результати лідера
+COMBO_REFRESH_INTERVAL = int(os.getenv("COMBO_REFRESH_INTERVAL", 5 * 60))
+# Адаптивний планувальник: часте опитування у звичному вікні публікації (вивчається з історії
+# за PUBLISH_HISTORY_DAYS днів, розширюється на PUBLISH_WINDOW_MARGIN с), рідке — до вікна і після підтвердження
+POLL_WINDOW_MIN = float(os.getenv("POLL_WINDOW_MIN", 30))
+POLL_WINDOW_MAX = float(os.getenv("POLL_WINDOW_MAX", 60))
+POLL_IDLE_INTERVAL = float(os.getenv("POLL_IDLE_INTERVAL", 30 * 60))
+POLL_CONFIRMED_INTERVAL = float(os.getenv("POLL_CONFIRMED_INTERVAL", 3 * 3600))
+PUBLISH_HISTORY_DAYS = int(os.getenv("PUBLISH_HISTORY_DAYS", 14))
+PUBLISH_WINDOW_MARGIN = float(os.getenv("PUBLISH_WINDOW_MARGIN", 15 * 60))
+
+# HTTP-клієнт до джерел комбо: таймаут, розмір пулу з'єднань, HTTP/2
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 20))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 20))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") == "1"
+# Жорсткий ліміт розміру сторінки та потокове читання: завантаження зупиняється, щойно комбо знайдено
+HTTP_MAX_BYTES = int(os.getenv("HTTP_MAX_BYTES", 2 * 1024 * 1024))
+STREAM_FETCH = os.getenv("STREAM_FETCH", "1") == "1"
+# Стійкість до збоїв джерел: одночасні запити на хост, повтори з випадковою паузою (сумарно не довше
+# HTTP_RETRY_DEADLINE с), запобіжник хоста і затримка, після якої паралельно запитується дзеркало
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", 4))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 2))
+HTTP_RETRY_DEADLINE = float(os.getenv("HTTP_RETRY_DEADLINE", 30))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 30))
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", 2.0))
+
+# Кілька реплік: спільний стан для комбо і file_id ("" — лише пам'ять, redis://..., sqlite:///...)
+# та оренда, завдяки якій джерела скрапить лише одна репліка
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "")
+LEADER_LEASE_TTL = float(os.getenv("LEADER_LEASE_TTL", 60))
+REPLICA_ID = os.getenv("REPLICA_ID") or default_replica_id()
 
 if not BOT_TOKEN or not WEBHOOK_HOST:
     raise RuntimeError("BOT_TOKEN або WEBHOOK_HOST не встановлено")
@@ -26,255 +122,69 @@ WEBHOOK_URL = f"{WEBHOOK_HOST}{WEBHOOK_PATH}"
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 log = logging.getLogger(__name__)
 
-bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+bot = Bot(
+    token=BOT_TOKEN,
+    session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None,
+    default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+)
+bot.session.middleware(TelegramMetricsMiddleware())
 dp = Dispatcher()
-
-# ================== SOURCES & BASE URLS ==================
-SOURCES = {
-    "hamster": "https://hamster-combo.com",
-    "tapswap": "https://miningcombo.com/tapswap-2/",
-    "blum": "https://miningcombo.com/blum-2/",
-    "cattea": "https://miningcombo.com/cattea/",
-    "tonstation": "https://miningcombo.com/ton-station/",
-}
-
-BASE_URLS = {
-    "hamster": "https://hamster-combo.com",
-    "tapswap": "https://miningcombo.com",
-    "blum": "https://miningcombo.com",
-    "cattea": "https://miningcombo.com",
-    "tonstation": "https://miningcombo.com",
-}
-
-# ================== ДОПОМІЖНА ФУНКЦІЯ ДЛЯ ЗОБРАЖЕНЬ (ОНОВЛЕНО) ==================
-def _find_combo_image_url(soup: BeautifulSoup, game_name: str, base_url: str) -> str | None:
-    """Шукає тег <img> з ключовими словами УСЕРЕДИНІ КОНТЕНТУ та повертає абсолютний URL."""
-    
-    # Ключові слова, які вказують на комбо
-    keywords = ["combo", "cipher", "комбо", "daily", "щоденне", game_name.lower().replace(" ", "-")]
-    # Слова, які вказують на логотип, іконку чи заглушку
-    EXCLUDED_KEYWORDS = ["logo", "icon", "favicon", "cropped", "placeholder", "74x95", "150x150"] 
-    
-    content_area = soup.find(["article", "div"], class_=lambda x: x and ('entry-content' in x or 'main-content' in x or 'post-content' in x))
-    if not content_area:
-        content_area = soup
-
-    for img in content_area.find_all("img"):
-        src = img.get("src", "")
-        alt = img.get("alt", "")
-        title = img.get("title", "")
-        
-        img_check_string = src.lower() + alt.lower() + title.lower()
-        
-        # 1. Виключаємо зображення за ключовими словами
-        if any(exc in img_check_string for exc in EXCLUDED_KEYWORDS):
-            continue
-
-        # 2. Зображення має бути релевантним АБО достатньо великим
-        is_relevant = any(k in img_check_string for k in keywords)
-        
-        # Перевірка розміру (фільтр малих картинок)
-        is_large_enough = False
-        width = img.get("width")
-        height = img.get("height")
-        try:
-            # Збільшуємо мінімальний розмір, щоб виключити банери/іконки
-            if width and height and int(width) > 200 and int(height) > 200:
-                is_large_enough = True
-        except ValueError:
-            pass
-
-        if is_relevant or is_large_enough:
-            # Вирішення відносного шляху
-            if src.startswith('http'):
-                return src
-            elif src.startswith('//'):
-                return f"https:{src}"
-            elif src.startswith('/'):
-                return base_url.rstrip('/') + src
-            
-    return None
-
-# ================== ПАРСЕРИ (З ДОДАТКОВИМ АРГУМЕНТОМ) ==================
-
-# Тепер парсери приймають `prefer_text: bool`
-def parse_hamster(html: str, prefer_text: bool = False) -> dict:
-    """
-    Парсер Hamster. Повертає словник:
-    - {'type': 'data', 'url': str | None, 'cards': list[str], 'morse': str | None}
-    - {'type': 'error', 'message': str}
-    """
-    soup = BeautifulSoup(html, "html.parser")
-    base_url = BASE_URLS["hamster"]
-
-    # 1. Спроба знайти ЗОБРАЖЕННЯ (якщо prefer_text=False)
-    image_url = None
-    if not prefer_text:
-        image_url = _find_combo_image_url(soup, "hamster", base_url)
-
-    # 2. ТЕКСТОВИЙ/МОРЗЕ FALLBACK (завжди запускаємо для збору даних підпису)
-    morse_code = []
-    cards = []
-    
-    # Регулярний вираз для пошуку шифру Морзе (буква + пробіл + крапки/тире)
-    import re
-    morse_pattern = re.compile(r'([a-zA-Z])\s*(\s*[\.\-]+)\s*$', re.IGNORECASE)
-    
-    header_found = False
-    
-    for tag in soup.find_all(["p", "li", "div", "span", "strong", "h1", "h2", "h3", "h4"]):
-        text = tag.get_text(strip=True)
-        
-        # Заголовки допомагають знайти початок контенту
-        if tag.name in ["h1", "h2", "h3", "h4"] and ("combo" in text.lower() or "cipher" in text.lower()):
-            header_found = True
-            continue # Пропускаємо сам заголовок
-            
-        # Якщо заголовок знайдено або це великий пост, починаємо парсинг
-        if not header_found and tag.name not in ["h1", "h2", "h3", "h4"]:
-             # Може бути просто текст у статті без явного заголовка
-             pass 
-
-        # Парсинг ШИФРУ МОРЗЕ
-        morse_match = morse_pattern.search(text)
-        if morse_match:
-            letter = morse_match.group(1).upper()
-            code = morse_match.group(2).strip().replace(' ', '')
-            morse_code.append(f"{letter} {code}")
-            
-        # Парсинг КАРТОК (великі літери)
-        if text.isupper() and 4 <= len(text) <= 30 and text not in cards and "combo" not in text.lower() and "cipher" not in text.lower():
-            cards.append(text)
-            
-        # Обмежуємо кількість знайдених даних
-        if len(cards) >= 3 and len(morse_code) >= 4:
-            break
-            
-    # 3. ФІНАЛЬНИЙ РЕЗУЛЬТАТ
-    if len(cards) >= 3 or len(morse_code) > 0 or image_url:
-        morse_string = "\n".join(morse_code) if morse_code else None
-        
-        # Нова уніфікована структура: тип 'data' завжди містить всі знайдені елементи
-        return {'type': 'data', 'url': image_url, 'cards': cards[:3], 'morse': morse_string}
-        
-    return {'type': 'error', 'message': "⏳ <b>Комбо ще не опубліковане</b>"}
-
-def parse_tapswap(html: str, prefer_text: bool = False) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-    base_url = BASE_URLS["tapswap"]
-    
-    image_url = _find_combo_image_url(soup, "tapswap", base_url)
-    
-    codes = []
-    for tag in soup.find_all(["p", "div", "span", "strong"]):
-        text = tag.get_text(strip=True)
-        if "code" in text.lower() or "cipher" in text.lower():
-            parts = text.split()
-            for part in parts:
-                cleaned_part = ''.join(filter(str.isalnum, part))
-                if cleaned_part.isalnum() and 4 <= len(cleaned_part) <= 10:
-                    codes.append(cleaned_part.upper())
-    codes = list(dict.fromkeys(codes))
-    text_body = "\n".join(f"• <b>{c}</b>" for c in codes[:5]) or "⏳ <b>Комбо ще не знайдено</b>"
-
-    if image_url and not prefer_text:
-        return f"__IMAGE_URL__:{image_url}"
-    return text_body
-
-def parse_blum(html: str, prefer_text: bool = False) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-    base_url = BASE_URLS["blum"]
-    
-    image_url = _find_combo_image_url(soup, "blum", base_url)
-        
-    codes = []
-    for tag in soup.find_all(["strong", "p", "span", "div"]):
-        text = tag.get_text(strip=True)
-        if text.isupper() and 5 <= len(text) <= 20 and text not in codes and "combo" not in text.lower():
-            codes.append(text)
-        if len(codes) >= 3:
-            break
-            
-    text_body = "\n".join(f"• <b>{c}</b>" for c in codes[:3]) or "⏳ <b>Комбо ще не знайдено</b>"
-
-    if image_url and not prefer_text:
-        return f"__IMAGE_URL__:{image_url}"
-    return text_body
-
-def parse_cattea(html: str, prefer_text: bool = False) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-    base_url = BASE_URLS["cattea"]
-    
-    image_url = _find_combo_image_url(soup, "cattea", base_url)
-        
-    if "searching" in html.lower() or "coming soon" in html.lower():
-        text_body = "⏳ <b>Комбо ще не знайдено (searching...)</b>"
-    else:
-        header = soup.find(lambda tag: tag.name in ["h2", "h3", "h4"] and "cattea" in tag.get_text(strip=True).lower())
-        if not header:
-            text_body = "⏳ <b>Комбо ще не опубліковане</b>"
-        else:
-            cards = []
-            for tag in header.find_all_next(["p", "li", "div", "strong", "span"]):
-                text = tag.get_text(strip=True)
-                if text and len(text) > 3 and text not in cards and "combo" not in text.lower():
-                    cards.append(text)
-                if len(cards) >= 4:
-                    break
-            text_body = "\n".join(f"• <b>{c}</b>" for c in cards[:4]) or "⏳ <b>Комбо ще не знайдено</b>"
-
-    if image_url and not prefer_text:
-        return f"__IMAGE_URL__:{image_url}"
-    return text_body
-
-def parse_tonstation(html: str, prefer_text: bool = False) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-    base_url = BASE_URLS["tonstation"]
-
-    image_url = _find_combo_image_url(soup, "ton station", base_url)
-
-    if "searching" in html.lower():
-        text_body = "⏳ <b>Комбо ще не знайдено (searching...)</b>"
-    else:
-        header = soup.find(lambda tag: tag.name in ["h2", "h3"] and "ton station" in tag.get_text(strip=True).lower())
-        if not header:
-            text_body = "⏳ <b>Комбо ще не опубліковане</b>"
-        else:
-            cards = []
-            for tag in header.find_all_next(["p", "li", "div"]):
-                text = tag.get_text(strip=True)
-                if text and len(text) > 3 and text not in cards and "combo" not in text.lower():
-                    cards.append(text)
-                if len(cards) >= 4:
-                    break
-            text_body = "\n".join(f"• <b>{c}</b>" for c in cards[:4]) or "⏳ <b>Комбо ще не знайдено</b>"
-
-    if image_url and not prefer_text:
-        return f"__IMAGE_URL__:{image_url}"
-    return text_body
+# Репліка готова (/readyz), коли кеш прогріто зі сховища і вебхук зареєстровано.
+# Апдейти, що прийшли раніше, не відкидаються, а чекають на прогрів кешу
+readiness = Readiness(required=("cache", "webhook"))
+dp.update.outer_middleware(ReadinessMiddleware(readiness, "cache", timeout=STARTUP_UPDATE_WAIT))
+# Спінер знімається одразу, повтори однієї кнопки відкидаються, кількість хендлерів обмежена
+dp.callback_query.outer_middleware(CallbackThrottleMiddleware(
+    max_concurrency=UPDATE_MAX_CONCURRENCY,
+    max_waiting=UPDATE_MAX_WAITING,
+    debounce=CALLBACK_DEBOUNCE_SECONDS,
+))
+
+# ================== SOURCES ==================
+# Ігри, їхні сторінки, назви та кнопки описані в combo_rules.toml
+SOURCES = {game: rules.url for game, rules in RULES.items()}
+GAME_NAMES = {game: rules.title for game, rules in RULES.items()}
+ALL_GAMES = "all_games"
+MIRRORS = {game: rules.mirrors for game, rules in RULES.items()}
 
 # ================== FETCH ==================
-async def fetch(url: str) -> str:
-    async with httpx.AsyncClient(timeout=20) as c:
-        log.info(f"HTTP Request: GET {url}")
-        r = await c.get(url, follow_redirects=True)
-        r.raise_for_status()
-        return r.text
+# Один клієнт на весь процес; відкривається в on_startup, закривається в on_cleanup
+http_client = HttpClient(
+    timeout=HTTP_TIMEOUT, max_connections=HTTP_MAX_CONNECTIONS, http2=HTTP2_ENABLED, max_bytes=HTTP_MAX_BYTES,
+    max_per_host=HTTP_MAX_PER_HOST, retries=HTTP_RETRIES, retry_deadline=HTTP_RETRY_DEADLINE,
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT,
+)
+
+# ================== STORAGE ==================
+combo_store = ComboStore(os.path.join(DATA_DIR, "combos.sqlite3"))
+shared_state = create_shared_state(SHARED_STATE_URL)
+refresh_lease = LeaderLease(shared_state, "combo-refresher", REPLICA_ID, ttl=LEADER_LEASE_TTL)
+# Підписки й черга розсилки: для кількох реплік — у спільному стані (/unsubscribe на будь-якій репліці
+# діє для всіх, розсилає лише лідер); для однієї — у сховищі на томі, щоб пережити рестарт
+subscription_store = combo_store if isinstance(shared_state, MemoryState) else shared_state
+
+# image_url -> Telegram file_id (дзеркало таблиці photo_file_ids, завантажується при старті)
+PHOTO_FILE_IDS: dict[str, str] = {}
+_photo_upload_locks: dict[str, asyncio.Lock] = {}
 
 # ================== UI ==================
+# Клавіатури незмінні — будуємо їх один раз і перевикористовуємо в кожній відповіді
+@cache
 def main_kb():
+    buttons = [types.InlineKeyboardButton(text=rules.button, callback_data=game) for game, rules in RULES.items()]
+    # По дві кнопки в рядку, окремим рядком — усі ігри одним повідомленням
+    rows = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    rows.append([types.InlineKeyboardButton(text="📋 Усі ігри", callback_data=ALL_GAMES)])
+    return types.InlineKeyboardMarkup(inline_keyboard=rows)
+
+@cache
+def inline_kb():
+    # Під повідомленням, надісланим через inline-режим: вибрати іншу гру в тому ж чаті
     return types.InlineKeyboardMarkup(inline_keyboard=[
-        [
-            types.InlineKeyboardButton(text="🐹 Hamster", callback_data="hamster"),
-            types.InlineKeyboardButton(text="⚡ TapSwap", callback_data="tapswap")
-        ],
-        [
-            types.InlineKeyboardButton(text="🌸 Blum", callback_data="blum"),
-            types.InlineKeyboardButton(text="🐱 CatTea", callback_data="cattea")
-        ],
-        [types.InlineKeyboardButton(text="🚉 TON Station", callback_data="tonstation")]
+        [types.InlineKeyboardButton(text="🎮 Інші ігри", switch_inline_query_current_chat="")]
     ])
 
+@cache
 def back_kb():
     return types.InlineKeyboardMarkup(inline_keyboard=[
         [types.InlineKeyboardButton(text="<< Назад до меню", callback_data="back_to_menu")]
@@ -284,86 +194,410 @@ def back_kb():
 
 @dp.message(CommandStart())
 async def start(m: types.Message):
-    await m.answer("<b>🎮 Щоденні комбо ігор</b>\n\nОбери гру:", reply_markup=main_kb())
+    await m.answer(
+        "<b>🎮 Щоденні комбо ігор</b>\n\nОбери гру:\n\n"
+        "📋 <code>/all</code> — усі ігри одразу\n"
+        "🔔 <code>/subscribe &lt;гра&gt;</code> — отримувати нове комбо автоматично",
+        reply_markup=main_kb(),
+    )
+
+@dataclass(frozen=True)
+class RenderedCombo:
+    """Готове до відправки повідомлення: підпис/текст з заголовком і датою та URL картинки."""
+    image_url: str | None
+    text: str
+
+@lru_cache(maxsize=64)
+def render_combo(game: str, image_url: str | None, body: str, day: str) -> RenderedCombo:
+    """
+    Рендерить повідомлення один раз на версію комбо та дату: поки не змінилися
+    ні тіло комбо, ні день, повертається той самий об'єкт без форматування.
+    """
+    return RenderedCombo(image_url=image_url, text=f"<b>{GAME_NAMES[game]}</b>\nКомбо на <b>{day}</b>\n\n{body}")
+
+def rendered(game: str, combo: dict) -> RenderedCombo:
+    return render_combo(game, combo['url'], combo['text'], f"{datetime.now():%d.%m.%Y}")
+
+async def _parse_page(game: str, page: FetchResult) -> ComboResult:
+    """
+    Ті самі байти (зокрема після 304) — результат береться з parse_cache без повторного парсингу.
+    Інакше один прохід парсера (поза event loop) дає і зображення, і текст для підпису.
+    """
+    cache_key = parse_cache.key(game, page.content)
+    result = parse_cache.get(cache_key)
+    if result is None:
+        started = time.perf_counter()
+        result = await parse_executor.run(PARSERS[game], page.text)
+        PARSE_SECONDS.labels(game, combo_parsers.BACKEND).observe(time.perf_counter() - started)
+        parse_cache.put(cache_key, result)
+    return result
+
+async def _shared_combo(game: str) -> dict | None:
+    """
+    Результат лідера зі спільного стану, якщо він не старший за COMBO_CACHE_TTL
+    або лідер пообіцяв (fresh_until), що до наступного опитування нового не буде.
+    """
+    try:
+        shared = await shared_state.get_combo(game)
+    except Exception as e:
+        log.warning(f"Спільний стан недоступний для {game}: {e}")
+        return None
+    if shared is None:
+        return None
+    fresh_until = max(shared['fetched_at'] + COMBO_CACHE_TTL, shared.get('fresh_until', 0))
+    return shared if time.time() < fresh_until else None
+
+async def load_combo(game: str) -> dict:
+    """
+    Завантажує та парсить сторінку гри. Повертає {'url': str | None, 'text': str}.
+    Викликається лише через combo_cache — хендлери напряму сюди не ходять.
+    Ведена репліка бере готовий результат лідера зі спільного стану і йде до джерела
+    лише тоді, коли лідер давно нічого не публікував. Якщо джерело недоступне, виняток
+    повертається в combo_cache, і той віддає останнє відоме комбо.
+    """
+    shared = None if refresh_lease.is_leader else await _shared_combo(game)
+    if shared is not None:
+        result = ComboResult(**shared['result'])
+    else:
+        # Сторінка читається лише доти, доки StreamScanner не побачить усе потрібне правилам гри;
+        # дзеркала підключаються, якщо основна адреса мовчить довше за HEDGE_DELAY або недоступна
+        page = await http_client.get_hedged(
+            (SOURCES[game], *MIRRORS[game]),
+            source=game,
+            make_until=(lambda: StreamScanner(RULES[game]).feed) if STREAM_FETCH else None,
+            hedge_delay=HEDGE_DELAY,
+        )
+        result = await _parse_page(game, page)
+        if page.truncated == "early_stop" and not is_complete(RULES[game], result):
+            # Сканер поспішив — беремо сторінку повністю (рідкісний випадок)
+            log.info(f"{game}: прочитаного початку сторінки не вистачило, завантажуємо повністю.")
+            page = await http_client.get(page.url, source=game, conditional=False)
+            result = await _parse_page(game, page)
+
+        shared = {
+            'result': asdict(result),
+            'etag': page.etag,
+            'last_modified': page.last_modified,
+            'fetched_at': time.time(),
+        }
+        try:
+            await shared_state.put_combo(game, shared)
+        except Exception as e:
+            log.warning(f"Не вдалося опублікувати комбо {game} у спільний стан: {e}")
+
+    combo = {'url': result.image_url, 'text': result.text_body()}
+    try:
+        changed = await combo_store.record(
+            game, result, combo['text'],
+            etag=shared['etag'], last_modified=shared['last_modified'], fetched_at=shared['fetched_at'],
+        )
+    except Exception as e:
+        log.warning(f"Не вдалося зберегти комбо {game}: {e}")
+        changed = False
+
+    if changed:
+        COMBO_VERSIONS.labels(game, result.status).inc()
+        source_updated_at = http_date(shared['last_modified'])
+        if result.status == "found" and source_updated_at is not None and source_updated_at <= shared['fetched_at']:
+            DETECTION_LATENCY.labels(game).observe(shared['fetched_at'] - source_updated_at)
+
+    # Нове опубліковане комбо — розсилаємо підписникам (надсилання піде вже з кешу).
+    # Лише лідер: ведені бачать ту саму зміну у своїх сховищах пізніше і поставили б розсилку вдруге
+    if changed and result.status == "found" and refresh_lease.is_leader:
+        await broadcaster.enqueue(game)
+    return combo
+
+combo_cache = ComboCache(load_combo, ttl=COMBO_CACHE_TTL, stale_ttl=COMBO_CACHE_STALE_TTL)
+cache_collector.register("combo", combo_cache.stats)
+cache_collector.register("parse", parse_cache.stats)
+
+async def hold_until_next_poll(game: str, delay: float) -> None:
+    """
+    Планувальник знає, що до наступного опитування нового комбо не чекати: кеш і результат
+    у спільному стані вважаються свіжими до того часу, тож натискання не ходять у джерело.
+    """
+    combo_cache.hold(game, delay)
+    try:
+        shared = await shared_state.get_combo(game)
+        if shared is not None:
+            shared['fresh_until'] = time.time() + delay
+            await shared_state.put_combo(game, shared)
+    except Exception as e:
+        log.warning(f"Не вдалося продовжити свіжість {game} у спільному стані: {e}")
+
+refresh_scheduler = AdaptiveScheduler(
+    list(SOURCES),
+    refresh=combo_cache.refresh,
+    publish_times=combo_store.publish_times,
+    on_planned=hold_until_next_poll,
+    intervals=PollIntervals(
+        window=(POLL_WINDOW_MIN, POLL_WINDOW_MAX),
+        idle=POLL_IDLE_INTERVAL,
+        late=COMBO_REFRESH_INTERVAL,
+        confirmed=POLL_CONFIRMED_INTERVAL,
+        fixed=COMBO_REFRESH_INTERVAL,
+    ),
+    history_days=PUBLISH_HISTORY_DAYS,
+    margin=PUBLISH_WINDOW_MARGIN,
+)
+
+async def refresh_all_combos():
+    """Паралельно оновлює кеш для всіх ігор. Помилки окремих джерел лише логуються."""
+    results = await asyncio.gather(*(combo_cache.refresh(game) for game in SOURCES), return_exceptions=True)
+    for game, result in zip(SOURCES, results):
+        if isinstance(result, Exception):
+            log.warning(f"Фонове оновлення {game} не вдалося: {type(result).__name__}: {result}")
+    log.info(f"Кеш парсингу: {parse_cache.stats()}")
+
+async def warm_cache_from_store():
+    """
+    Прогріває combo_cache збереженими комбо, щоб одразу після редеплою відповідати без завантаження.
+    Сьогоднішні комбо вважаються щойно застарілими: віддаються миттєво, а оновлюються у фоні.
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    stored = await combo_store.latest()
+    for game, item in stored.items():
+        if game not in SOURCES:
+            continue
+        age = min(item.age, COMBO_CACHE_TTL) if item.day == today else item.age
+        combo_cache.prime(game, {'url': item.image_url, 'text': item.text}, age=age)
+    if stored:
+        log.info(f"Кеш прогріто зі сховища: {', '.join(stored)}")
+    PHOTO_FILE_IDS.update(await combo_store.file_ids())
+
+async def _photo_source(image_url: str):
+    """Що передати в send_photo для картинки, якої ще немає в Telegram: URL або завантажені байти."""
+    if IMAGE_UPLOAD_MODE == "upload":
+        try:
+            image = await http_client.get(image_url, max_bytes=IMAGE_MAX_BYTES, pool="images", remember=False)
+            if image.truncated:
+                raise ValueError(f"картинка більша за {IMAGE_MAX_BYTES} байт")
+            filename = image_url.rsplit("/", 1)[-1].split("?", 1)[0] or "combo.jpg"
+            return BufferedInputFile(image.content, filename=filename)
+        except Exception as e:
+            log.warning(f"Не вдалося завантажити {image_url} ({e}), передаємо URL напряму.")
+    return image_url
+
+async def _save_file_id(image_url: str, file_id: str | None) -> None:
+    """Оновлює file_id у пам'яті, локальному сховищі та спільному стані (None — забути)."""
+    if file_id is None:
+        PHOTO_FILE_IDS.pop(image_url, None)
+    else:
+        PHOTO_FILE_IDS[image_url] = file_id
+    for save in (combo_store.save_file_id, shared_state.set_file_id):
+        try:
+            await save(image_url, file_id)
+        except Exception as e:
+            log.warning(f"Не вдалося зберегти file_id для {image_url}: {e}")
+
+async def send_combo_photo(chat_id: int, image_url: str, caption: str) -> None:
+    """
+    Надсилає фото комбо, повторно використовуючи file_id. Перше надсилання для URL
+    виконується під замком, щоб одночасні запити не завантажували ту саму картинку;
+    перед завантаженням перевіряємо, чи file_id вже не отримала інша репліка.
+    """
+    file_id = PHOTO_FILE_IDS.get(image_url)
+    if file_id:
+        try:
+            await bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption, reply_markup=back_kb())
+            return
+        except TelegramBadRequest as e:
+            # file_id став недійсним — забуваємо його і надсилаємо з оригіналу
+            log.warning(f"Cached file_id for {image_url} rejected: {e}")
+            await _save_file_id(image_url, None)
+
+    lock = _photo_upload_locks.setdefault(image_url, asyncio.Lock())
+    async with lock:
+        file_id = PHOTO_FILE_IDS.get(image_url)
+        if not file_id:
+            try:
+                file_id = await shared_state.get_file_id(image_url)
+            except Exception as e:
+                log.warning(f"Спільний стан недоступний для file_id {image_url}: {e}")
+            if file_id:
+                PHOTO_FILE_IDS[image_url] = file_id
+        if file_id:
+            await bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption, reply_markup=back_kb())
+            return
+
+        msg = await bot.send_photo(
+            chat_id=chat_id,
+            photo=await _photo_source(image_url),
+            caption=caption,
+            reply_markup=back_kb(),
+        )
+        if msg.photo:
+            await _save_file_id(image_url, msg.photo[-1].file_id)
+
+async def push_combo(chat_id: int, game: str) -> None:
+    """Надсилає актуальне комбо новим повідомленням (для розсилки підписникам)."""
+    message = rendered(game, await combo_cache.get(game))
+    if message.image_url:
+        try:
+            await send_combo_photo(chat_id, message.image_url, message.text)
+            return
+        except TelegramBadRequest as e:
+            log.warning(f"Image push failed for {game} ({message.image_url}): {e}. Falling back to text.")
+    await bot.send_message(chat_id, message.text, reply_markup=back_kb())
+
+broadcaster = Broadcaster(
+    subscription_store,
+    push_combo,
+    RateLimiter(rate=BROADCAST_RATE, per_chat_interval=BROADCAST_PER_CHAT_INTERVAL),
+)
+
+GAMES_HELP = ", ".join(f"<code>{game}</code>" for game in SOURCES)
+
+@dp.message(Command("subscribe"))
+async def subscribe(m: types.Message, command: CommandObject):
+    game = (command.args or "").strip().lower()
+    if game not in SOURCES:
+        await m.answer(f"Використання: <code>/subscribe &lt;гра&gt;</code>\nДоступні ігри: {GAMES_HELP}")
+        return
+    added = await subscription_store.subscribe(m.chat.id, game)
+    if added:
+        await m.answer(f"🔔 Підписка на <b>{GAME_NAMES[game]}</b> оформлена. Нове комбо прийде автоматично.")
+    else:
+        await m.answer(f"Ви вже підписані на <b>{GAME_NAMES[game]}</b>.")
+
+@dp.message(Command("unsubscribe"))
+async def unsubscribe(m: types.Message, command: CommandObject):
+    game = (command.args or "").strip().lower() or None
+    if game is not None and game not in SOURCES:
+        await m.answer(f"Використання: <code>/unsubscribe [гра]</code>\nДоступні ігри: {GAMES_HELP}")
+        return
+    removed = await subscription_store.unsubscribe(m.chat.id, game)
+    if not removed:
+        await m.answer("Активних підписок не знайдено.")
+    elif game:
+        await m.answer(f"🔕 Підписку на <b>{GAME_NAMES[game]}</b> скасовано.")
+    else:
+        await m.answer("🔕 Усі підписки скасовано.")
+
+@dp.message(Command("subscriptions"))
+async def list_subscriptions(m: types.Message):
+    games = await subscription_store.subscriptions(m.chat.id)
+    if not games:
+        await m.answer(f"Підписок немає. Оформити: <code>/subscribe &lt;гра&gt;</code>\nДоступні ігри: {GAMES_HELP}")
+        return
+    await m.answer("🔔 Ваші підписки:\n" + "\n".join(f"• {GAME_NAMES.get(g, g)}" for g in games))
+
+@lru_cache(maxsize=64)
+def inline_result(game: str, image_url: str | None, text: str, file_id: str | None):
+    """
+    Результат inline-запиту для версії комбо: фото за file_id (Telegram уже має файл) або текст.
+    Фото за URL джерела не даємо: photo_url Telegram приймає лише як JPEG, а картинки джерел бувають
+    PNG/WebP, а IMAGE_UPLOAD_MODE=upload тут не діяв би. Доки file_id немає — текст; file_id з'явиться
+    після першого надсилання картинки в чат. id залежить від вмісту, тож нова версія не зливається
+    зі старою в кеші Telegram.
+    """
+    kind = "photo" if file_id else "text"
+    result_id = f"{game}:{kind}:{hashlib.md5(f'{image_url}|{text}'.encode()).hexdigest()[:16]}"
+    if file_id:
+        return InlineQueryResultCachedPhoto(
+            id=result_id, photo_file_id=file_id, title=GAME_NAMES[game], caption=text, reply_markup=inline_kb(),
+        )
+    return InlineQueryResultArticle(
+        id=result_id,
+        title=GAME_NAMES[game],
+        # Тіло комбо без HTML-тегів і з картками в один рядок — для списку результатів
+        description=re.sub(r"<[^>]+>", "", text.split("\n\n", 1)[-1]).replace("\n", " ")[:100],
+        input_message_content=InputTextMessageContent(message_text=text),
+        reply_markup=inline_kb(),
+    )
+
+def match_games(query: str) -> list[str]:
+    """Ігри, чий id, назва або напис на кнопці містять запит (порожній запит — усі)."""
+    query = query.strip().lower()
+    return [
+        game for game, rules in RULES.items()
+        if not query or query in game or query in rules.title.lower() or query in rules.button.lower()
+    ]
+
+async def _answer_inline(q: types.InlineQuery, results: list):
+    await q.answer(
+        results,
+        cache_time=INLINE_CACHE_TIME if results else 10,
+        is_personal=False,
+        button=None if results else InlineQueryResultsButton(text="Комбо ще завантажуються — відкрити бота", start_parameter="inline"),
+    )
+
+@dp.inline_query()
+async def inline_combo(q: types.InlineQuery):
+    """
+    `@бот blum` у будь-якому чаті: відповідь лише з кешу — без завантаження й парсингу.
+    Ігри, яких ще немає в кеші, пропускаються; Telegram кешує відповідь на INLINE_CACHE_TIME секунд
+    для всіх користувачів (is_personal=False), тож повторні запити до бота навіть не доходять.
+    """
+    messages = []
+    for game in match_games(q.query):
+        combo = combo_cache.peek(game)
+        if combo is not None:
+            messages.append((game, rendered(game, combo)))
+    results = [
+        inline_result(game, m.image_url, m.text, PHOTO_FILE_IDS.get(m.image_url) if m.image_url else None)
+        for game, m in messages
+    ]
+
+    try:
+        await _answer_inline(q, results)
+    except TelegramBadRequest as e:
+        # Telegram відхиляє відповідь цілком, навіть якщо поганий лише один результат (зазвичай —
+        # застарілий file_id), тож повторюємо лише текстом
+        log.warning(f"Inline-запит {q.query!r}: відповідь відхилено ({e}), результати: {[r.id for r in results]}")
+        if not any(isinstance(r, InlineQueryResultCachedPhoto) for r in results):
+            INLINE_QUERIES.labels("error").inc()
+            return
+        results = [inline_result(game, m.image_url, m.text, None) for game, m in messages]
+        try:
+            await _answer_inline(q, results)
+        except TelegramBadRequest as e:
+            log.warning(f"Inline-запит {q.query!r}: текстову відповідь теж відхилено ({e}).")
+            INLINE_QUERIES.labels("error").inc()
+            return
+    INLINE_QUERIES.labels("answered" if results else "empty").inc()
+    if results:
+        readiness.first_good_response()
 
 @dp.callback_query(F.data.in_(SOURCES.keys()))
 async def send_combo(cb: types.CallbackQuery):
-    # Початковий індикатор
-    await cb.message.edit_text("⏳ Отримую дані...", reply_markup=main_kb()) 
-    
     game = cb.data
-    name = {
-        "hamster": "🐹 Hamster Kombat",
-        "tapswap": "⚡ TapSwap",
-        "blum": "🌸 Blum",
-        "cattea": "🐱 CatTea",
-        "tonstation": "🚉 TON Station"
-    }[game]
-
-    # Визначаємо функцію парсера
-    parser_map = {
-        "hamster": parse_hamster,
-        "tapswap": parse_tapswap,
-        "blum": parse_blum,
-        "cattea": parse_cattea,
-        "tonstation": parse_tonstation,
-    }
-    parser_func = parser_map[game]
-    
+    started = time.perf_counter()
+    outcome = "error"
     try:
-        html = await fetch(SOURCES[game])
-        
-        # 1. Спроба 1: Парсинг для отримання ЗОБРАЖЕННЯ та/або ТЕКСТУ
-        combo_data = parser_func(html, prefer_text=False)
-
-        image_url = None
-        text_body = "Комбо не знайдено." # Default fallback text
-
-        if game == "hamster":
-            if combo_data['type'] == 'data':
-                image_url = combo_data['url']
-                cards_text = "\n".join(f"• <b>{c}</b>" for c in combo_data['cards'])
-                morse_text = (f"\n\n<b>Шифр Морзе:</b>\n{combo_data['morse']}" if combo_data['morse'] else "")
-                # Формуємо текст підпису для Hamster, включаючи картки та Морзе
-                text_body = f"{cards_text}{morse_text}" if cards_text or morse_text else "✅ <b>Комбо знайдено.</b>"
-            else: # type == 'error'
-                text_body = combo_data['message']
-
-        else: # TapSwap, Blum, CatTea, TON Station
-            if isinstance(combo_data, str) and combo_data.startswith("__IMAGE_URL__:") and len(combo_data) > 14:
-                # Знайдено зображення. Отримуємо його URL
-                image_url = combo_data[14:]
-                
-                # Потрібно знову викликати парсер, щоб отримати текстовий контент для підпису
-                # Викликаємо парсер з prefer_text=True, щоб отримати список карток
-                text_data = parser_func(html, prefer_text=True) 
-                if isinstance(text_data, str):
-                    text_body = text_data
-                else:
-                    text_body = "✅ <b>Комбо знайдено.</b>" 
-            else:
-                # Зображення не знайдено, використовуємо текстовий результат
-                text_body = combo_data
+        outcome = await _send_combo(cb, game)
+    finally:
+        _observe_request(game, outcome, started)
+
+def _observe_request(game: str, outcome: str, started: float) -> None:
+    """Метрики запиту комбо; перша успішна відповідь після старту — для виміру холодного старту."""
+    COMBO_REQUESTS.labels(game, outcome).inc()
+    COMBO_REQUEST_SECONDS.labels(game, outcome).observe(time.perf_counter() - started)
+    if outcome != "error":
+        readiness.first_good_response()
+
+async def _send_combo(cb: types.CallbackQuery, game: str) -> str:
+    """Відповідає комбо на натискання кнопки. Повертає результат для метрик: image | text | error."""
+    name = GAME_NAMES[game]
 
+    # Індикатор показуємо лише тоді, коли в кеші нічого немає і доведеться чекати на завантаження
+    if combo_cache.peek(game) is None:
+        await cb.message.edit_text("⏳ Отримую дані...", reply_markup=main_kb())
+
+    try:
+        # Підпис і клавіатура вже відрендерені для цієї версії комбо — лише беремо їх
+        message = rendered(game, await combo_cache.get(game))
+        image_url = message.image_url
 
         # 2. Обробка ЗОБРАЖЕННЯ (якщо знайдено)
         if image_url:
             log.info(f"Attempting to send image for {game} from URL: {image_url}")
 
-            # Формуємо підпис, включаючи всі текстові дані (cards, morse, code, залежно від гри)
-            caption = f"<b>{name}</b>\nКомбо на <b>{datetime.now():%d.%m.%Y}</b>\n\n{text_body}"
-            
             try:
-                await bot.send_photo(
-                    chat_id=cb.message.chat.id,
-                    photo=image_url,
-                    caption=caption,
-                    reply_markup=back_kb(),
-                    parse_mode=ParseMode.HTML
-                )
+                await send_combo_photo(cb.message.chat.id, image_url, message.text)
                 # Якщо успішно, видаляємо старий індикатор
                 await cb.message.delete()
-                return # Успіх, виходимо
+                return "image" # Успіх, виходимо
                 
             except TelegramBadRequest as e:
                 # Обробка помилок завантаження зображень (failed to get HTTP URL content, wrong type)
@@ -378,8 +612,8 @@ async def send_combo(cb: types.CallbackQuery):
         # 3. Обробка ТЕКСТУ (якщо зображення не було або провалилося)
         
         # Надіслати ТЕКСТ (якщо ми не вийшли після відправки фото)
-        final_text = f"<b>{name}</b>\nКомбо на <b>{datetime.now():%d.%m.%Y}</b>\n\n{text_body}"
-        await cb.message.edit_text(final_text, reply_markup=back_kb())
+        await cb.message.edit_text(message.text, reply_markup=back_kb())
+        return "text"
 
 
     except Exception as e:
@@ -389,10 +623,115 @@ async def send_combo(cb: types.CallbackQuery):
             await cb.message.edit_text(text, reply_markup=back_kb())
         except:
             await cb.message.answer(text, reply_markup=back_kb())
+        return "error"
+
+async def send_all_combos(chat_id: int) -> str:
+    """
+    Усі ігри одним запитом: комбо беруться одночасно (asyncio.gather по combo_cache — промахи
+    завантажуються паралельно через спільний пул з'єднань), картинки йдуть одним альбомом,
+    решта ігор — текстом у підсумковому повідомленні.
+    Повертає результат для метрик: album | text.
+    """
+    games = list(SOURCES)
+    combos = await asyncio.gather(*(combo_cache.get(game) for game in games), return_exceptions=True)
+
+    photos: list[RenderedCombo] = []
+    texts = []
+    for game, combo in zip(games, combos):
+        if isinstance(combo, Exception):
+            log.warning(f"Усі ігри: {game} недоступна: {type(combo).__name__}: {combo}")
+            texts.append(f"<b>{GAME_NAMES[game]}</b>\n❌ Джерело недоступне, спробуйте пізніше.")
+            continue
+        message = rendered(game, combo)
+        if message.image_url:
+            photos.append(message)
+        else:
+            texts.append(message.text)
+
+    album_id = None
+    # Друга спроба — лише якщо Telegram відхилив альбом із збереженими file_id: забуваємо їх
+    # (як send_combo_photo) і надсилаємо картинки з оригіналу
+    while len(photos) >= 2:
+        cached = [m.image_url for m in photos if m.image_url in PHOTO_FILE_IDS]
+        try:
+            media = [
+                InputMediaPhoto(media=PHOTO_FILE_IDS.get(m.image_url) or await _photo_source(m.image_url), caption=m.text)
+                for m in photos
+            ]
+            sent = await bot.send_media_group(chat_id, media=media)
+            album_id = sent[0].message_id
+            for message, msg in zip(photos, sent):
+                if msg.photo and message.image_url not in PHOTO_FILE_IDS:
+                    await _save_file_id(message.image_url, msg.photo[-1].file_id)
+            break
+        except TelegramBadRequest as e:
+            if cached:
+                log.warning(f"Усі ігри: альбом із file_id відхилено ({e}), забуваємо їх і надсилаємо з оригіналу.")
+                for image_url in cached:
+                    await _save_file_id(image_url, None)
+                continue
+            # Хоч одна картинка не завантажилася — альбом не надсилається взагалі, тож усе текстом
+            log.warning(f"Усі ігри: альбом не надіслано ({e}), переходимо на текст.")
+            texts = [m.text for m in photos] + texts
+            photos = []
+    if len(photos) == 1:
+        try:
+            await send_combo_photo(chat_id, photos[0].image_url, photos[0].text)
+        except TelegramBadRequest as e:
+            # Як і з альбомом: картинку не надіслано — комбо цієї гри йде в підсумкове повідомлення
+            log.warning(f"Усі ігри: фото не надіслано ({e}), переходимо на текст.")
+            texts = [photos[0].text] + texts
+            photos = []
+
+    header = "<b>📋 Усі ігри</b>"
+    if photos and not texts:
+        texts = ["Комбо всіх ігор — вище."]
+    await bot.send_message(
+        chat_id, "\n\n".join([header, *texts]), reply_markup=back_kb(), reply_to_message_id=album_id,
+    )
+    return "album" if photos else "text"
+
+@dp.message(Command("all"))
+async def all_combos_command(m: types.Message):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        outcome = await send_all_combos(m.chat.id)
+    except Exception as e:
+        log.error(f"Critical Error for all games: {e}")
+        await m.answer(
+            f"❌ <b>Критична помилка для всіх ігор</b>\nСпробуйте пізніше. Деталі: {type(e).__name__}",
+            reply_markup=back_kb(),
+        )
+    finally:
+        _observe_request("all", outcome, started)
+
+@dp.callback_query(F.data == ALL_GAMES)
+async def all_combos_callback(cb: types.CallbackQuery):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        if any(combo_cache.peek(game) is None for game in SOURCES):
+            await cb.message.edit_text("⏳ Отримую дані всіх ігор...", reply_markup=main_kb())
+        outcome = await send_all_combos(cb.message.chat.id)
+    except Exception as e:
+        log.error(f"Critical Error for all games: {e}")
+        await cb.message.answer(
+            f"❌ <b>Критична помилка для всіх ігор</b>\nСпробуйте пізніше. Деталі: {type(e).__name__}",
+            reply_markup=back_kb(),
+        )
+    else:
+        # Меню замінено новими повідомленнями нижче
+        try:
+            await cb.message.delete()
+        except TelegramBadRequest as e:
+            log.warning(f"Failed to delete menu message: {e}")
+    finally:
+        _observe_request("all", outcome, started)
 
 @dp.callback_query(F.data == "back_to_menu")
 async def back_to_menu_handler(cb: types.CallbackQuery):
-    await cb.answer()
+    # На callback уже відповів CallbackThrottleMiddleware
     menu_text = "<b>🎮 Щоденні комбо ігор</b>\n\nОбери гру:"
     try:
         # 1. Спроба відредагувати повідомлення (працює для текстових повідомлень)
@@ -408,16 +747,151 @@ async def back_to_menu_handler(cb: types.CallbackQuery):
              log.warning(f"Failed to delete old photo message: {e}")
 
 
+# ================== HISTORY ==================
+def _iso(ts: float | None) -> str | None:
+    return datetime.fromtimestamp(ts).isoformat(timespec="seconds") if ts is not None else None
+
+def _seconds(value: float | None) -> float | None:
+    return round(value, 1) if value is not None else None
+
+async def history_handler(request: web.Request) -> web.Response:
+    """
+    GET /history/<гра>?day=YYYY-MM-DD — версії комбо за день (за замовчуванням сьогодні), старіші першими:
+    коли бот помітив кожну, коли її востаннє підтверджено і із якою затримкою від зміни сторінки.
+    published_at — перша знайдена версія дня, тобто коли гра опублікувала комбо (наскільки бачив бот).
+    """
+    game = request.match_info["game"]
+    if game not in SOURCES:
+        raise web.HTTPNotFound(text=f"Невідома гра: {game}")
+    day = request.query.get("day") or datetime.now().strftime("%Y-%m-%d")
+    try:
+        datetime.strptime(day, "%Y-%m-%d")
+    except ValueError:
+        raise web.HTTPBadRequest(text="day має бути у форматі YYYY-MM-DD")
+
+    versions = list(reversed(await combo_store.history(game, day=day)))
+    published = next((v for v in versions if v.result.status == "found"), None)
+    return web.json_response({
+        "game": game,
+        "day": day,
+        "published_at": _iso(published.first_seen) if published else None,
+        "detection_latency_seconds": _seconds(published.detection_latency) if published else None,
+        "versions": [
+            {
+                "fingerprint": v.fingerprint,
+                "status": v.result.status,
+                "first_seen": _iso(v.first_seen),
+                "last_confirmed": _iso(v.fetched_at),
+                "source_updated_at": _iso(v.source_updated_at),
+                "detection_latency_seconds": _seconds(v.detection_latency),
+                "image_url": v.image_url,
+                "cards": v.result.cards,
+                "codes": v.result.codes,
+                "morse": v.result.morse,
+            }
+            for v in versions
+        ],
+    })
+
 # ================== WEBHOOK ==================
 async def on_startup(app: web.Application):
-    await bot.delete_webhook(drop_pending_updates=True)
-    await bot.set_webhook(WEBHOOK_URL)
+    # Лише дешеві кроки: прогрів іде у фоні, щоб порт почав слухати одразу і /healthz відповідав
+    await http_client.start()
+    # Фонові задачі (зупиняються в on_shutdown); частину з них start_replica додає вже після старту
+    tasks = app["background_tasks"] = {}
+    tasks["loop_lag_monitor"] = asyncio.create_task(monitor_event_loop_lag())
+    tasks["replica_startup"] = asyncio.create_task(start_replica(tasks))
+
+async def start_replica(tasks: dict[str, asyncio.Task]):
+    """Прогрів репліки: кеш зі сховища → фонове оновлення і пул парсингу → реєстрація вебхука."""
+    try:
+        await warm_cache_from_store()
+    except Exception as e:
+        log.warning(f"Не вдалося прогріти кеш зі сховища: {e}")
+    readiness.mark("cache")
+
+    # Фоновий оновлювач тримає кеш бота свіжим, щоб хендлери не робили I/O. Джерела опитує лише
+    # репліка-лідер — кожне у свій час (refresh_scheduler); решта підтягують її результати.
+    # Стартує після прогріву, щоб збережені комбо не перезаписали щойно завантажені
+    tasks["combo_refresher"] = asyncio.create_task(refresh_lease.run(
+        leader_job=lead,
+        follower_job=refresh_all_combos,
+        follower_interval=COMBO_REFRESH_INTERVAL,
+    ))
+    tasks["parse_warmup"] = asyncio.create_task(warm_parse_pool())
+
+    # setWebhook замінює попередню адресу без втрати черги: натискання, що накопичилися в Telegram
+    # під час редеплою, буде доставлено (delete_webhook(drop_pending_updates=True) їх відкидав).
+    # Явний список типів апдейтів: inline_query приходить лише якщо він тут є (і inline-режим увімкнено в @BotFather)
+    delay = 1.0
+    while True:
+        try:
+            await bot.set_webhook(WEBHOOK_URL, allowed_updates=dp.resolve_used_update_types())
+            break
+        except Exception as e:
+            readiness.fail("webhook", e)
+            log.warning(f"Не вдалося встановити webhook ({type(e).__name__}: {e}), повтор через {delay:.0f} с")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
     log.info(f"✅ Webhook встановлено: {WEBHOOK_URL}")
+    readiness.mark("webhook")
+
+async def lead():
+    """
+    Робота лідера: опитування джерел і розсилка підписникам. Незавершена черга розсилки
+    (з минулого запуску чи від попереднього лідера) продовжується, щойно репліка стала лідером.
+    """
+    broadcaster.start()
+    try:
+        await refresh_scheduler.run()
+    finally:
+        await broadcaster.stop()
+
+async def warm_parse_pool():
+    """Імпорт BeautifulSoup/lxml і старт воркерів заздалегідь, а не на першому парсингу."""
+    started = time.perf_counter()
+    try:
+        await parse_executor.warm(combo_parsers.preload)
+    except Exception as e:
+        log.warning(f"Не вдалося прогріти пул парсингу: {e}")
+        return
+    log.info(f"Пул парсингу прогріто за {time.perf_counter() - started:.2f} с")
+
+async def on_shutdown(app: web.Application):
+    # Зупиняємо фонові задачі тут, а не в on_cleanup: задачі, створені вже після старту (start_replica),
+    # aiohttp інакше чекав би до shutdown_timeout. replica_startup першою, щоб не запускала нових
+    await broadcaster.stop()
+    tasks = app["background_tasks"]
+    for key in ("replica_startup", "combo_refresher", "parse_warmup", "loop_lag_monitor"):
+        task = tasks.get(key)
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+async def on_cleanup(app: web.Application):
+    await http_client.close()
+    parse_executor.shutdown()
+    combo_store.close()
+    await shared_state.close()
 
 app = web.Application()
 app.on_startup.append(on_startup)
-SimpleRequestHandler(dispatcher=dp, bot=bot).register(app, path=WEBHOOK_PATH)
-
-if __name__ == "__main__":
+app.on_shutdown.append(on_shutdown)
+app.on_cleanup.append(on_cleanup)
+app.router.add_get("/metrics", metrics_handler)
+app.router.add_get("/healthz", readiness.healthz)
+app.router.add_get("/readyz", readiness.readyz)
+app.router.add_get("/history/{game}", history_handler)
+# Telegram отримує 200 одразу, апдейт обробляється у фоні (з обмеженнями CallbackThrottleMiddleware)
+SimpleRequestHandler(dispatcher=dp, bot=bot, handle_in_background=True).register(app, path=WEBHOOK_PATH)
+
+def main() -> None:
+    """Запуск сервера; на Railway — через main.py, щоб воркери пулу парсингу не імпортували bot.py."""
     log.info(f"Запуск сервера на 0.0.0.0:{PORT}")
     web.run_app(app, host="0.0.0.0", port=PORT)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramNotFound, TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Обмежувач розсилки під ліміти Telegram:
+    - глобально не більше `rate` повідомлень за секунду (token bucket);
+    - в один чат не частіше ніж раз на `per_chat_interval` секунд;
+    - після RetryAfter усі надсилання ставляться на паузу.
+    """
+
+    def __init__(self, rate: float = 30, per_chat_interval: float = 1.0):
+        self.rate = rate
+        self.per_chat_interval = per_chat_interval
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._chat_next: dict[int, float] = {}
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, chat_id: int) -> None:
+        # Резервуємо слот для чату заздалегідь, щоб паралельні задачі в той самий чат йшли по черзі
+        now = time.monotonic()
+        if len(self._chat_next) > 10_000:
+            self._chat_next = {cid: t for cid, t in self._chat_next.items() if t > now}
+        chat_at = max(now, self._chat_next.get(chat_id, 0.0))
+        self._chat_next[chat_id] = chat_at + self.per_chat_interval
+        if chat_at > now:
+            await asyncio.sleep(chat_at - now)
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class Broadcaster:
+    """
+    Фонова розсилка комбо підписникам.
+
+    Черга живе в `store` — ComboStore (таблиця broadcast_queue) або спільному стані для кількох
+    реплік, — тому незавершена розсилка продовжується після рестарту. Воркер вибирає задачі пачками, надсилає їх
+    через RateLimiter, на RetryAfter ставить усе на паузу й повторює задачу,
+    на інші помилки — повторює з експоненційною затримкою до `max_attempts` разів.
+    Чати, які заблокували бота, відписуються.
+    """
+
+    def __init__(
+        self,
+        store,
+        send: Callable[[int, str], Awaitable[None]],
+        limiter: RateLimiter,
+        batch_size: int = 60,
+        concurrency: int = 10,
+        max_attempts: int = 5,
+    ):
+        self.store = store
+        self.send = send
+        self.limiter = limiter
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._concurrency = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.sent = 0
+        self.failed = 0
+
+    async def enqueue(self, game: str) -> int:
+        count = await self.store.enqueue_broadcast(game)
+        if count:
+            logger.info(f"Розсилка {game}: у черзі {count} підписників.")
+            self._wakeup.set()
+        return count
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                jobs = await self.store.due_broadcasts(self.batch_size)
+            except Exception as e:
+                logger.error(f"Не вдалося прочитати чергу розсилки: {e}")
+                jobs = []
+
+            if not jobs:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await asyncio.gather(*(self._deliver(*job) for job in jobs), return_exceptions=True)
+
+    async def _deliver(self, job_id: int | str, chat_id: int, game: str, attempts: int) -> None:
+        async with self._concurrency:
+            await self.limiter.acquire(chat_id)
+            try:
+                await self.send(chat_id, game)
+            except TelegramRetryAfter as e:
+                logger.warning(f"RetryAfter {e.retry_after}s під час розсилки, ставимо на паузу.")
+                self.limiter.pause(e.retry_after)
+                await self.store.retry_broadcast(job_id, e.retry_after, attempts)
+                return
+            except (TelegramForbiddenError, TelegramNotFound) as e:
+                logger.info(f"Чат {chat_id} недоступний ({e}), відписуємо.")
+                await self.store.unsubscribe(chat_id)
+                return
+            except Exception as e:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    logger.error(f"Розсилка {game} у чат {chat_id} не вдалася після {attempts} спроб: {e}")
+                    self.failed += 1
+                    await self.store.complete_broadcast(job_id)
+                else:
+                    delay = min(300, 2 ** attempts) * (0.5 + random.random())
+                    await self.store.retry_broadcast(job_id, delay, attempts)
+                return
+
+            self.sent += 1
+            await self.store.complete_broadcast(job_id)
@@ -0,0 +1,104 @@
+import logging
+import time
+
+import httpx
+
+from metrics import UPSTREAM_CIRCUIT_STATE
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """Запит не виконувався: запобіжник хоста розімкнений після серії помилок."""
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"{host}: джерело недоступне, наступна спроба через {retry_after:.0f} с")
+        self.host = host
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Запобіжник для одного хоста:
+
+    - closed: запити проходять; `failure_threshold` помилок поспіль розмикають його;
+    - open: запити одразу отримують CircuitOpenError, доки не мине пауза (спочатку `reset_timeout`);
+    - half_open: проходить один пробний запит; успіх замикає запобіжник,
+      помилка знову розмикає його, а пауза подвоюється (не більше `max_reset_timeout`).
+
+    Виклики: before_request() перед запитом, далі рівно один з record_success() /
+    record_failure() / release() (запит скасовано, вердикту про хост немає).
+
+    Окремо від станів — hold(): хост сам попросив паузу (Retry-After), і до її кінця запити
+    одразу отримують CircuitOpenError, хоч би скільки помилок було.
+    """
+
+    def __init__(self, host: str, failure_threshold: int = 5, reset_timeout: float = 30, max_reset_timeout: float = 300):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._pause = reset_timeout
+        self._opened_at = 0.0
+        self._probe_inflight = False
+        self._hold_until = 0.0
+        UPSTREAM_CIRCUIT_STATE.labels(host).set(0)
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            logger.log(
+                logging.WARNING if state == OPEN else logging.INFO,
+                f"Запобіжник {self.host}: {self.state} -> {state}",
+            )
+            self.state = state
+            UPSTREAM_CIRCUIT_STATE.labels(self.host).set(_STATE_VALUES[state])
+
+    def before_request(self) -> None:
+        held = self._hold_until - time.monotonic()
+        if held > 0:
+            raise CircuitOpenError(self.host, held)
+        if self.state == OPEN:
+            remaining = self._opened_at + self._pause - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(self.host, remaining)
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            # Поки пробний запит не завершився, решта не навантажують хост, що відновлюється
+            if self._probe_inflight:
+                raise CircuitOpenError(self.host, 0)
+            self._probe_inflight = True
+
+    def record_success(self) -> None:
+        self._probe_inflight = False
+        self.failures = 0
+        self._pause = self.reset_timeout
+        self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        self._probe_inflight = False
+        if self.state == HALF_OPEN:
+            self._pause = min(self._pause * 2, self.max_reset_timeout)
+            self._open()
+            return
+        self.failures += 1
+        if self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open()
+
+    def release(self) -> None:
+        self._probe_inflight = False
+
+    def hold(self, seconds: float) -> None:
+        """Не пропускати запити до хоста щонайменше `seconds` секунд (Retry-After у 429/503)."""
+        self._hold_until = max(self._hold_until, time.monotonic() + seconds)
+
+    def _open(self) -> None:
+        self._opened_at = time.monotonic()
+        self._set_state(OPEN)
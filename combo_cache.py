@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    fetched_at: float  # time.monotonic() моменту завантаження
+    ttl: float | None = None  # власний TTL запису (див. ComboCache.hold); None — загальний
+
+
+class ComboCache:
+    """
+    Спільний кеш комбо по іграх.
+
+    - свіжий запис (молодший за `ttl`) віддається одразу;
+    - застарілий, але молодший за `ttl + stale_ttl`, теж віддається одразу,
+      а оновлення запускається у фоні (stale-while-revalidate);
+    - одночасні промахи по одній грі зливаються в одне завантаження (singleflight);
+    - якщо завантаження не вдалося, віддається останнє відоме значення, хоч яке старе
+      (зокрема прогріте зі сховища), — помилка доходить до користувача, лише коли значення немає зовсім.
+    """
+
+    def __init__(self, loader: Callable[[str], Awaitable[Any]], ttl: float, stale_ttl: float):
+        self._loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: Dict[str, CacheEntry] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+        self.fallbacks = 0
+
+    def peek(self, game: str) -> Optional[Any]:
+        """Повертає значення, якщо його можна віддати без очікування (свіже або stale)."""
+        entry = self._entries.get(game)
+        if entry and time.monotonic() - entry.fetched_at < self._ttl(entry) + self.stale_ttl:
+            return entry.value
+        return None
+
+    def hold(self, game: str, seconds: float) -> None:
+        """
+        Запис лишається свіжим ще щонайменше `seconds` секунд — коли відомо, що до наступного
+        планового опитування нового значення не буде і звертатися до джерела раніше немає сенсу.
+        """
+        entry = self._entries.get(game)
+        if entry is not None:
+            entry.ttl = max(self.ttl, time.monotonic() - entry.fetched_at + seconds)
+
+    def _ttl(self, entry: CacheEntry) -> float:
+        return self.ttl if entry.ttl is None else entry.ttl
+
+    def prime(self, game: str, value: Any, age: float = 0.0) -> None:
+        """Кладе готове значення (наприклад, з диска) віком `age` секунд, не перезаписуючи наявне."""
+        if game not in self._entries:
+            self._entries[game] = CacheEntry(value=value, fetched_at=time.monotonic() - age)
+
+    def clear(self) -> None:
+        """Скидає всі записи (наприклад, для холодних замірів у бенчмарках)."""
+        self._entries.clear()
+
+    async def get(self, game: str) -> Any:
+        entry = self._entries.get(game)
+        if entry:
+            age = time.monotonic() - entry.fetched_at
+            if age < self._ttl(entry):
+                self.hits += 1
+                return entry.value
+            if age < self._ttl(entry) + self.stale_ttl:
+                # Віддаємо старе значення, оновлюємо у фоні
+                self.stale += 1
+                self._start_load(game)
+                return entry.value
+        self.misses += 1
+        try:
+            return await asyncio.shield(self._start_load(game))
+        except Exception:
+            if entry is None:
+                raise
+            self.fallbacks += 1
+            return entry.value
+
+    async def refresh(self, game: str) -> Any:
+        """Примусово оновлює запис (або приєднується до вже запущеного оновлення)."""
+        return await asyncio.shield(self._start_load(game))
+
+    def stats(self) -> dict:
+        total = self.hits + self.stale + self.misses
+        return {
+            "hits": self.hits,
+            "stale": self.stale,
+            "misses": self.misses,
+            "fallbacks": self.fallbacks,
+            "inflight": len(self._inflight),
+            "size": len(self._entries),
+            "hit_ratio": round((self.hits + self.stale) / total, 3) if total else 0.0,
+        }
+
+    def _start_load(self, game: str) -> asyncio.Task:
+        task = self._inflight.get(game)
+        if task is None:
+            task = asyncio.create_task(self._load(game))
+            # Фонове оновлення може впасти без жодного очікувача — забираємо виняток, щоб не було warning
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[game] = task
+        return task
+
+    async def _load(self, game: str) -> Any:
+        try:
+            value = await self._loader(game)
+            self._entries[game] = CacheEntry(value=value, fetched_at=time.monotonic())
+            return value
+        except Exception as e:
+            if game in self._entries:
+                logger.warning(f"Оновлення кешу для {game} не вдалося ({type(e).__name__}: {e}), лишаємо старе значення.")
+            raise
+        finally:
+            self._inflight.pop(game, None)
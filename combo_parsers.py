@@ -0,0 +1,693 @@
+from __future__ import annotations
+
+import codecs
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import re
+import sys
+import tomllib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import partial
+from html.parser import HTMLParser
+from typing import TYPE_CHECKING, Any, Hashable
+
+# bs4 (і lxml) імпортуються при першому парсингу, а не при старті бота: з process-пулом
+# головний процес їх взагалі не завантажує
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup, Tag
+
+logger = logging.getLogger(__name__)
+
+# ================== BACKEND ==================
+# PARSER_BACKEND: "auto" (lxml, якщо встановлено, інакше html.parser), "lxml" або "html.parser"
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "auto")
+
+def _resolve_backend(name: str) -> str:
+    has_lxml = importlib.util.find_spec("lxml") is not None
+    if name == "auto":
+        return "lxml" if has_lxml else "html.parser"
+    if name == "lxml" and not has_lxml:
+        logger.warning("PARSER_BACKEND=lxml, але lxml не встановлено — використовуємо html.parser.")
+        return "html.parser"
+    return name
+
+BACKEND = _resolve_backend(PARSER_BACKEND)
+
+def make_soup(html: str | bytes, backend: str | None = None) -> BeautifulSoup:
+    """Єдина точка створення дерева — кожна сторінка парситься рівно один раз."""
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(html, backend or BACKEND)
+
+def preload() -> str:
+    """Завантажує BeautifulSoup і бекенд наперед (прогрів пулу парсингу); повертає назву бекенду."""
+    make_soup("<p></p>")
+    return BACKEND
+
+# ================== РЕЗУЛЬТАТ ПАРСИНГУ ==================
+STATUS_MESSAGES = {
+    "not_found": "⏳ <b>Комбо ще не знайдено</b>",
+    "searching": "⏳ <b>Комбо ще не знайдено (searching...)</b>",
+    "not_published": "⏳ <b>Комбо ще не опубліковане</b>",
+}
+
+@dataclass
+class ComboResult:
+    """
+    Уніфікований результат будь-якого parse_*:
+    - status: 'found' | 'not_found' | 'searching' | 'not_published'
+    - image_url: абсолютний URL картинки комбо (незалежно від статусу тексту)
+    - cards / codes: назви карток або коди (залежно від гри)
+    - morse: шифр Морзе (лише Hamster), рядки через \\n
+    """
+    status: str
+    image_url: str | None = None
+    cards: list[str] = field(default_factory=list)
+    codes: list[str] = field(default_factory=list)
+    morse: str | None = None
+
+    def text_body(self) -> str:
+        """HTML-текст для підпису/повідомлення."""
+        if self.status != "found":
+            return STATUS_MESSAGES[self.status]
+        items = "\n".join(f"• <b>{c}</b>" for c in self.cards + self.codes)
+        morse_text = f"\n\n<b>Шифр Морзе:</b>\n{self.morse}" if self.morse else ""
+        return f"{items}{morse_text}" or "✅ <b>Комбо знайдено.</b>"
+
+    def fingerprint(self) -> str:
+        """
+        Нормалізований відбиток комбо: статус, картки й коди (без регістру, зайвих пробілів
+        і порядку), Морзе та URL картинки без схеми, query і fragment. Косметичні зміни
+        сторінки (інший порядок карток, ?ver=... у картинці) новою версією не вважаються.
+        """
+        def norm(value: str) -> str:
+            return _WHITESPACE.sub(" ", value).strip().casefold()
+
+        image = None
+        if self.image_url:
+            image = re.sub(r"^https?://", "", self.image_url.split("#", 1)[0].split("?", 1)[0]).lower()
+        canonical = {
+            "status": self.status,
+            "cards": sorted({norm(c) for c in self.cards}),
+            "codes": sorted({norm(c) for c in self.codes}),
+            "morse": [norm(line) for line in self.morse.splitlines()] if self.morse else None,
+            "image": image,
+        }
+        payload = json.dumps(canonical, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+# ================== КЕШ РЕЗУЛЬТАТІВ ПАРСИНГУ ==================
+class ParseCache:
+    """
+    LRU-кеш результатів парсингу, ключ — (джерело, blake2b-хеш тіла сторінки).
+    Якщо байти сторінки не змінилися, повертається готовий результат без жодної роботи BeautifulSoup.
+    Результати спільні для всіх викликів, тому їх не можна мутувати.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._items: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(source: str, content: bytes) -> tuple[str, bytes]:
+        return source, hashlib.blake2b(content, digest_size=16).digest()
+
+    def get(self, key: Hashable) -> Any | None:
+        value = self._items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._items),
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+        }
+
+parse_cache = ParseCache(maxsize=int(os.getenv("PARSE_CACHE_SIZE", 64)))
+
+# ================== ПРАВИЛА ВИЛУЧЕННЯ ==================
+# Що і де шукати на сторінці кожного джерела описано в combo_rules.toml. Правила компілюються
+# один раз при імпорті модуля (у воркерах parse_executor — один раз на процес), далі парсер
+# лише застосовує готові regex, селектори та множини тегів
+RULES_PATH = os.getenv("COMBO_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "combo_rules.toml"))
+RESULT_FIELDS = ("cards", "codes", "morse")
+_WHITESPACE = re.compile(r"\s+")
+
+def _any_of(words) -> re.Pattern | None:
+    """Список слів → один regex «містить будь-яке з них» (у нижньому регістрі); порожній список → None."""
+    words = [word.lower() for word in words]
+    return re.compile("|".join(map(re.escape, words))) if words else None
+
+@dataclass(frozen=True)
+class FieldRule:
+    """Одне поле ComboResult і фільтри, через які проходить текст кожного тегу."""
+    name: str
+    pattern: re.Pattern | None = None
+    template: str = "{0}"
+    trigger: re.Pattern | None = None
+    split_words: bool = False
+    require_uppercase: bool = False
+    min_len: int = 1
+    max_len: int = sys.maxsize
+    exclude: re.Pattern | None = None
+    to_upper: bool = False
+    unique: bool = True
+    limit: int | None = None
+    stop_after: int | None = None
+    min_found: int = 1
+
+    @property
+    def enough(self) -> int | None:
+        """Скільки значень досить: після `limit` (або `stop_after`) нові значення вже нічого не змінять."""
+        return self.limit or self.stop_after
+
+    def collect(self, text: str, lower: str, values: list[str]) -> None:
+        """Додає до `values` значення, які дає текст тегу (не більше `limit`)."""
+        if self.limit is not None and len(values) >= self.limit:
+            return
+        if self.trigger is not None and not self.trigger.search(lower):
+            return
+        if self.pattern is not None:
+            match = self.pattern.search(text)
+            if not match:
+                return
+            candidates = [self.template.format(*(_WHITESPACE.sub("", group or "") for group in match.groups()))]
+        elif self.split_words:
+            candidates = ["".join(filter(str.isalnum, part)) for part in text.split()]
+        else:
+            candidates = [text]
+
+        for value in candidates:
+            if not self.min_len <= len(value) <= self.max_len:
+                continue
+            if self.require_uppercase and not value.isupper():
+                continue
+            if self.exclude is not None and self.exclude.search(value.lower()):
+                continue
+            if self.to_upper:
+                value = value.upper()
+            if self.unique and value in values:
+                continue
+            values.append(value)
+            if self.limit is not None and len(values) >= self.limit:
+                return
+
+@dataclass(frozen=True)
+class SourceRules:
+    """Скомпільовані правила одного джерела (секція [sources.<гра>] у combo_rules.toml)."""
+    game: str
+    url: str
+    title: str
+    button: str
+    base_url: str
+    image_keywords: re.Pattern
+    scan: frozenset[str]
+    fields: tuple[FieldRule, ...]
+    skip_tags: frozenset[str] = frozenset()
+    skip_contains: re.Pattern | None = None
+    anchor_tags: frozenset[str] = frozenset()
+    anchor_contains: str = ""
+    searching_markers: re.Pattern | None = None
+    empty_status: str = "not_found"
+    image_is_found: bool = False
+    mirrors: tuple[str, ...] = ()
+
+@dataclass(frozen=True)
+class TagSelector:
+    """
+    Простий CSS-селектор — `tag`, `tag.class`, `tag#id` або їхній список через кому —
+    скомпільований у таблицю «назва тегу → вимоги». Перевірка тегу — кілька операцій
+    без загального рушія селекторів, обхід дерева лінивий.
+    """
+    alternatives: dict[str, tuple[tuple[str | None, str | None], ...]]
+
+    def matches(self, el: Tag) -> bool:
+        for cls, id_ in self.alternatives.get(el.name, ()):
+            if (cls is None or cls in el.get("class", ())) and (id_ is None or el.get("id") == id_):
+                return True
+        return False
+
+    def iter(self, root):
+        from bs4 import Tag
+
+        return (el for el in root.descendants if isinstance(el, Tag) and self.matches(el))
+
+    def select_one(self, root) -> Tag | None:
+        return next(self.iter(root), None)
+
+    def select(self, root) -> list[Tag]:
+        return list(self.iter(root))
+
+@dataclass(frozen=True)
+class ScraperRules:
+    """Скомпільовані правила hamster_scraper.extract_combo (секція [scraper])."""
+    containers: tuple[TagSelector, ...]
+    cards: tuple[TagSelector, ...]
+    min_len: int
+    exclude_exact: frozenset[str]
+    min_cards: int
+    limit: int
+    list_min_items: int
+    list_min_len: int
+
+@dataclass(frozen=True)
+class ImageRules:
+    """Спільні правила пошуку картинки комбо (секція [defaults])."""
+    content_tags: list[str]
+    content_class: re.Pattern
+    exclude: re.Pattern | None
+    min_size: int
+
+def _config_error(where: str, message: str) -> RuntimeError:
+    return RuntimeError(f"{RULES_PATH} [{where}]: {message}")
+
+def _check_keys(where: str, data: dict, allowed) -> None:
+    unknown = set(data) - set(allowed)
+    if unknown:
+        raise _config_error(where, f"невідомі ключі: {', '.join(sorted(unknown))}")
+
+_SIMPLE_SELECTOR = re.compile(r"([a-z][a-z0-9]*)(?:\.([\w-]+)|#([\w-]+))?", re.IGNORECASE)
+
+def _compile_selector(where: str, selector: str) -> TagSelector:
+    alternatives: dict[str, list] = {}
+    for part in selector.split(","):
+        match = _SIMPLE_SELECTOR.fullmatch(part.strip())
+        if not match:
+            raise _config_error(where, f"селектор {part.strip()!r}: підтримуються лише tag, tag.class, tag#id")
+        name, cls, id_ = match.groups()
+        alternatives.setdefault(name.lower(), []).append((cls, id_))
+    return TagSelector({name: tuple(reqs) for name, reqs in alternatives.items()})
+
+def _compile_field(where: str, data: dict) -> FieldRule:
+    allowed = {f for f in FieldRule.__dataclass_fields__} | {"ignore_case"}
+    _check_keys(where, data, allowed)
+    data = dict(data)
+    if data.get("name") not in RESULT_FIELDS:
+        raise _config_error(where, f"name має бути одним з {RESULT_FIELDS}")
+    if "limit" in data and data.get("min_found", 1) > data["limit"]:
+        raise _config_error(where, "min_found не може перевищувати limit")
+    if "pattern" in data:
+        flags = re.IGNORECASE if data.pop("ignore_case", False) else 0
+        try:
+            data["pattern"] = re.compile(data["pattern"], flags)
+        except re.error as e:
+            raise _config_error(where, f"некоректний regex {data['pattern']!r}: {e}") from e
+    data.pop("ignore_case", None)
+    for key in ("trigger", "exclude"):
+        if key in data:
+            data[key] = _any_of(data[key])
+    return FieldRule(**data)
+
+def _compile_source(game: str, data: dict, defaults: dict) -> SourceRules:
+    where = f"sources.{game}"
+    allowed = (set(SourceRules.__dataclass_fields__) - {"game", "image_keywords"}) | {"image_keyword"}
+    _check_keys(where, data, allowed)
+    missing = {"url", "title", "button", "base_url", "scan"} - set(data)
+    if missing:
+        raise _config_error(where, f"бракує ключів: {', '.join(sorted(missing))}")
+    data = dict(data)
+    image_keyword = data.pop("image_keyword", game).lower().replace(" ", "-")
+    fields = tuple(_compile_field(f"{where}.fields[{i}]", item) for i, item in enumerate(data.pop("fields", [])))
+    if not fields:
+        raise _config_error(where, "потрібне хоча б одне поле [[fields]]")
+    if data.get("empty_status", "not_found") not in STATUS_MESSAGES:
+        raise _config_error(where, f"empty_status має бути одним з {tuple(STATUS_MESSAGES)}")
+    if data.get("anchor_tags") and not data.get("anchor_contains"):
+        raise _config_error(where, "anchor_tags потребує anchor_contains")
+    if data.get("skip_tags") and not data.get("skip_contains"):
+        raise _config_error(where, "skip_tags потребує skip_contains")
+    for key in ("skip_contains", "searching_markers"):
+        if key in data:
+            data[key] = _any_of(data[key])
+    data["mirrors"] = tuple(data.get("mirrors", ()))
+    for key in ("scan", "skip_tags", "anchor_tags"):
+        if key in data:
+            data[key] = frozenset(data[key])
+    data["anchor_contains"] = data.get("anchor_contains", "").lower()
+    return SourceRules(
+        game=game,
+        image_keywords=_any_of([*defaults.get("image_keywords", ()), image_keyword]),
+        fields=fields,
+        **data,
+    )
+
+def _compile_scraper(data: dict) -> ScraperRules:
+    _check_keys("scraper", data, ScraperRules.__dataclass_fields__)
+    data = dict(data)
+    data["containers"] = tuple(_compile_selector("scraper", s) for s in data["containers"])
+    data["cards"] = tuple(_compile_selector("scraper", s) for s in data["cards"])
+    data["exclude_exact"] = frozenset(word.lower() for word in data["exclude_exact"])
+    return ScraperRules(**data)
+
+def load_rules(path: str | None = None) -> tuple[ImageRules, dict[str, SourceRules], ScraperRules]:
+    """Читає та компілює combo_rules.toml; помилка в конфігурації зупиняє старт з описом місця."""
+    with open(path or RULES_PATH, "rb") as f:
+        config = tomllib.load(f)
+    defaults = config.get("defaults", {})
+    _check_keys("defaults", defaults, {"content_tags", "content_classes", "image_keywords", "image_exclude", "image_min_size"})
+    image = ImageRules(
+        content_tags=defaults["content_tags"],
+        # Підрядок у будь-якому з класів тегу — один regex замість перебору слів
+        content_class=re.compile("|".join(map(re.escape, defaults["content_classes"]))),
+        exclude=_any_of(defaults.get("image_exclude", ())),
+        min_size=defaults.get("image_min_size", 200),
+    )
+    sources = {game: _compile_source(game, data, defaults) for game, data in config.get("sources", {}).items()}
+    return image, sources, _compile_scraper(config["scraper"])
+
+IMAGE_RULES, RULES, SCRAPER_RULES = load_rules()
+
+# ================== ЗОБРАЖЕННЯ ==================
+def _image_url(rules: SourceRules, attrs) -> str | None:
+    """Абсолютний URL, якщо тег <img> з атрибутами `attrs` схожий на картинку комбо, інакше None."""
+    src = attrs.get("src") or ""
+    img_check_string = (src + (attrs.get("alt") or "") + (attrs.get("title") or "")).lower()
+
+    # 1. Виключаємо логотипи, іконки, заглушки
+    if IMAGE_RULES.exclude is not None and IMAGE_RULES.exclude.search(img_check_string):
+        return None
+
+    # 2. Зображення має бути релевантним АБО достатньо великим (відсіює банери/іконки)
+    is_relevant = rules.image_keywords.search(img_check_string) is not None
+    is_large_enough = False
+    width = attrs.get("width")
+    height = attrs.get("height")
+    try:
+        if width and height and int(width) > IMAGE_RULES.min_size and int(height) > IMAGE_RULES.min_size:
+            is_large_enough = True
+    except ValueError:
+        pass
+
+    if is_relevant or is_large_enough:
+        # Вирішення відносного шляху
+        if src.startswith('http'):
+            return src
+        elif src.startswith('//'):
+            return f"https:{src}"
+        elif src.startswith('/'):
+            return rules.base_url.rstrip('/') + src
+    return None
+
+def _find_combo_image_url(soup: BeautifulSoup, rules: SourceRules) -> str | None:
+    """Шукає тег <img> з ключовими словами УСЕРЕДИНІ КОНТЕНТУ та повертає абсолютний URL."""
+    content_area = soup.find(IMAGE_RULES.content_tags, class_=IMAGE_RULES.content_class) or soup
+
+    for img in content_area.find_all("img"):
+        image_url = _image_url(rules, img.attrs)
+        if image_url:
+            return image_url
+    return None
+
+# ================== ПАРСЕР ==================
+def extract(rules: SourceRules, html: str) -> ComboResult:
+    """
+    Єдиний парсер для всіх джерел: будує soup один раз і застосовує скомпільовані правила.
+    Порядок: картинка → маркери "searching" → якір-заголовок → поля по тегах `scan`.
+    """
+    from bs4 import Tag
+
+    soup = make_soup(html)
+    image_url = _find_combo_image_url(soup, rules)
+
+    if rules.searching_markers is not None and rules.searching_markers.search(html.lower()):
+        return ComboResult(status="searching", image_url=image_url)
+
+    if rules.anchor_tags:
+        anchor = next(
+            (
+                el for el in soup.descendants
+                if isinstance(el, Tag) and el.name in rules.anchor_tags
+                and rules.anchor_contains in el.get_text(strip=True).lower()
+            ),
+            None,
+        )
+        if anchor is None:
+            return ComboResult(status="not_published", image_url=image_url)
+        elements = anchor.next_elements
+    else:
+        elements = soup.descendants
+    # Лінивий обхід: з ранім виходом не доводиться будувати список усіх тегів сторінки
+    tags = (el for el in elements if isinstance(el, Tag) and el.name in rules.scan)
+
+    values: dict[str, list[str]] = {rule.name: [] for rule in rules.fields}
+    # Ранній вихід: коли всі поля набрали потрібну кількість, решту сторінки не переглядаємо
+    stoppers = [rule for rule in rules.fields if rule.enough]
+    for tag in tags:
+        text = tag.get_text(strip=True)
+        lower = text.lower()
+        if tag.name in rules.skip_tags and rules.skip_contains.search(lower):
+            continue
+        for rule in rules.fields:
+            rule.collect(text, lower, values[rule.name])
+        if stoppers and all(len(values[rule.name]) >= rule.enough for rule in stoppers):
+            break
+
+    found = any(len(values[rule.name]) >= rule.min_found for rule in rules.fields)
+    if not (found or (rules.image_is_found and image_url)):
+        return ComboResult(status=rules.empty_status, image_url=image_url)
+
+    for rule in rules.fields:
+        if rule.limit is not None:
+            values[rule.name] = values[rule.name][:rule.limit]
+    return ComboResult(
+        status="found",
+        image_url=image_url,
+        cards=values.get("cards", []),
+        codes=values.get("codes", []),
+        morse="\n".join(values["morse"]) if values.get("morse") else None,
+    )
+
+def parse(game: str, html: str) -> ComboResult:
+    return extract(RULES[game], html)
+
+# partial(parse, гра) серіалізується для пулу процесів за посиланням на функцію
+PARSERS = {game: partial(parse, game) for game in RULES}
+
+# ================== ПОТОКОВИЙ РЕЖИМ ==================
+# Комбо зазвичай стоїть на початку entry-content, тож сторінку не обов'язково качати до кінця.
+# StreamScanner — дешевий інкрементальний токенізатор (html.parser без дерева): він отримує
+# шматки відповіді й каже, коли прочитаного вже досить. Сам результат завжди рахує extract()
+# на прочитаному префіксі, а is_complete() перевіряє, що в префіксі є все потрібне правилам.
+# Префікс обрізається одразу після елемента, на якому сканер вирішив, що досить, — тож він не
+# залежить від того, як мережа поділила відповідь на шматки. І результат на ньому той самий, що
+# на повній сторінці: сканер не ріже, доки відкритий хоч один елемент зі `scan` (або кандидат
+# у якорі) — у повному розборі такий контейнер іде перед своїми дітьми, і його текст цілком
+# міг би дати інші значення. Якщо комбо обгорнуте в такий контейнер до кінця сторінки, вона
+# читається повністю. Виняток — маркери "searching": на повній сторінці їх шукають усюди, тож
+# маркер, що трапляється лише після місця обрізання, префікс не побачить.
+
+_VOID_TAGS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr",
+})
+_NO_TEXT_TAGS = frozenset({"script", "style", "template"})
+
+def is_complete(rules: SourceRules, result: ComboResult) -> bool:
+    """
+    Чи достатньо результату, отриманого з початку сторінки: маркер "searching" уже знайдено,
+    або знайдено картинку і всі поля з limit/stop_after набрали потрібну кількість значень.
+    """
+    if result.status == "searching":
+        return True
+    stoppers = [rule for rule in rules.fields if rule.enough]
+    if result.status != "found" or result.image_url is None or not stoppers:
+        return False
+    counts = {
+        "cards": len(result.cards),
+        "codes": len(result.codes),
+        "morse": len(result.morse.split("\n")) if result.morse else 0,
+    }
+    return all(counts[rule.name] >= rule.enough for rule in stoppers)
+
+class StreamScanner(HTMLParser):
+    """
+    Інкрементальний сканер для HttpClient.get(until=...): feed(шматок байтів) повертає довжину
+    префікса в байтах, щойно в прочитаному є все, що extract() шукає для цього джерела — маркер
+    "searching" або картинка в контенті плюс потрібна кількість значень кожного поля після якоря;
+    до того — None. Префікс закінчується кінцем тегу (або маркера), на якому це стало відомо.
+    Текст елемента рахується як у get_text(strip=True), але лише для закритих елементів.
+    html.parser віддає один текстовий вузол кількома handle_data, якщо його розрізала межа шматків,
+    тож вузол збирається цілим і обрізається лише на наступній події розмітки.
+    """
+
+    def __init__(self, rules: SourceRules):
+        super().__init__(convert_charrefs=True)
+        self.rules = rules
+        self.cut: int | None = None   # довжина достатнього префікса в байтах
+        # surrogateescape: байти, що не є UTF-8, переживають декодування, і позиції точно переводяться назад у байти
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="surrogateescape")
+        self._text: list[str] = []
+        self._data: list[str] = []   # поточний текстовий вузол, ще не обрізаний
+        self._stoppers = [rule for rule in rules.fields if rule.enough]
+        self._values: dict[str, list[str]] = {rule.name: [] for rule in rules.fields}
+        self._marker_tail = ""
+        # Відкриті елементи: [назва, порядковий номер, шматки тексту або None, якщо текст не потрібен]
+        self._stack: list[list] = []
+        self._opened = 0
+        self._no_text = 0
+        self._content_depth: int | None = None   # глибина стеку, на якій відкрито контентну область
+        self._content_done = False
+        self._image_found = False
+        self._anchor: int | None = None if rules.anchor_tags else -1
+        self._pending: list[tuple[int, str, str]] = []   # закриті елементи до того, як знайдено якір
+
+    @property
+    def ready(self) -> bool:
+        return self.cut is not None
+
+    def feed(self, data: bytes) -> int | None:
+        if self.ready or not self._stoppers and self.rules.searching_markers is None:
+            return self.cut
+        text = self._decoder.decode(data)
+        self._text.append(text)
+        if self.rules.searching_markers is not None:
+            # Хвіст попереднього шматка — щоб не пропустити маркер на межі шматків
+            window = self._marker_tail + text.lower()
+            match = self.rules.searching_markers.search(window)
+            if match:
+                position = sum(len(piece) for piece in self._text) - len(text)
+                self._cut_at(position + max(0, match.end() - len(self._marker_tail)))
+                return self.cut
+            self._marker_tail = window[-32:]
+        super().feed(text)
+        return self.cut
+
+    def _cut_at(self, end: int) -> None:
+        """Фіксує межу префікса: `end` — позиція в уже декодованому тексті."""
+        self.cut = len("".join(self._text)[:end].encode("utf-8", "surrogateescape"))
+        self._text.clear()
+
+    def _tag_end(self, start_tag: bool) -> int:
+        """Позиція кінця поточного тегу: getpos() у хендлері вказує на його початок."""
+        text = "".join(self._text)
+        line, column = self.getpos()
+        start = 0
+        for _ in range(line - 1):
+            start = text.index("\n", start) + 1
+        start += column
+        if start_tag:
+            return start + len(self.get_starttag_text() or "")
+        return text.index(">", start) + 1
+
+    def _flush_data(self) -> None:
+        """Кінець текстового вузла (почався тег, коментар тощо): обрізаний текст — відкритим елементам."""
+        if not self._data:
+            return
+        piece = "".join(self._data).strip()
+        self._data.clear()
+        if piece and not self._no_text:
+            for item in self._stack:
+                if item[2] is not None:
+                    item[2].append(piece)
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        self._flush_data()
+        if tag == "img":
+            if self._content_depth is not None and not self._image_found:
+                self._image_found = _image_url(self.rules, dict(attrs)) is not None
+                self._check(start_tag=True)
+            return
+        if tag in _VOID_TAGS:
+            return
+        if self._content_depth is None and not self._content_done and tag in IMAGE_RULES.content_tags:
+            classes = dict(attrs).get("class") or ""
+            if IMAGE_RULES.content_class.search(classes):
+                self._content_depth = len(self._stack)
+        tracked = tag in self.rules.scan or (self._anchor is None and tag in self.rules.anchor_tags)
+        self._opened += 1
+        self._stack.append([tag, self._opened, [] if tracked else None])
+        if tag in _NO_TEXT_TAGS:
+            self._no_text += 1
+
+    def handle_startendtag(self, tag: str, attrs) -> None:
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        self._flush_data()
+        if not any(item[0] == tag for item in self._stack):
+            return
+        while self._stack:
+            name, index, pieces = self._stack.pop()
+            if name in _NO_TEXT_TAGS:
+                self._no_text -= 1
+            if self._content_depth is not None and len(self._stack) <= self._content_depth:
+                # Контентна область закрилася: у повному документі картинку шукали б лише в ній
+                self._content_depth = None
+                self._content_done = True
+            if pieces is not None:
+                self._closed(name, index, "".join(pieces))
+            if name == tag:
+                break
+        self._check(start_tag=False)
+
+    def handle_data(self, data: str) -> None:
+        if not self._no_text:
+            self._data.append(data)
+
+    def handle_comment(self, data: str) -> None:
+        self._flush_data()
+
+    def handle_decl(self, decl: str) -> None:
+        self._flush_data()
+
+    def handle_pi(self, data: str) -> None:
+        self._flush_data()
+
+    def unknown_decl(self, data: str) -> None:
+        self._flush_data()
+
+    def _closed(self, name: str, index: int, text: str) -> None:
+        rules = self.rules
+        if self._anchor is None:
+            if name in rules.anchor_tags and rules.anchor_contains in text.lower():
+                self._anchor = index
+                for pending in self._pending:
+                    if pending[0] > index:
+                        self._collect(*pending[1:])
+                self._pending.clear()
+            elif name in rules.scan:
+                self._pending.append((index, name, text))
+            return
+        if name in rules.scan and index > self._anchor:
+            self._collect(name, text)
+
+    def _collect(self, name: str, text: str) -> None:
+        lower = text.lower()
+        if name in self.rules.skip_tags and self.rules.skip_contains.search(lower):
+            return
+        for rule in self.rules.fields:
+            rule.collect(text, lower, self._values[rule.name])
+
+    def _check(self, start_tag: bool) -> None:
+        if self.ready or not (self._image_found and self._anchor is not None and self._stoppers):
+            return
+        if not all(len(self._values[rule.name]) >= rule.enough for rule in self._stoppers):
+            return
+        # Відкритий елемент зі `scan` (чи кандидат у якорі) на повній сторінці дасть текст, якого
+        # в префіксі ще немає, — різати можна лише тоді, коли таких не лишилося
+        if any(item[2] is not None for item in self._stack):
+            return
+        self._cut_at(self._tag_end(start_tag))
@@ -0,0 +1,402 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+
+from combo_parsers import ComboResult
+from http_client import http_date
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS combos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    game TEXT NOT NULL,
+    day TEXT NOT NULL,             -- YYYY-MM-DD (локальна дата сервера)
+    first_seen REAL NOT NULL,      -- unix time першого отримання цієї версії
+    fetched_at REAL NOT NULL,      -- unix time останнього підтвердження цієї версії
+    image_url TEXT,
+    text TEXT NOT NULL,
+    payload TEXT NOT NULL,         -- ComboResult у JSON
+    etag TEXT,
+    last_modified TEXT,
+    fingerprint TEXT,              -- ComboResult.fingerprint(): нова версія лише при його зміні
+    source_updated_at REAL         -- unix time зміни сторінки за джерелом (Last-Modified), якщо відомо
+);
+CREATE INDEX IF NOT EXISTS idx_combos_game_day ON combos (game, day, id);
+CREATE TABLE IF NOT EXISTS photo_file_ids (
+    image_url TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL,         -- Telegram file_id після першого успішного send_photo
+    updated_at REAL NOT NULL
+);
+"""
+
+# Підписки та черга розсилки; ті самі таблиці й у спільному SQLite (shared_state.SqliteState)
+SUBSCRIPTIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    chat_id INTEGER NOT NULL,
+    game TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (chat_id, game)
+);
+CREATE TABLE IF NOT EXISTS broadcast_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    game TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    not_before REAL NOT NULL,      -- unix time, раніше якого не надсилати (ретраї, RetryAfter)
+    attempts INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (chat_id, game)         -- одна незавершена розсилка на чат і гру
+);
+CREATE INDEX IF NOT EXISTS idx_broadcast_due ON broadcast_queue (not_before);
+"""
+
+
+class SubscriptionQueue:
+    """
+    Підписки та черга розсилки поверх SQL-таблиць SUBSCRIPTIONS_SCHEMA. Клас-спадкоємець
+    надає _write(query, params) -> кількість змінених рядків і _read(query, params) -> рядки;
+    синхронні методи виконуються в потоці, async-обгортки — для event loop.
+    """
+
+    def subscribe_sync(self, chat_id: int, game: str) -> bool:
+        return self._write(
+            "INSERT OR IGNORE INTO subscriptions (chat_id, game, created_at) VALUES (?, ?, ?)",
+            (chat_id, game, time.time()),
+        ) > 0
+
+    def unsubscribe_sync(self, chat_id: int, game: str | None = None) -> int:
+        """Відписує чат від гри (або від усіх ігор, якщо game=None) і прибирає його незавершені розсилки."""
+        if game is None:
+            self._write("DELETE FROM broadcast_queue WHERE chat_id = ?", (chat_id,))
+            return self._write("DELETE FROM subscriptions WHERE chat_id = ?", (chat_id,))
+        self._write("DELETE FROM broadcast_queue WHERE chat_id = ? AND game = ?", (chat_id, game))
+        return self._write("DELETE FROM subscriptions WHERE chat_id = ? AND game = ?", (chat_id, game))
+
+    def subscriptions_sync(self, chat_id: int) -> list[str]:
+        return [row[0] for row in self._read("SELECT game FROM subscriptions WHERE chat_id = ? ORDER BY game", (chat_id,))]
+
+    def enqueue_broadcast_sync(self, game: str) -> int:
+        """Ставить гру в чергу для всіх її підписників. Повертає кількість нових задач."""
+        now = time.time()
+        return self._write(
+            "INSERT OR IGNORE INTO broadcast_queue (chat_id, game, created_at, not_before) "
+            "SELECT chat_id, game, ?, ? FROM subscriptions WHERE game = ?",
+            (now, now, game),
+        )
+
+    def due_broadcasts_sync(self, limit: int) -> list[tuple[int, int, str, int]]:
+        """Задачі, які вже можна надсилати: (id, chat_id, game, attempts)."""
+        return self._read(
+            "SELECT id, chat_id, game, attempts FROM broadcast_queue WHERE not_before <= ? ORDER BY id LIMIT ?",
+            (time.time(), limit),
+        )
+
+    def complete_broadcast_sync(self, job_id: int) -> None:
+        self._write("DELETE FROM broadcast_queue WHERE id = ?", (job_id,))
+
+    def retry_broadcast_sync(self, job_id: int, delay: float, attempts: int) -> None:
+        self._write(
+            "UPDATE broadcast_queue SET not_before = ?, attempts = ? WHERE id = ?",
+            (time.time() + delay, attempts, job_id),
+        )
+
+    async def subscribe(self, chat_id: int, game: str) -> bool:
+        return await asyncio.to_thread(self.subscribe_sync, chat_id, game)
+
+    async def unsubscribe(self, chat_id: int, game: str | None = None) -> int:
+        return await asyncio.to_thread(self.unsubscribe_sync, chat_id, game)
+
+    async def subscriptions(self, chat_id: int) -> list[str]:
+        return await asyncio.to_thread(self.subscriptions_sync, chat_id)
+
+    async def enqueue_broadcast(self, game: str) -> int:
+        return await asyncio.to_thread(self.enqueue_broadcast_sync, game)
+
+    async def due_broadcasts(self, limit: int) -> list[tuple[int, int, str, int]]:
+        return await asyncio.to_thread(self.due_broadcasts_sync, limit)
+
+    async def complete_broadcast(self, job_id: int) -> None:
+        await asyncio.to_thread(self.complete_broadcast_sync, job_id)
+
+    async def retry_broadcast(self, job_id: int, delay: float, attempts: int) -> None:
+        await asyncio.to_thread(self.retry_broadcast_sync, job_id, delay, attempts)
+
+
+@dataclass
+class StoredCombo:
+    game: str
+    day: str
+    first_seen: float
+    fetched_at: float
+    image_url: str | None
+    text: str
+    result: ComboResult
+    etag: str | None
+    last_modified: str | None
+    fingerprint: str
+    source_updated_at: float | None
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    @property
+    def detection_latency(self) -> float | None:
+        """Скільки секунд минуло від зміни сторінки (за джерелом) до того, як бот побачив цю версію."""
+        if self.source_updated_at is None or self.source_updated_at > self.first_seen:
+            return None
+        return self.first_seen - self.source_updated_at
+
+
+class ComboStore(SubscriptionQueue):
+    """
+    Постійне сховище комбо в SQLite на томі /app/data.
+
+    Для кожної гри зберігається історія версій: новий рядок пишеться лише тоді,
+    коли змінився нормалізований відбиток комбо (ComboResult.fingerprint);
+    інакше в останньому рядку оновлюється fetched_at/ETag. first_seen версії — момент,
+    коли бот її помітив, source_updated_at — коли, за словами джерела, змінилася сторінка.
+    Підписки й черга розсилки (SubscriptionQueue) живуть тут, доки бот працює на одній репліці;
+    для кількох реплік їх тримає спільний стан (shared_state).
+    З'єднання відкривається ліниво при першому зверненні. Якщо диск недоступний,
+    сховище вимикається, а бот продовжує працювати лише з пам'яттю.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._disabled = False
+
+    def _connect(self) -> sqlite3.Connection | None:
+        if self._conn is None and not self._disabled:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                self._migrate(conn)
+                conn.executescript(SCHEMA + SUBSCRIPTIONS_SCHEMA)
+                self._conn = conn
+                logger.info(f"Сховище комбо відкрито: {self.path}")
+            except (OSError, sqlite3.Error) as e:
+                logger.error(f"Не вдалося відкрити сховище {self.path}: {e}. Працюємо без збереження.")
+                self._disabled = True
+        return self._conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        """Додає колонки версіонування до сховища, створеного старішою версією бота, і заповнює відбитки."""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(combos)")}
+        if not columns or "fingerprint" in columns:
+            return
+        with conn:
+            conn.execute("ALTER TABLE combos ADD COLUMN fingerprint TEXT")
+            conn.execute("ALTER TABLE combos ADD COLUMN source_updated_at REAL")
+            rows = conn.execute("SELECT id, payload, last_modified FROM combos").fetchall()
+            conn.executemany(
+                "UPDATE combos SET fingerprint = ?, source_updated_at = ? WHERE id = ?",
+                [
+                    (ComboResult(**json.loads(payload)).fingerprint(), http_date(last_modified), row_id)
+                    for row_id, payload, last_modified in rows
+                ],
+            )
+        logger.info(f"Сховище комбо оновлено: відбитки для {len(rows)} записів.")
+
+    # ---------- синхронне ядро (виконується в потоці) ----------
+
+    def record_sync(
+        self,
+        game: str,
+        result: ComboResult,
+        text: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+        fetched_at: float | None = None,
+    ) -> bool:
+        """
+        Записує результат. Повертає True, якщо його відбиток відрізняється від останньої збереженої
+        версії гри (тобто комбо справді змінилося), і False для повтору — тоді в останній версії
+        лише оновлюються fetched_at і валідатори.
+        """
+        fetched_at = fetched_at or time.time()
+        day = datetime.fromtimestamp(fetched_at).strftime("%Y-%m-%d")
+        payload = json.dumps(asdict(result), ensure_ascii=False, sort_keys=True)
+        fingerprint = result.fingerprint()
+
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return False
+            with conn:
+                row = conn.execute(
+                    "SELECT id, fingerprint FROM combos WHERE game = ? ORDER BY id DESC LIMIT 1",
+                    (game,),
+                ).fetchone()
+                changed = row is None or row[1] != fingerprint
+                if not changed:
+                    conn.execute(
+                        "UPDATE combos SET fetched_at = ?, etag = ?, last_modified = ? WHERE id = ?",
+                        (fetched_at, etag, last_modified, row[0]),
+                    )
+                else:
+                    conn.execute(
+                        "INSERT INTO combos (game, day, first_seen, fetched_at, image_url, text, payload, etag, "
+                        "last_modified, fingerprint, source_updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            game, day, fetched_at, fetched_at, result.image_url, text, payload, etag,
+                            last_modified, fingerprint, http_date(last_modified),
+                        ),
+                    )
+                return changed
+
+    def latest_sync(self) -> dict[str, StoredCombo]:
+        """Остання збережена версія для кожної гри."""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return {}
+            rows = conn.execute(
+                "SELECT game, day, first_seen, fetched_at, image_url, text, payload, etag, last_modified, fingerprint, source_updated_at "
+                "FROM combos WHERE id IN (SELECT MAX(id) FROM combos GROUP BY game)"
+            ).fetchall()
+        return {row[0]: _row_to_combo(row) for row in rows}
+
+    def history_sync(self, game: str, day: str | None = None, limit: int = 50) -> list[StoredCombo]:
+        """Версії комбо гри (новіші першими), за потреби — лише за вказаний день."""
+        query = (
+            "SELECT game, day, first_seen, fetched_at, image_url, text, payload, etag, last_modified, fingerprint, source_updated_at "
+            "FROM combos WHERE game = ?"
+        )
+        params: list = [game]
+        if day:
+            query += " AND day = ?"
+            params.append(day)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return []
+            rows = conn.execute(query, params).fetchall()
+        return [_row_to_combo(row) for row in rows]
+
+    def publish_times_sync(self, game: str, days: int = 14) -> list[float]:
+        """
+        Коли за останні `days` днів з'являлося нове комбо: для кожного дня — first_seen першої
+        знайденої версії з новим відбитком. Перша версія в історії (без попередника) публікацією
+        не вважається — невідомо, коли вона з'явилася насправді. Старіші першими.
+        """
+        since = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return []
+            # Версії за період плюс остання перед ним — щоб було з чим порівняти першу
+            rows = conn.execute(
+                "SELECT day, first_seen, payload, fingerprint FROM combos WHERE game = ? AND id >= "
+                "COALESCE((SELECT MAX(id) FROM combos WHERE game = ? AND day < ?), 0) ORDER BY id",
+                (game, game, since),
+            ).fetchall()
+
+        times = []
+        published_days = set()
+        previous = None
+        for day, first_seen, payload, fingerprint in rows:
+            if (
+                previous is not None and fingerprint != previous and day >= since and day not in published_days
+                and json.loads(payload)["status"] == "found"
+            ):
+                times.append(first_seen)
+                published_days.add(day)
+            previous = fingerprint
+        return times
+
+    def file_ids_sync(self) -> dict[str, str]:
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return {}
+            return dict(conn.execute("SELECT image_url, file_id FROM photo_file_ids").fetchall())
+
+    def save_file_id_sync(self, image_url: str, file_id: str | None) -> None:
+        """Зберігає file_id для URL зображення; file_id=None видаляє запис."""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            with conn:
+                if file_id is None:
+                    conn.execute("DELETE FROM photo_file_ids WHERE image_url = ?", (image_url,))
+                else:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO photo_file_ids (image_url, file_id, updated_at) VALUES (?, ?, ?)",
+                        (image_url, file_id, time.time()),
+                    )
+
+    # ---------- базові запити (також для SubscriptionQueue) ----------
+
+    def _write(self, query: str, params: tuple = ()) -> int:
+        """Виконує запис у транзакції та повертає кількість змінених рядків."""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return 0
+            with conn:
+                return conn.execute(query, params).rowcount
+
+    def _read(self, query: str, params: tuple = ()) -> list[tuple]:
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return []
+            return conn.execute(query, params).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ---------- async-обгортки для event loop ----------
+
+    async def record(self, *args, **kwargs) -> bool:
+        return await asyncio.to_thread(self.record_sync, *args, **kwargs)
+
+    async def latest(self) -> dict[str, StoredCombo]:
+        return await asyncio.to_thread(self.latest_sync)
+
+    async def file_ids(self) -> dict[str, str]:
+        return await asyncio.to_thread(self.file_ids_sync)
+
+    async def save_file_id(self, image_url: str, file_id: str | None) -> None:
+        await asyncio.to_thread(self.save_file_id_sync, image_url, file_id)
+
+    async def history(self, game: str, day: str | None = None, limit: int = 50) -> list[StoredCombo]:
+        return await asyncio.to_thread(self.history_sync, game, day, limit)
+
+    async def publish_times(self, game: str, days: int = 14) -> list[float]:
+        return await asyncio.to_thread(self.publish_times_sync, game, days)
+
+
+def _row_to_combo(row) -> StoredCombo:
+    game, day, first_seen, fetched_at, image_url, text, payload, etag, last_modified, fingerprint, source_updated_at = row
+    return StoredCombo(
+        game=game,
+        day=day,
+        first_seen=first_seen,
+        fetched_at=fetched_at,
+        image_url=image_url,
+        text=text,
+        result=ComboResult(**json.loads(payload)),
+        etag=etag,
+        last_modified=last_modified,
+        fingerprint=fingerprint,
+        source_updated_at=source_updated_at,
+    )
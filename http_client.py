@@ -0,0 +1,382 @@
+import asyncio
+import email.utils
+import importlib.util
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Sequence
+
+import httpx
+
+from circuit_breaker import OPEN, CircuitBreaker, CircuitOpenError
+from metrics import (
+    UPSTREAM_BYTES,
+    UPSTREAM_FETCH_SECONDS,
+    UPSTREAM_HEDGE_WINS,
+    UPSTREAM_INFLIGHT,
+    UPSTREAM_RETRIES,
+    UPSTREAM_TRUNCATED,
+)
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+def http_date(value: str | None) -> float | None:
+    """Unix-час із HTTP-дати (Last-Modified); None, якщо заголовка немає або він некоректний."""
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class FetchResult:
+    url: str
+    content: bytes
+    encoding: str | None
+    not_modified: bool = False  # True, якщо сервер відповів 304 і тіло взято з попередньої відповіді
+    etag: str | None = None
+    last_modified: str | None = None
+    # Чому тіло неповне: "early_stop" — префікс, якого досить until(), "max_bytes" — спрацював ліміт; None — повне
+    truncated: str | None = None
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+@dataclass
+class _Validators:
+    etag: str | None
+    last_modified: str | None
+    content: bytes
+    encoding: str | None
+    truncated: str | None
+
+
+@dataclass
+class _Host:
+    slots: asyncio.Semaphore
+    breaker: CircuitBreaker
+
+
+def _is_retryable(e: Exception) -> bool:
+    """Мережеві помилки, таймаути, 5xx і 429 — хост хворий, варто повторити; інші 4xx — ні."""
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500 or e.response.status_code == 429
+    return isinstance(e, httpx.TransportError)
+
+
+class HttpClient:
+    """
+    Один довгоживучий httpx.AsyncClient на весь процес: пул з'єднань, keep-alive,
+    HTTP/2 (якщо встановлено h2) та умовні GET-запити через ETag/Last-Modified.
+    Тіло читається потоково: не більше `max_bytes` і лише доки until() не скаже, що досить.
+
+    Для кожного хоста окремо: не більше `max_per_host` одночасних запитів і запобіжник
+    (CircuitBreaker), який після `failure_threshold` помилок поспіль відповідає одразу,
+    не чекаючи таймауту. Тимчасові помилки повторюються до `retries` разів з випадковою
+    експоненційною паузою, але сумарно не довше за `retry_deadline` секунд.
+    Retry-After виконується повністю: раніше хост не отримує жодного запиту (запобіжник
+    тримає паузу, не довше за `retry_after_max` секунд), а якщо пауза не вкладається
+    в `retry_deadline` — запит не повторюється.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 20,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        keepalive_expiry: float = 60,
+        http2: bool = True,
+        max_bytes: int = 2 * 1024 * 1024,
+        max_per_host: int = 4,
+        retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 4.0,
+        retry_deadline: float = 30,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        retry_after_max: float = 300,
+    ):
+        self._timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_per_host = max_per_host
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_deadline = retry_deadline
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retry_after_max = retry_after_max
+        self._hosts: Dict[str, _Host] = {}
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 увімкнено, але пакет h2 не встановлено — використовуємо HTTP/1.1.")
+            http2 = False
+        self._http2 = http2
+        self._client: httpx.AsyncClient | None = None
+        self._validators: Dict[str, _Validators] = {}
+
+    async def start(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self._timeout, connect=min(self._timeout, 5)),
+                limits=self._limits,
+                http2=self._http2,
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT},
+            )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def clear_validators(self) -> None:
+        """Забуває збережені ETag/Last-Modified і тіла (наприклад, для холодних замірів у бенчмарках)."""
+        self._validators.clear()
+
+    def _host(self, url: str, pool: str | None = None) -> _Host:
+        netloc = httpx.URL(url).netloc.decode("ascii")
+        key = f"{netloc}/{pool}" if pool else netloc
+        host = self._hosts.get(key)
+        if host is None:
+            host = _Host(
+                slots=asyncio.Semaphore(self.max_per_host),
+                breaker=CircuitBreaker(key, self.failure_threshold, self.reset_timeout),
+            )
+            self._hosts[key] = host
+        return host
+
+    def circuit_states(self) -> dict[str, str]:
+        """Стан запобіжника кожного хоста, до якого вже були запити."""
+        return {netloc: host.breaker.state for netloc, host in self._hosts.items()}
+
+    async def get(
+        self,
+        url: str,
+        source: str = "other",
+        make_until: Callable[[], Callable[[bytes], int | None]] | None = None,
+        conditional: bool = True,
+        max_bytes: int | None = None,
+        pool: str | None = None,
+        remember: bool = True,
+    ) -> FetchResult:
+        """
+        GET з умовними заголовками. На 304 повертає тіло попередньої відповіді з not_modified=True.
+        `source` — мітка джерела (гра) для метрик; має бути з обмеженого набору значень.
+        `make_until` створює для кожної спроби функцію until, яка отримує шматки тіла; щойно вона
+        повертає довжину достатнього префікса (у байтах, а не None), завантаження припиняється
+        і повертається цей префікс (truncated="early_stop").
+        `conditional=False` — примусово повне завантаження без If-None-Match/If-Modified-Since.
+        `max_bytes` замінює ліміт клієнта для цього запиту (наприклад, для картинок); обрізане
+        тіло позначається truncated="max_bytes".
+        `pool` — окремі запобіжник і ліміт одночасних запитів для частини запитів до того ж хоста
+        (наприклад, "images"): помилки картинок не розмикають запобіжник сторінок і навпаки.
+        `remember=False` — не зберігати ETag/Last-Modified і тіло відповіді: для одноразових
+        завантажень (картинки), які інакше лежали б у пам'яті до кінця процесу.
+        Якщо запобіжник хоста розімкнений, одразу піднімає CircuitOpenError.
+        """
+        outcome = "error"
+        started = time.perf_counter()
+        UPSTREAM_INFLIGHT.inc()
+        try:
+            result = await self._get_with_retries(
+                url, source, make_until, conditional, max_bytes or self.max_bytes, pool, remember,
+            )
+            outcome = "not_modified" if result.not_modified else "ok"
+            return result
+        except CircuitOpenError:
+            outcome = "circuit_open"
+            raise
+        finally:
+            UPSTREAM_INFLIGHT.dec()
+            UPSTREAM_FETCH_SECONDS.labels(source, outcome).observe(time.perf_counter() - started)
+
+    async def get_hedged(
+        self,
+        urls: Sequence[str],
+        source: str = "other",
+        make_until: Callable[[], Callable[[bytes], int | None]] | None = None,
+        conditional: bool = True,
+        hedge_delay: float = 2.0,
+    ) -> FetchResult:
+        """
+        Хеджований GET по дзеркалах однієї сторінки: перша адреса запитується одразу, кожна
+        наступна — якщо попередні не відповіли за `hedge_delay` секунд або впали (зокрема одразу,
+        коли запобіжник їхнього хоста розімкнений). Повертає першу успішну відповідь, решту скасовує.
+        """
+        if len(urls) == 1:
+            return await self.get(urls[0], source, make_until, conditional)
+
+        queue = list(urls)
+        tasks: dict[asyncio.Task, str] = {}
+        error: BaseException | None = None
+
+        def launch() -> None:
+            url = queue.pop(0)
+            tasks[asyncio.create_task(self.get(url, source, make_until, conditional))] = url
+
+        launch()
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(
+                    tasks, timeout=hedge_delay if queue else None, return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    url = tasks.pop(task)
+                    if task.exception() is None:
+                        UPSTREAM_HEDGE_WINS.labels(source, "primary" if url == urls[0] else "mirror").inc()
+                        return task.result()
+                    error = task.exception()
+                    logger.warning(f"{url}: {type(error).__name__}: {error}")
+                # Тайм-аут хеджування або помилка — підключаємо наступне дзеркало
+                if queue:
+                    launch()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _backoff(self, attempt: int) -> float:
+        """Повна випадкова пауза (full jitter), щоб репліки не повторювали запити синхронно."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _retry_after(error: Exception) -> float | None:
+        """Пауза з Retry-After (секунди або HTTP-дата); None, якщо заголовка немає або він некоректний."""
+        if not isinstance(error, httpx.HTTPStatusError):
+            return None
+        value = error.response.headers.get("Retry-After", "").strip()
+        if value.isdigit():
+            return float(value)
+        at = http_date(value)
+        return None if at is None else max(0.0, at - time.time())
+
+    async def _get_with_retries(
+        self,
+        url: str,
+        source: str,
+        make_until: Callable[[], Callable[[bytes], int | None]] | None,
+        conditional: bool,
+        max_bytes: int,
+        pool: str | None,
+        remember: bool,
+    ) -> FetchResult:
+        host = self._host(url, pool)
+        started = time.monotonic()
+        for attempt in range(self.retries + 1):
+            host.breaker.before_request()
+            try:
+                async with host.slots:
+                    result = await self._get(
+                        url, source, make_until() if make_until else None, conditional, max_bytes, remember,
+                    )
+            except asyncio.CancelledError:
+                host.breaker.release()
+                raise
+            except Exception as e:
+                if not _is_retryable(e):
+                    # Хост відповів (наприклад, 404) — він живий, це не привід розмикати запобіжник
+                    if isinstance(e, httpx.HTTPStatusError):
+                        host.breaker.record_success()
+                    else:
+                        host.breaker.release()
+                    raise
+                host.breaker.record_failure()
+                retry_after = self._retry_after(e)
+                if retry_after is not None:
+                    # Хост сам сказав, коли повертатися: до того не йде жоден запит, зокрема інших корутин
+                    host.breaker.hold(min(retry_after, self.retry_after_max))
+                    delay = retry_after
+                else:
+                    delay = self._backoff(attempt)
+                if (
+                    attempt == self.retries
+                    or host.breaker.state == OPEN
+                    or time.monotonic() - started + delay > self.retry_deadline
+                ):
+                    raise
+                UPSTREAM_RETRIES.labels(source).inc()
+                logger.warning(f"{url}: {type(e).__name__}: {e}; повтор через {delay:.1f} с")
+                await asyncio.sleep(delay)
+            else:
+                host.breaker.record_success()
+                return result
+
+    async def _get(
+        self,
+        url: str,
+        source: str,
+        until: Callable[[bytes], int | None] | None,
+        conditional: bool,
+        max_bytes: int,
+        remember: bool,
+    ) -> FetchResult:
+        if self._client is None:
+            await self.start()
+
+        headers = {}
+        cached = self._validators.get(url) if conditional else None
+        if cached:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        log_suffix = " (conditional)" if headers else ""
+        logger.info(f"HTTP Request: GET {url}{log_suffix}")
+        async with self._client.stream("GET", url, headers=headers) as r:
+            if r.status_code == 304 and cached:
+                return FetchResult(
+                    url=url, content=cached.content, encoding=cached.encoding, not_modified=True,
+                    etag=cached.etag, last_modified=cached.last_modified, truncated=cached.truncated,
+                )
+
+            r.raise_for_status()
+            content, truncated = await self._read_body(r, until, max_bytes)
+            UPSTREAM_BYTES.labels(source).inc(r.num_bytes_downloaded)
+            if truncated:
+                UPSTREAM_TRUNCATED.labels(source, truncated).inc()
+                if truncated == "max_bytes":
+                    logger.warning(f"{url}: відповідь більша за {max_bytes} байт, читаємо лише початок.")
+            encoding = r.encoding
+
+        etag = r.headers.get("ETag")
+        last_modified = r.headers.get("Last-Modified")
+        if remember and (etag or last_modified):
+            self._validators[url] = _Validators(etag, last_modified, content, encoding, truncated)
+        else:
+            self._validators.pop(url, None)
+        return FetchResult(
+            url=url, content=content, encoding=encoding, etag=etag, last_modified=last_modified, truncated=truncated,
+        )
+
+    async def _read_body(
+        self, r: httpx.Response, until: Callable[[bytes], int | None] | None, max_bytes: int
+    ) -> tuple[bytes, str | None]:
+        """Читає тіло шматками; вихід із `stream()` до кінця тіла закриває відповідь, і решта не завантажується."""
+        chunks: list[bytes] = []
+        size = 0
+        async for chunk in r.aiter_bytes():
+            if size + len(chunk) > max_bytes:
+                chunks.append(chunk[:max_bytes - size])
+                return b"".join(chunks), "max_bytes"
+            chunks.append(chunk)
+            size += len(chunk)
+            if until is not None:
+                keep = until(chunk)
+                if keep is not None:
+                    return b"".join(chunks)[:keep], "early_stop"
+        return b"".join(chunks), None
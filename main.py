@@ -0,0 +1,12 @@
+"""
+Точка входу сервера: `python main.py` (див. Dockerfile).
+
+Воркери пулу парсингу (forkserver, parse_executor) імпортують головний модуль як __mp_main__.
+Тому головний модуль — цей порожній файл, а не bot.py: інакше кожен воркер імпортував би aiogram
+і створював власні Bot і Dispatcher, а старт пулу тривав би секунди замість десятих часток.
+"""
+
+if __name__ == "__main__":
+    from bot import main
+
+    main()
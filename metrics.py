@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+from typing import Callable
+
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Кошики під наші масштаби: від мілісекунд (кеш, Telegram) до десятків секунд (повільне джерело)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+
+# ================== МЕТРИКИ ==================
+UPSTREAM_FETCH_SECONDS = Histogram(
+    "combo_upstream_fetch_seconds", "Час завантаження сторінки джерела",
+    ["source", "outcome"], buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_BYTES = Counter("combo_upstream_bytes_total", "Байти, прочитані з джерел", ["source"])
+UPSTREAM_TRUNCATED = Counter(
+    "combo_upstream_truncated_total", "Відповіді, дочитані не до кінця", ["source", "reason"],
+)
+UPSTREAM_INFLIGHT = Gauge("combo_upstream_inflight", "Запити до джерел, що виконуються зараз")
+UPSTREAM_RETRIES = Counter("combo_upstream_retries_total", "Повтори запитів до джерел після помилки", ["source"])
+UPSTREAM_HEDGE_WINS = Counter(
+    "combo_upstream_hedge_wins_total", "Яка адреса першою відповіла на хеджований запит", ["source", "winner"],
+)
+UPSTREAM_CIRCUIT_STATE = Gauge(
+    "combo_upstream_circuit_state", "Стан запобіжника хоста: 0 — замкнений, 1 — пробний запит, 2 — розімкнений",
+    ["host"],
+)
+PARSE_SECONDS = Histogram(
+    "combo_parse_seconds", "Час парсингу сторінки (включно з очікуванням у пулі)",
+    ["parser", "backend"], buckets=LATENCY_BUCKETS,
+)
+TELEGRAM_API_SECONDS = Histogram(
+    "combo_telegram_api_seconds", "Латентність викликів Telegram Bot API",
+    ["method", "outcome"], buckets=LATENCY_BUCKETS,
+)
+COMBO_REQUEST_SECONDS = Histogram(
+    "combo_request_seconds", "Повний час обробки натискання кнопки гри",
+    ["game", "outcome"], buckets=LATENCY_BUCKETS,
+)
+COMBO_VERSIONS = Counter("combo_versions_total", "Нові версії комбо (змінився відбиток)", ["game", "status"])
+DETECTION_LATENCY = Histogram(
+    "combo_detection_latency_seconds", "Від зміни сторінки (Last-Modified) до появи нової версії в боті",
+    ["game"], buckets=(30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400),
+)
+COMBO_REQUESTS = Counter("combo_requests_total", "Оброблені запити комбо", ["game", "outcome"])
+INLINE_QUERIES = Counter("combo_inline_queries_total", "Inline-запити (відповідь з кешу)", ["outcome"])
+UPDATES_DROPPED = Counter("combo_updates_dropped_total", "Відкинуті натискання кнопок", ["reason"])
+UPDATES_INFLIGHT = Gauge("combo_updates_inflight", "Хендлери callback, що виконуються зараз")
+REFRESH_POLLS = Counter("combo_refresh_polls_total", "Планові опитування джерел за режимом планувальника", ["game", "mode"])
+REFRESH_LEADER = Gauge("combo_refresh_leader", "1, якщо ця репліка зараз оновлює джерела (тримає оренду)")
+STARTUP_SECONDS = Gauge("combo_startup_seconds", "Від старту процесу до кроку запуску репліки", ["step"])
+EVENT_LOOP_LAG_SECONDS = Gauge("combo_event_loop_lag_seconds", "Остання виміряна затримка event loop")
+EVENT_LOOP_LAG = Histogram(
+    "combo_event_loop_lag_seconds_hist", "Розподіл затримки event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+class CacheCollector:
+    """Експортує лічильники кешів (hits/misses/...) з їхніх stats() у момент скрейпу."""
+
+    def __init__(self):
+        self._caches: dict[str, Callable[[], dict]] = {}
+
+    def register(self, name: str, stats: Callable[[], dict]) -> None:
+        self._caches[name] = stats
+
+    def collect(self):
+        requests = CounterMetricFamily("combo_cache_requests", "Звернення до кешів за результатом", labels=["cache", "result"])
+        ratio = GaugeMetricFamily("combo_cache_hit_ratio", "Частка влучань у кеш", labels=["cache"])
+        size = GaugeMetricFamily("combo_cache_entries", "Кількість записів у кеші", labels=["cache"])
+        for name, stats in self._caches.items():
+            data = stats()
+            for result in ("hits", "stale", "misses", "fallbacks"):
+                if result in data:
+                    requests.add_metric([name, result], data[result])
+            ratio.add_metric([name], data.get("hit_ratio", 0.0))
+            size.add_metric([name], data.get("size", 0))
+        yield requests
+        yield ratio
+        yield size
+
+
+cache_collector = CacheCollector()
+REGISTRY.register(cache_collector)
+
+
+# ================== ІНСТРУМЕНТИ ==================
+class TelegramMetricsMiddleware:
+    """
+    Middleware сесії aiogram: вимірює кожен виклик Bot API. Без базового класу aiogram —
+    metrics імпортують і воркери пулу парсингу (через hamster_scraper), яким aiogram не потрібен.
+    """
+
+    async def __call__(self, make_request, bot, method):
+        outcome = "error"
+        started = time.perf_counter()
+        try:
+            response = await make_request(bot, method)
+            outcome = "ok"
+            return response
+        finally:
+            TELEGRAM_API_SECONDS.labels(type(method).__name__, outcome).observe(time.perf_counter() - started)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """Фонова задача: наскільки пізніше запланованого прокидається sleep — це і є лаг event loop."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - started - interval)
+        EVENT_LOOP_LAG_SECONDS.set(lag)
+        EVENT_LOOP_LAG.observe(lag)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(body=generate_latest(REGISTRY), headers={"Content-Type": CONTENT_TYPE_LATEST})
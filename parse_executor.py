@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# PARSE_EXECUTOR: "process" (за замовчуванням, масштабується на всі ядра) або "thread"
+PARSE_EXECUTOR = os.getenv("PARSE_EXECUTOR", "process")
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", min(4, os.cpu_count() or 1)))
+# Скільки задач парсингу може одночасно бути в пулі (у роботі + в черзі); решта чекає — це і є backpressure
+PARSE_MAX_PENDING = int(os.getenv("PARSE_MAX_PENDING", PARSE_WORKERS * 4))
+
+
+class ParseExecutor:
+    """
+    Виконує CPU-важкий парсинг поза event loop.
+
+    - kind="process": ProcessPoolExecutor (forkserver), обходить GIL;
+    - kind="thread": ThreadPoolExecutor, дешевший старт, але лише звільняє loop.
+
+    Кількість задач у пулі обмежена `max_pending`: коли черга заповнена,
+    `run()` чекає на вільне місце замість того, щоб накопичувати задачі без меж.
+    Функції та аргументи для process-пулу мають бути picklable (функції рівня модуля).
+    Воркери forkserver імпортують головний модуль як __mp_main__, тому він має бути легким
+    (main.py, а не bot.py) і запускати сервер лише під `if __name__ == "__main__"`.
+    """
+
+    def __init__(self, kind: str = "process", max_workers: int = 2, max_pending: int = 8):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Невідомий тип executor: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pool: Executor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._warming: asyncio.Task | None = None
+        self.pending = 0
+
+    def _ensure_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                # forkserver: не форкаємо процес з робочим event loop та потоками
+                ctx = multiprocessing.get_context("forkserver")
+                ctx.set_forkserver_preload(["bs4", "combo_parsers", "hamster_scraper"])
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="parse")
+            logger.info(f"Парсинг виконується в {self.kind}-пулі на {self.max_workers} воркерів (черга ≤ {self.max_pending}).")
+        return self._pool
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        if self._warming is not None and not self._warming.done():
+            # Поки воркери стартують, submit() блокував би event loop — чекаємо на прогрів
+            await asyncio.wait({self._warming})
+        async with self._slots:
+            self.pending += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._ensure_pool(), func, *args)
+            finally:
+                self.pending -= 1
+
+    async def warm(self, func: Callable[[], Any]) -> None:
+        """
+        Запускає пул наперед: `func` (наприклад, імпорт парсерів) виконується на кожному воркері,
+        тож перший справжній парсинг не платить за старт forkserver і воркерів. Сам старт
+        (ProcessPoolExecutor.submit чекає, доки forkserver імпортує модулі) іде в окремому потоці,
+        щоб event loop тим часом обслуговував запити.
+        """
+        if self._warming is None:
+            self._warming = asyncio.ensure_future(self._warm(func))
+        await asyncio.shield(self._warming)
+
+    async def _warm(self, func: Callable[[], Any]) -> None:
+        pool = self._ensure_pool()
+        futures = await asyncio.to_thread(lambda: [pool.submit(func) for _ in range(self.max_workers)])
+        await asyncio.gather(*map(asyncio.wrap_future, futures))
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self._slots = None
+        self._warming = None
+
+
+parse_executor = ParseExecutor(kind=PARSE_EXECUTOR, max_workers=PARSE_WORKERS, max_pending=PARSE_MAX_PENDING)
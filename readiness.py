@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Sequence
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from aiohttp import web
+
+from metrics import STARTUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Запасний варіант, якщо /proc недоступний: час імпорту модуля (раніше за важкі імпорти bot.py)
+_IMPORTED_AT = time.time()
+
+
+def process_started_at() -> float:
+    """Unix-час старту процесу з /proc (разом з інтерпретатором та імпортами); поза Linux — час імпорту модуля."""
+    try:
+        with open("/proc/self/stat") as f:
+            # comm може містити пробіли, тому рахуємо поля після останньої ")"; starttime — 22-ге поле
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot = next(int(line.split()[1]) for line in f if line.startswith("btime "))
+        return boot + ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return _IMPORTED_AT
+
+
+class Readiness:
+    """
+    Стан запуску репліки для /healthz і /readyz.
+
+    Кроки запуску позначаються mark(крок) у міру виконання; репліка готова, коли завершено всі
+    `required`. Для кожного кроку запам'ятовується, скільки секунд минуло від старту процесу,
+    а first_good_response() фіксує головне число — час до першої успішної відповіді користувачу.
+    """
+
+    def __init__(self, required: Sequence[str], started_at: float | None = None):
+        self.required = tuple(required)
+        self.started_at = started_at if started_at is not None else process_started_at()
+        self.steps: dict[str, float] = {}
+        self.errors: dict[str, str] = {}
+        self.first_response: float | None = None
+        self._events: dict[str, asyncio.Event] = {}
+
+    def _event(self, step: str) -> asyncio.Event:
+        if step not in self._events:
+            self._events[step] = asyncio.Event()
+        return self._events[step]
+
+    @property
+    def ready(self) -> bool:
+        return all(step in self.steps for step in self.required)
+
+    def _elapsed(self, step: str) -> float:
+        elapsed = time.time() - self.started_at
+        STARTUP_SECONDS.labels(step).set(elapsed)
+        return elapsed
+
+    def mark(self, step: str) -> None:
+        if step in self.steps:
+            return
+        was_ready = self.ready
+        self.steps[step] = self._elapsed(step)
+        self.errors.pop(step, None)
+        self._event(step).set()
+        logger.info(f"Запуск: {step} за {self.steps[step]:.2f} с від старту процесу")
+        if self.ready and not was_ready:
+            self.steps["ready"] = self._elapsed("ready")
+            logger.info(f"✅ Репліка готова за {self.steps['ready']:.2f} с від старту процесу")
+
+    def fail(self, step: str, error: BaseException) -> None:
+        """Крок не вдався (буде повторено): причина видна в /readyz."""
+        self.errors[step] = f"{type(error).__name__}: {error}"
+
+    async def wait(self, step: str, timeout: float | None = None) -> bool:
+        """Чекає на крок не довше `timeout` секунд; False — не дочекалися."""
+        try:
+            await asyncio.wait_for(self._event(step).wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def first_good_response(self) -> None:
+        if self.first_response is None:
+            self.first_response = self._elapsed("first_response")
+            logger.info(f"Перша успішна відповідь користувачу через {self.first_response:.2f} с від старту процесу")
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.ready,
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "steps": {step: round(elapsed, 3) for step, elapsed in self.steps.items()},
+            "pending": [step for step in self.required if step not in self.steps],
+            "errors": self.errors,
+            "first_response_seconds": round(self.first_response, 3) if self.first_response is not None else None,
+        }
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        """Liveness: процес живий і event loop відповідає (навіть під час прогріву)."""
+        return web.json_response({"status": "ok", **self.snapshot()})
+
+    async def readyz(self, request: web.Request) -> web.Response:
+        """Readiness: 200 лише після прогріву, до того — 503 зі списком незавершених кроків."""
+        return web.json_response(self.snapshot(), status=200 if self.ready else 503)
+
+
+class ReadinessMiddleware(BaseMiddleware):
+    """
+    Outer-middleware для апдейтів, що прийшли раніше, ніж кеш прогріто: хендлер чекає на крок
+    `step` (не довше `timeout` секунд) замість холодного завантаження з джерел. Апдейт не відкидається.
+    """
+
+    def __init__(self, readiness: Readiness, step: str, timeout: float = 10.0):
+        self.readiness = readiness
+        self.step = step
+        self.timeout = timeout
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if self.step not in self.readiness.steps and not await self.readiness.wait(self.step, self.timeout):
+            logger.warning(f"Крок запуску {self.step} не завершився за {self.timeout:.0f} с — обробляємо апдейт без нього.")
+        return await handler(event, data)
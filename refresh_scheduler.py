@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Iterable, Sequence
+
+from metrics import REFRESH_POLLS
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 3600
+
+
+def seconds_of_day(ts: float) -> float:
+    """Секунди від локальної півночі (та сама локальна дата, що й у ComboStore)."""
+    dt = datetime.fromtimestamp(ts)
+    return dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1e6
+
+
+def local_midnight(ts: float) -> float:
+    return datetime.fromtimestamp(ts).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+@dataclass(frozen=True)
+class PublishWindow:
+    """Звичний час публікації: секунди від півночі; end > DAY означає вікно через північ."""
+    start: float
+    end: float
+
+    def __str__(self) -> str:
+        def hhmm(s: float) -> str:
+            s = int(s) % DAY
+            return f"{s // 3600:02d}:{s % 3600 // 60:02d}"
+        return f"{hhmm(self.start)}–{hhmm(self.end)}"
+
+
+def learn_window(publish_times: Iterable[float], min_days: int = 3, margin: float = 900, coverage: float = 0.8) -> PublishWindow | None:
+    """
+    Вікно публікації з історії: найкоротший проміжок доби (зокрема через північ), у який потрапляє
+    частка `coverage` публікацій, розширений на `margin`. Поодинокі публікації в незвичний час
+    вікно не розтягують. None — історії замало або публікації розкидані по всій добі (шаблону немає).
+    """
+    times = sorted(seconds_of_day(t) for t in publish_times)
+    if len(times) < min_days:
+        return None
+    # Доба — коло: 23:55 і 00:05 — одне вікно через північ, тож шукаємо і по «другому колу»
+    covered = math.ceil(coverage * len(times))
+    circle = times + [t + DAY for t in times]
+    lo, hi = min(
+        ((circle[i], circle[i + covered - 1]) for i in range(len(times))),
+        key=lambda bounds: bounds[1] - bounds[0],
+    )
+    if hi - lo > DAY / 2:
+        return None
+    return PublishWindow(lo - margin, hi + margin)
+
+
+@dataclass(frozen=True)
+class PollIntervals:
+    """Інтервали опитування (секунди) для кожного режиму планувальника."""
+    window: tuple[float, float] = (30, 60)  # усередині вікна публікації, поки комбо ще немає
+    idle: float = 30 * 60                   # до вікна: рідко, але не пропустити ранню публікацію
+    late: float = 5 * 60                    # вікно минуло, а нового комбо немає
+    confirmed: float = 3 * 3600             # сьогоднішнє комбо вже є — лише перевірка виправлень
+    fixed: float = 5 * 60                   # шаблон ще не вивчено
+
+
+def plan_poll(
+    now: float, window: PublishWindow | None, last_publish: float | None, intervals: PollIntervals
+) -> tuple[float, str]:
+    """
+    Через скільки секунд опитати джерело знову і в якому режимі: window | idle | late | confirmed | fixed.
+    Доба ділиться на цикли навколо вікон: публікація належить циклу, якщо вона пізніша
+    за середину проміжку між попереднім вікном і поточним.
+    """
+    if window is None:
+        return intervals.fixed, "fixed"
+
+    length = window.end - window.start
+    gap = DAY - length
+    midnight = local_midnight(now)
+    # Найближче вікно, яке ще не закінчилося (поточне або наступне)
+    for days in (-1, 0, 1, 2):
+        start = midnight + days * DAY + window.start
+        end = start + length
+        if now < end:
+            break
+    cycle_start = start - gap / 2
+
+    if now < cycle_start:
+        # Ще хвіст попереднього циклу: його комбо вже є — лише перевірки до наступного вікна,
+        # а якщо так і не з'явилося — запізнення
+        if last_publish is not None and last_publish >= cycle_start - DAY:
+            return min(intervals.confirmed, start - now), "confirmed"
+        return intervals.late, "late"
+    if last_publish is not None and last_publish >= cycle_start:
+        return intervals.confirmed, "confirmed"
+    if now >= start:
+        return random.uniform(*intervals.window), "window"
+    return min(intervals.idle, start - now), "idle"
+
+
+class AdaptiveScheduler:
+    """
+    Фоновий оновлювач, що підлаштовується під звичний час публікації кожної гри.
+
+    Для кожної гри окрема задача: після опитування (`refresh`) з історії (`publish_times` —
+    unix-час появи нового комбо по днях) вивчається вікно публікації, і plan_poll вирішує,
+    коли опитати знову. Ігри стартують зі зсувом `stagger` секунд, а інтервали мають
+    випадковий розкид, тож запити до спільного хоста не збираються в пачки.
+    `on_planned(game, delay)` дізнається про наступне опитування (наприклад, щоб не вважати
+    кеш застарілим раніше).
+    """
+
+    def __init__(
+        self,
+        games: Sequence[str],
+        refresh: Callable[[str], Awaitable[object]],
+        publish_times: Callable[[str, int], Awaitable[list[float]]],
+        on_planned: Callable[[str, float], Awaitable[None]] | None = None,
+        intervals: PollIntervals = PollIntervals(),
+        history_days: int = 14,
+        min_days: int = 3,
+        margin: float = 15 * 60,
+        stagger: float = 2.0,
+        jitter: float = 0.1,
+    ):
+        self.games = list(games)
+        self.refresh = refresh
+        self.publish_times = publish_times
+        self.on_planned = on_planned
+        self.intervals = intervals
+        self.history_days = history_days
+        self.min_days = min_days
+        self.margin = margin
+        self.stagger = stagger
+        self.jitter = jitter
+        self.windows: dict[str, PublishWindow | None] = {}
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self._run_game(game, i * self.stagger) for i, game in enumerate(self.games)))
+
+    async def plan(self, game: str) -> tuple[float, str]:
+        try:
+            times = await self.publish_times(game, self.history_days)
+        except Exception as e:
+            logger.warning(f"Історія публікацій {game} недоступна: {e}")
+            times = []
+        window = learn_window(times, self.min_days, self.margin)
+        if window != self.windows.get(game):
+            logger.info(f"{game}: вікно публікації {window or 'ще не відоме'} (днів в історії: {len(times)})")
+        self.windows[game] = window
+        delay, mode = plan_poll(time.time(), window, max(times, default=None), self.intervals)
+        if mode != "window":
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return delay, mode
+
+    async def _run_game(self, game: str, initial_delay: float) -> None:
+        await asyncio.sleep(initial_delay)
+        mode = "initial"
+        while True:
+            REFRESH_POLLS.labels(game, mode).inc()
+            try:
+                await self.refresh(game)
+            except Exception as e:
+                logger.warning(f"Планове оновлення {game} не вдалося: {type(e).__name__}: {e}")
+            delay, mode = await self.plan(game)
+            logger.info(f"{game}: наступне опитування через {delay:.0f} с ({mode})")
+            if self.on_planned is not None:
+                try:
+                    await self.on_planned(game, delay)
+                except Exception as e:
+                    logger.warning(f"on_planned для {game} не вдався: {e}")
+            await asyncio.sleep(delay)
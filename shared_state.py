@@ -0,0 +1,406 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from combo_store import SUBSCRIPTIONS_SCHEMA, SubscriptionQueue
+from metrics import REFRESH_LEADER
+
+logger = logging.getLogger(__name__)
+
+
+# ================== БЕКЕНДИ ==================
+class MemoryState:
+    """
+    Стан лише в пам'яті процесу — поведінка для однієї репліки (за замовчуванням).
+    Інтерфейс спільний для всіх бекендів:
+
+    - комбо: get_combo / put_combo — JSON-сумісний словник останнього результату гри;
+    - file_id картинок: get_file_id / set_file_id (None видаляє);
+    - оренда (lease): acquire_lease захоплює або продовжує її для `owner` на `ttl` секунд,
+      release_lease звільняє, якщо вона ще належить `owner`.
+
+    Спільні бекенди (Redis, SQLite) також тримають підписки й чергу розсилки — той самий
+    інтерфейс, що й SubscriptionQueue у ComboStore. У пам'яті їх немає: для однієї репліки
+    вони лишаються в ComboStore на томі й переживають рестарт.
+    """
+
+    def __init__(self):
+        self._combos: Dict[str, dict] = {}
+        self._file_ids: Dict[str, str] = {}
+        self._leases: Dict[str, tuple[str, float]] = {}
+
+    async def get_combo(self, game: str) -> Optional[dict]:
+        return self._combos.get(game)
+
+    async def put_combo(self, game: str, payload: dict) -> None:
+        self._combos[game] = payload
+
+    async def get_file_id(self, image_url: str) -> Optional[str]:
+        return self._file_ids.get(image_url)
+
+    async def set_file_id(self, image_url: str, file_id: Optional[str]) -> None:
+        if file_id is None:
+            self._file_ids.pop(image_url, None)
+        else:
+            self._file_ids[image_url] = file_id
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        holder, expires_at = self._leases.get(name, (None, 0.0))
+        if holder not in (None, owner) and expires_at > time.monotonic():
+            return False
+        self._leases[name] = (owner, time.monotonic() + ttl)
+        return True
+
+    async def release_lease(self, name: str, owner: str) -> None:
+        if self._leases.get(name, (None, 0.0))[0] == owner:
+            del self._leases[name]
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisState:
+    """
+    Спільний стан у Redis для кількох реплік. Приймає готовий асинхронний клієнт
+    (redis.asyncio.Redis або fakeredis.aioredis.FakeRedis для локальних перевірок).
+    Оренда — ключ із PX-таймаутом; продовження та звільнення йдуть через WATCH/MULTI,
+    тож чужу оренду репліка не перезапише навіть після власної паузи.
+    Підписки — множини ігор чату і чатів гри; черга розсилки — sorted set задач "chat_id:game"
+    з часом not_before як score (одна незавершена розсилка на чат і гру) і хеш спроб.
+    """
+
+    def __init__(self, client, prefix: str = "combo-bot"):
+        self._redis = client
+        self._prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "combo-bot") -> "RedisState":
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("SHARED_STATE_URL вказує на Redis, але пакет redis не встановлено") from e
+        return cls(redis.from_url(url, decode_responses=True), prefix)
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self._prefix, *parts))
+
+    async def get_combo(self, game: str) -> Optional[dict]:
+        raw = await self._redis.get(self._key("combo", game))
+        return json.loads(raw) if raw else None
+
+    async def put_combo(self, game: str, payload: dict) -> None:
+        await self._redis.set(self._key("combo", game), json.dumps(payload, ensure_ascii=False))
+
+    async def get_file_id(self, image_url: str) -> Optional[str]:
+        return await self._redis.hget(self._key("file_ids"), image_url)
+
+    async def set_file_id(self, image_url: str, file_id: Optional[str]) -> None:
+        if file_id is None:
+            await self._redis.hdel(self._key("file_ids"), image_url)
+        else:
+            await self._redis.hset(self._key("file_ids"), image_url, file_id)
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        from redis.exceptions import WatchError
+
+        key = self._key("lease", name)
+        if await self._redis.set(key, owner, nx=True, px=int(ttl * 1000)):
+            return True
+        async with self._redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                if await pipe.get(key) != owner:
+                    return False
+                pipe.multi()
+                pipe.pexpire(key, int(ttl * 1000))
+                await pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    async def release_lease(self, name: str, owner: str) -> None:
+        from redis.exceptions import WatchError
+
+        key = self._key("lease", name)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                if await pipe.get(key) == owner:
+                    pipe.multi()
+                    pipe.delete(key)
+                    await pipe.execute()
+            except WatchError:
+                pass
+
+    # ---------- підписки та черга розсилки ----------
+
+    async def subscribe(self, chat_id: int, game: str) -> bool:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.sadd(self._key("subs", str(chat_id)), game)
+            pipe.sadd(self._key("subscribers", game), chat_id)
+            added, _ = await pipe.execute()
+        return added > 0
+
+    async def unsubscribe(self, chat_id: int, game: str | None = None) -> int:
+        """Відписує чат від гри (або від усіх ігор, якщо game=None) і прибирає його незавершені розсилки."""
+        games = [game] if game is not None else list(await self._redis.smembers(self._key("subs", str(chat_id))))
+        if not games:
+            return 0
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.srem(self._key("subs", str(chat_id)), *games)
+            for g in games:
+                pipe.srem(self._key("subscribers", g), chat_id)
+            jobs = [f"{chat_id}:{g}" for g in games]
+            pipe.zrem(self._key("broadcast", "due"), *jobs)
+            pipe.hdel(self._key("broadcast", "attempts"), *jobs)
+            removed, *_ = await pipe.execute()
+        return removed
+
+    async def subscriptions(self, chat_id: int) -> list[str]:
+        return sorted(await self._redis.smembers(self._key("subs", str(chat_id))))
+
+    async def enqueue_broadcast(self, game: str) -> int:
+        """Ставить гру в чергу для всіх її підписників. Повертає кількість нових задач."""
+        chats = await self._redis.smembers(self._key("subscribers", game))
+        if not chats:
+            return 0
+        now = time.time()
+        return await self._redis.zadd(self._key("broadcast", "due"), {f"{chat}:{game}": now for chat in chats}, nx=True)
+
+    async def due_broadcasts(self, limit: int) -> list[tuple[str, int, str, int]]:
+        """Задачі, які вже можна надсилати: (id, chat_id, game, attempts)."""
+        jobs = await self._redis.zrangebyscore(self._key("broadcast", "due"), "-inf", time.time(), start=0, num=limit)
+        if not jobs:
+            return []
+        attempts = await self._redis.hmget(self._key("broadcast", "attempts"), jobs)
+        due = []
+        for job, tries in zip(jobs, attempts):
+            chat_id, game = job.split(":", 1)
+            due.append((job, int(chat_id), game, int(tries or 0)))
+        return due
+
+    async def complete_broadcast(self, job_id: str) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self._key("broadcast", "due"), job_id)
+            pipe.hdel(self._key("broadcast", "attempts"), job_id)
+            await pipe.execute()
+
+    async def retry_broadcast(self, job_id: str, delay: float, attempts: int) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            # xx: задачу, яку тим часом прибрав /unsubscribe, не повертаємо в чергу
+            pipe.zadd(self._key("broadcast", "due"), {job_id: time.time() + delay}, xx=True)
+            pipe.hset(self._key("broadcast", "attempts"), job_id, attempts)
+            await pipe.execute()
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shared_combos (game TEXT PRIMARY KEY, payload TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS shared_file_ids (image_url TEXT PRIMARY KEY, file_id TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);
+"""
+
+
+class SqliteState(SubscriptionQueue):
+    """
+    Спільний стан в одному SQLite-файлі — заміна Redis для кількох процесів на одній машині
+    (локальні перевірки, docker-compose зі спільним томом). Запити виконуються в потоці.
+    Підписки й черга розсилки — ті самі таблиці й запити, що в ComboStore (SubscriptionQueue).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SQLITE_SCHEMA + SUBSCRIPTIONS_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _run(self, func: Callable[[sqlite3.Connection], object]):
+        with self._lock:
+            return func(self._connect())
+
+    def _write(self, query: str, params: tuple = ()) -> int:
+        return self._run(lambda c: c.execute(query, params).rowcount)
+
+    def _read(self, query: str, params: tuple = ()) -> list[tuple]:
+        return self._run(lambda c: c.execute(query, params).fetchall())
+
+    async def get_combo(self, game: str) -> Optional[dict]:
+        row = await asyncio.to_thread(self._run, lambda c: c.execute(
+            "SELECT payload FROM shared_combos WHERE game = ?", (game,)).fetchone())
+        return json.loads(row[0]) if row else None
+
+    async def put_combo(self, game: str, payload: dict) -> None:
+        data = json.dumps(payload, ensure_ascii=False)
+        await asyncio.to_thread(self._run, lambda c: c.execute(
+            "INSERT OR REPLACE INTO shared_combos (game, payload) VALUES (?, ?)", (game, data)))
+
+    async def get_file_id(self, image_url: str) -> Optional[str]:
+        row = await asyncio.to_thread(self._run, lambda c: c.execute(
+            "SELECT file_id FROM shared_file_ids WHERE image_url = ?", (image_url,)).fetchone())
+        return row[0] if row else None
+
+    async def set_file_id(self, image_url: str, file_id: Optional[str]) -> None:
+        if file_id is None:
+            await asyncio.to_thread(self._run, lambda c: c.execute(
+                "DELETE FROM shared_file_ids WHERE image_url = ?", (image_url,)))
+        else:
+            await asyncio.to_thread(self._run, lambda c: c.execute(
+                "INSERT OR REPLACE INTO shared_file_ids (image_url, file_id) VALUES (?, ?)", (image_url, file_id)))
+
+    def _acquire_sync(self, conn: sqlite3.Connection, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        # BEGIN IMMEDIATE бере блокування запису одразу: перевірка й захоплення атомарні між процесами
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row and row[0] != owner and row[1] > now:
+                conn.execute("COMMIT")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                (name, owner, now + ttl),
+            )
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        return await asyncio.to_thread(self._run, lambda c: self._acquire_sync(c, name, owner, ttl))
+
+    async def release_lease(self, name: str, owner: str) -> None:
+        await asyncio.to_thread(self._run, lambda c: c.execute(
+            "DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner)))
+
+    async def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_fake_redis_server = None
+
+
+def create_shared_state(url: str):
+    """
+    Бекенд за SHARED_STATE_URL:
+    "" або "memory://" — лише пам'ять (одна репліка); "redis://..." / "rediss://..." — Redis;
+    "fakeredis://" — fakeredis у процесі (перевірки без сервера; усі такі стани процесу бачать ті самі
+    дані, як репліки одного Redis); "sqlite:///абсолютний/шлях" — SQLite-файл.
+    """
+    if not url or url.startswith("memory://"):
+        return MemoryState()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisState.from_url(url)
+    if url.startswith("fakeredis://"):
+        global _fake_redis_server
+        try:
+            from fakeredis import FakeAsyncRedis, FakeServer
+        except ImportError as e:
+            raise RuntimeError("SHARED_STATE_URL=fakeredis://, але пакет fakeredis не встановлено") from e
+        if _fake_redis_server is None:
+            _fake_redis_server = FakeServer()
+        return RedisState(FakeAsyncRedis(server=_fake_redis_server, decode_responses=True))
+    if url.startswith("sqlite://"):
+        return SqliteState(url[len("sqlite://"):])
+    raise RuntimeError(f"Невідомий SHARED_STATE_URL: {url}")
+
+
+def default_replica_id() -> str:
+    """Ідентифікатор репліки для оренди: Railway задає RAILWAY_REPLICA_ID, інакше — хост і PID."""
+    return os.getenv("RAILWAY_REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+# ================== ЛІДЕР ==================
+class LeaderLease:
+    """
+    Вибір лідера через оренду в спільному стані: лише власник оренди `name` виконує
+    `leader_job` (скрапінг джерел), решта реплік раз на `follower_interval` секунд
+    виконують `follower_job` (читають результати лідера). Оренда продовжується кожні ttl/3;
+    якщо лідер зник, інша репліка перехоплює її не пізніше ніж за `ttl`. Обидві роботи
+    йдуть окремими задачами: повільний follower_job (наприклад, власне завантаження джерела)
+    не затримує ні продовження, ні перехоплення оренди.
+    """
+
+    def __init__(self, state, name: str, owner: str, ttl: float = 60):
+        self.state = state
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.is_leader = False
+
+    async def run(
+        self,
+        leader_job: Callable[[], Awaitable[None]],
+        follower_job: Callable[[], Awaitable[None]],
+        follower_interval: float,
+    ) -> None:
+        leader_task: asyncio.Task | None = None
+        follower_task: asyncio.Task | None = None
+        next_follow = 0.0
+
+        async def follow() -> None:
+            try:
+                await follower_job()
+            except Exception as e:
+                logger.error(f"Помилка синхронізації з лідером: {type(e).__name__}: {e}")
+
+        try:
+            while True:
+                try:
+                    acquired = await self.state.acquire_lease(self.name, self.owner, self.ttl)
+                except Exception as e:
+                    # Спільний стан недоступний — не ризикуємо двома лідерами, працюємо як ведений
+                    logger.warning(f"Не вдалося продовжити оренду {self.name}: {type(e).__name__}: {e}")
+                    acquired = False
+
+                if acquired and (leader_task is None or leader_task.done()):
+                    logger.info(f"Репліка {self.owner} стала лідером ({self.name}).")
+                    if follower_task is not None:
+                        follower_task.cancel()
+                        follower_task = None
+                    leader_task = asyncio.create_task(leader_job())
+                elif not acquired and leader_task is not None:
+                    logger.warning(f"Репліка {self.owner} втратила лідерство ({self.name}).")
+                    leader_task.cancel()
+                    leader_task = None
+                self.is_leader = acquired
+                REFRESH_LEADER.set(1 if acquired else 0)
+
+                if (
+                    not acquired and time.monotonic() >= next_follow
+                    and (follower_task is None or follower_task.done())
+                ):
+                    next_follow = time.monotonic() + follower_interval
+                    follower_task = asyncio.create_task(follow())
+
+                await asyncio.sleep(self.ttl / 3)
+        finally:
+            self.is_leader = False
+            REFRESH_LEADER.set(0)
+            if follower_task is not None:
+                follower_task.cancel()
+            if leader_task is not None:
+                leader_task.cancel()
+                try:
+                    await self.state.release_lease(self.name, self.owner)
+                except Exception as e:
+                    logger.debug(f"Не вдалося звільнити оренду {self.name}: {e}")
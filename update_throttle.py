@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+
+from metrics import UPDATES_DROPPED, UPDATES_INFLIGHT
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackThrottleMiddleware(BaseMiddleware):
+    """
+    Outer-middleware для callback_query:
+
+    1. одразу відповідає на callback (answerCallbackQuery), щоб у Telegram зник спінер,
+       а сама робота йде далі у фоні;
+    2. відкидає повтори тієї ж кнопки від того ж користувача протягом `debounce` секунд
+       або поки попереднє натискання ще обробляється;
+    3. обробляє не більше одного натискання на чат одночасно (справедливість між користувачами);
+    4. обмежує кількість одночасних хендлерів `max_concurrency`, а якщо в черзі вже
+       `max_waiting` апдейтів — відкидає нові, щоб хвіст латентності не ріс під навантаженням.
+    """
+
+    def __init__(self, max_concurrency: int = 64, max_waiting: int = 1000, debounce: float = 2.0):
+        self.max_waiting = max_waiting
+        self.debounce = debounce
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._recent: dict[tuple[int, str], float] = {}
+        self._inflight: set[tuple[int, str]] = set()
+        # chat_id -> (замок чату, кількість апдейтів, що його використовують)
+        self._chat_locks: dict[int, tuple[asyncio.Lock, int]] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            await event.answer()
+        except Exception as e:
+            logger.debug(f"answerCallbackQuery не вдався: {e}")
+
+        key = (event.from_user.id, event.data or "")
+        now = time.monotonic()
+        if key in self._inflight or now - self._recent.get(key, float("-inf")) < self.debounce:
+            UPDATES_DROPPED.labels("debounce").inc()
+            return None
+        if self._waiting >= self.max_waiting:
+            UPDATES_DROPPED.labels("overload").inc()
+            logger.warning("Черга апдейтів переповнена, натискання відкинуто.")
+            return None
+
+        self._recent[key] = now
+        if len(self._recent) > 10_000:
+            self._recent = {k: t for k, t in self._recent.items() if now - t < self.debounce}
+
+        chat_id = event.message.chat.id if event.message else event.from_user.id
+        lock, users = self._chat_locks.get(chat_id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._chat_locks[chat_id] = (lock, users + 1)
+        self._inflight.add(key)
+        self._waiting += 1
+        waiting = True
+        try:
+            async with lock:
+                async with self._slots:
+                    self._waiting -= 1
+                    waiting = False
+                    UPDATES_INFLIGHT.inc()
+                    try:
+                        return await handler(event, data)
+                    finally:
+                        UPDATES_INFLIGHT.dec()
+        finally:
+            if waiting:
+                self._waiting -= 1
+            self._inflight.discard(key)
+            lock, users = self._chat_locks[chat_id]
+            if users <= 1:
+                del self._chat_locks[chat_id]
+            else:
+                self._chat_locks[chat_id] = (lock, users - 1)